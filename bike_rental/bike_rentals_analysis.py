@@ -3,24 +3,53 @@
 Bike Rentals – Simplified Script (Explicit CSV path)
 
 Usage:
-- Update BIKE_RENTAL_CSV_FILE with the full path to your CSV file.
-- Update OUTPUT_DIR with the folder where results and plots should be saved.
+- Pass the CSV file and the output folder on the command line, or update the defaults
+  BIKE_RENTAL_CSV_FILE and OUTPUT_DIR below.
 - Run this script directly (Python 3.12+ recommended).
 
 Example:
-  python bike_rentals_analysis.py
+  python bike_rentals_analysis.py FloridaBikeRentals_Curated.csv -o outputs
+
+The tasks run as a small task graph: the outputs of each task are cached with the hash of the
+input file and of the task code, so a task whose inputs and code did not change is skipped, and
+the two plots of task 4 are drawn in parallel. --force runs every task again.
+
+Set --chunk-size (or CHUNK_SIZE) to process the CSV in chunks of that many rows (streaming mode):
+the outputs are the same, and the memory used does not depend on the number of rows.
+
+With pyarrow installed, each JSON/CSV output also has typed Parquet and Feather versions (Int64,
+datetime and category columns kept); read them back with load_typed_output().
+
+The loaded data is stored in the smallest lossless dtypes (small integers, float32 when exact,
+categories for repeated texts) unless --no-optimize-dtypes is given; the outputs do not change.
 """
 
 from __future__ import annotations
 
-from datetime import datetime
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Callable
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from sklearn.preprocessing import MinMaxScaler
 
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only needed for the typed outputs (Parquet/Feather)
+    pa = None
+
 # =========================
 # User-configurable paths
 # =========================
@@ -30,41 +59,328 @@ BIKE_RENTAL_CSV_FILE: str = r"C:\Users\chris\OneDrive\programming\academics\bike
 # Folder where outputs will be written
 OUTPUT_DIR: str = r"C:\Users\chris\OneDrive\programming\academics\bike_rental\outputs"
 
+# Rows read at a time in streaming mode (None reads the whole CSV at once)
+CHUNK_SIZE: int | None = None
+
+# Tasks run at the same time by the task graph
+JOBS: int = 2
+
+# Typed versions written next to the JSON/CSV outputs (none without pyarrow)
+TYPED_FORMATS: tuple[str, ...] = ("parquet", "feather")
+
+# Store the loaded data in the smallest lossless dtypes (see optimize_dtypes)
+OPTIMIZE_DTYPES: bool = True
+
 
 # -----------------------------
 # Helpers for date conversion
 # -----------------------------
 EU_FORMAT_DATE_DASHES = "%d-%m-%Y"
 US_FORMAT_DATE_SLASHES = "%m/%d/%Y"
+UNPREDICTED_DATE_FORMAT = "UnpredictedDateFormat"
+
+# Regular expressions detecting the format of each date string, with the format used to parse it
+DATE_FORMAT_PATTERNS: dict[str, str] = {
+    US_FORMAT_DATE_SLASHES: r"\d{1,2}/\d{1,2}/\d{4}",
+    EU_FORMAT_DATE_DASHES: r"\d{1,2}-\d{1,2}-\d{4}",
+}
+
+
+def normalize_dates(dates: pd.Series) -> pd.Series:
+    """Parse a column of MM/DD/YYYY and DD-MM-YYYY strings into datetime64 (NaT for other values).
+
+    Each distinct string is parsed only once (the 24 hourly rows of a day share the same date):
+    the format of each distinct string is detected with a regular expression, and all the strings
+    of a format are parsed with a single ``pd.to_datetime`` call.
+    """
+    codes, uniques = pd.factorize(dates)
+    texts = pd.Series(uniques, dtype="object").astype(str)
+    parsed = pd.Series(pd.NaT, index=texts.index, dtype="datetime64[ns]")
+    unparsed = pd.Series(True, index=texts.index)
+    for date_format, pattern in DATE_FORMAT_PATTERNS.items():
+        mask = unparsed & texts.str.fullmatch(pattern)
+        parsed[mask] = pd.to_datetime(texts[mask], format=date_format, errors="coerce")
+        unparsed &= parsed.isna()
+    values = parsed.to_numpy()[codes]
+    values[codes < 0] = np.datetime64("NaT")  # Missing values
+    return pd.Series(values, index=dates.index, name=dates.name)
+
+
+def with_us_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the frame with its datetime ``date`` column formatted as MM/DD/YYYY strings, for the text outputs."""
+    if "date" not in df.columns or not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        return df
+    return df.assign(date=df["date"].dt.strftime(US_FORMAT_DATE_SLASHES).fillna(UNPREDICTED_DATE_FORMAT))
+
+
+# -----------------------------
+# Transformations of tasks 1-3
+# -----------------------------
+# They only depend on each row and on the statistics passed in, so they give the same rows
+# for the whole file (main) and for each chunk of it (run_streaming).
+SCALED_BY_10_COLUMNS = ["temp_celcius", "wind_speed_m_per_s", "dew_point_temp_celcius"]
 
 
-def is_eu_date_with_dashes(date_input: str) -> bool:
-    """Return True if value matches 'DD-MM-YYYY'."""
-    try:
-        datetime.strptime(date_input, EU_FORMAT_DATE_DASHES)
-        return True
-    except (ValueError, TypeError):
-        return False
+def clean_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Parse the ``date`` column into datetime64 (task 1)."""
+    if "date" in df.columns:
+        df["date"] = normalize_dates(df["date"])
+    return df
+
+
+def scale_columns(df: pd.DataFrame, scaler: MinMaxScaler) -> pd.DataFrame:
+    """Scale the measures by 10 into Int64, and visibility_10m with a fitted MinMaxScaler (task 2)."""
+    # Computed in float64, as on the loaded CSV: the columns may have been downcast by optimize_dtypes
+    for col in SCALED_BY_10_COLUMNS:
+        if col in df.columns:
+            df[col] = (df[col].astype("float64") * 10).astype("Int64")
+    if "visibility_10m" in df.columns:
+        df["visibility_10m"] = scaler.transform(df[["visibility_10m"]].astype("float64"))
+    return df
 
 
-def is_us_date_with_slashes(date_input: str) -> bool:
-    """Return True if value matches 'MM/DD/YYYY'."""
-    try:
-        datetime.strptime(date_input, US_FORMAT_DATE_SLASHES)
-        return True
-    except (ValueError, TypeError):
-        return False
+def encode_columns(df: pd.DataFrame, seasons_categories: list[str] | None = None) -> pd.DataFrame:
+    """Add day_of_week, keep the functioning days and encode the categorical columns (task 3).
+
+    The codes of ``seasons_code`` are the positions in seasons_categories (by default the
+    sorted seasons of df).
+    """
+    if "date" in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+            df["date"] = normalize_dates(df["date"])
+        df["day_of_week"] = df["date"].dt.day_name()
+
+    if "functioning_day" in df.columns:
+        df = df[df["functioning_day"] == "Yes"].copy()
+
+    if "holiday" in df.columns:
+        df["holiday_code"] = df["holiday"].map({"Holiday": 1, "No Holiday": 0}).astype("Int64")
+    if "functioning_day" in df.columns:
+        df["functioning_day_code"] = df["functioning_day"].map({"Yes": 1, "No": 0}).astype("Int64")
+    if "seasons" in df.columns:
+        seasons = pd.Categorical(df["seasons"], categories=seasons_categories)
+        df["seasons_code"] = pd.Series(seasons.codes, index=df.index).astype("Int64")
+    return df
+
+
+def report_cleaning(head: pd.DataFrame, missing: pd.Series, dups: int) -> None:
+    """Print the findings of task 1."""
+    if "date" in head.columns:
+        bad_dates = missing["date"]
+        if bad_dates:
+            print(f"  WARNING: {bad_dates} rows had unexpected date formats.")
+
+    print("\nData snapshot:")
+    print(head)
+    print("\nMissing values per column:")
+    print(missing)
+
+    if dups:
+        print(f"  Found {dups} duplicate rows (not dropped).")
+
+
+def report_scaling(columns) -> None:
+    """Print the conversions of task 2 for the given columns."""
+    for col in SCALED_BY_10_COLUMNS:
+        if col in columns:
+            print(f"  Converted {col} -> scaled by 10 and cast to Int64")
+    if "visibility_10m" in columns:
+        print("  Scaled visibility_10m to [0, 1]")
+
+
+# -----------------------------
+# Typed outputs (Parquet/Feather)
+# -----------------------------
+# Columns stored as categories in the typed outputs, and the order of the days of the week
+CATEGORICAL_COLUMNS = ["seasons", "holiday", "functioning_day", "day_of_week"]
+WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def require_arrow() -> None:
+    """Raise ImportError if pyarrow (needed by the typed outputs) is not installed."""
+    if pa is None:
+        raise ImportError("The Parquet/Feather outputs need the pyarrow package (pip install pyarrow)")
+
+
+def typed_frame(df: pd.DataFrame, categories: dict[str, list[str]] | None = None) -> pd.DataFrame:
+    """Return df with a default index and the categorical columns as pandas categories.
+
+    The categories of a column are those given in categories, else those of the input file recorded
+    by task 1 in ``df.attrs``, else the sorted values of df; the days of the week are in week order.
+    """
+    categories = categories or df.attrs.get("categories")
+    typed = df.reset_index(drop=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col not in typed.columns:
+            continue
+        if col == "day_of_week":
+            col_categories = WEEK_DAYS
+        elif categories and col in categories:
+            col_categories = categories[col]
+        else:
+            col_categories = sorted(typed[col].dropna().unique())
+        typed[col] = pd.Categorical(typed[col], categories=col_categories)
+    return typed
+
+
+def typed_output_files(text_output: str, typed_formats: tuple[str, ...]) -> tuple[str, ...]:
+    """Names of the typed versions of a text output, e.g. bike_rental_processed.parquet."""
+    return tuple(str(Path(text_output).with_suffix(f".{fmt}")) for fmt in typed_formats)
+
+
+def write_typed_outputs(df: pd.DataFrame, path: Path, typed_formats: tuple[str, ...],
+                        categories: dict[str, list[str]] | None = None) -> None:
+    """Write df with its dtypes next to the text output at path, in each of the typed formats."""
+    if not typed_formats:
+        return
+    require_arrow()
+    typed = typed_frame(df, categories)
+    if "parquet" in typed_formats:
+        typed.to_parquet(path.with_suffix(".parquet"), index=False)
+    if "feather" in typed_formats:
+        # Uncompressed, so that load_typed_output can memory-map it
+        typed.to_feather(path.with_suffix(".feather"), compression="uncompressed")
+    report_typed_outputs(path, typed_formats)
+
+
+def report_typed_outputs(path: Path, typed_formats: tuple[str, ...]) -> None:
+    if typed_formats:
+        print(f"  Saved typed outputs -> {', '.join(typed_output_files(path.name, typed_formats))}")
+
+
+class TypedChunkWriter:
+    """Append chunks to the typed versions of a text output, as one Parquet/Feather file each.
+
+    The categories must be the same for every chunk (those of the whole file), since a Feather
+    file has a single dictionary per column.
+    """
+
+    def __init__(self, path: Path, typed_formats: tuple[str, ...], categories: dict[str, list[str]]):
+        if typed_formats:
+            require_arrow()
+        self.path = path
+        self.typed_formats = typed_formats
+        self.categories = categories
+        self.writers: list[Any] | None = None
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if not self.typed_formats:
+            return
+        table = pa.Table.from_pandas(typed_frame(chunk, self.categories), preserve_index=False)
+        if self.writers is None:
+            self.writers = []
+            if "parquet" in self.typed_formats:
+                self.writers.append(pq.ParquetWriter(self.path.with_suffix(".parquet"), table.schema))
+            if "feather" in self.typed_formats:
+                self.writers.append(pa.ipc.new_file(self.path.with_suffix(".feather"), table.schema))
+        for writer in self.writers:
+            writer.write_table(table)
+
+    def close(self) -> None:
+        for writer in self.writers or []:
+            writer.close()
+
+
+def load_typed_output(path: Path | str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read a Parquet or Feather output back into a DataFrame with its dtypes, optionally only some columns.
+
+    Feather files are memory-mapped: the columns read are paged in from the file instead of being
+    parsed, and the numeric columns are used without a copy where pandas allows it.
+    Parquet files are memory-mapped too, but their compressed pages have to be decoded.
+    """
+    require_arrow()
+    path = Path(path)
+    if path.suffix == ".feather":
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
 
 
-def to_us_date_with_slashes(date_input: str) -> str:
-    """Convert any known date formats to MM/DD/YYYY."""
-    if is_us_date_with_slashes(date_input):
-        d = datetime.strptime(date_input, US_FORMAT_DATE_SLASHES)
-        return d.strftime(US_FORMAT_DATE_SLASHES)
-    if is_eu_date_with_dashes(date_input):
-        d = datetime.strptime(date_input, EU_FORMAT_DATE_DASHES)
-        return d.strftime(US_FORMAT_DATE_SLASHES)
-    return "UnpredictedDateFormat"
+# -----------------------------
+# Memory optimization
+# -----------------------------
+CATEGORY_MAX_VALUES = 1000  # Distinct values above which a text column stays text
+CATEGORY_MAX_RATIO = 0.5  # ... or above this share of the rows
+SMALL_INT_DTYPES = [np.dtype("int8"), np.dtype("int16"), np.dtype("int32")]
+
+
+@dataclass
+class ColumnProfile:
+    """Summary of a column from which its smallest lossless dtype is chosen.
+
+    Profiles of chunks of a file can be merged, so the streaming mode picks the same dtypes for
+    the whole file as optimize_dtypes does on the loaded frame.
+    """
+
+    dtype: Any
+    rows: int = 0
+    min: Any = None
+    max: Any = None
+    float32_exact: bool = True  # Whether every value is unchanged by a round trip through float32
+    values: set[str] | None = None  # Distinct texts, None for numbers or above CATEGORY_MAX_VALUES
+
+    @classmethod
+    def of(cls, column: pd.Series) -> ColumnProfile:
+        profile = cls(dtype=column.dtype, rows=len(column))
+        values = column.dropna()
+        if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype):
+            if len(values):
+                profile.min, profile.max = values.min(), values.max()
+                as_float = values.to_numpy(dtype="float64")
+                profile.float32_exact = bool((as_float.astype("float32").astype("float64") == as_float).all())
+        elif pd.api.types.is_string_dtype(column.dtype) or isinstance(column.dtype, pd.CategoricalDtype):
+            uniques = values.unique()
+            if len(uniques) <= CATEGORY_MAX_VALUES:
+                profile.values = set(uniques)
+        return profile
+
+    def merge(self, other: ColumnProfile) -> ColumnProfile:
+        if self.dtype == other.dtype:
+            dtype = self.dtype
+        elif pd.api.types.is_numeric_dtype(self.dtype) and pd.api.types.is_numeric_dtype(other.dtype):
+            dtype = np.promote_types(self.dtype, other.dtype)
+        else:
+            dtype = np.dtype("object")
+        values = None
+        if self.values is not None and other.values is not None:
+            values = self.values | other.values
+            if len(values) > CATEGORY_MAX_VALUES:
+                values = None
+        mins = [v for v in (self.min, other.min) if v is not None]
+        maxs = [v for v in (self.max, other.max) if v is not None]
+        return ColumnProfile(dtype, self.rows + other.rows, min(mins) if mins else None, max(maxs) if maxs else None,
+                             self.float32_exact and other.float32_exact, values)
+
+    def optimized_dtype(self) -> Any:
+        """Smallest dtype holding every value of the column unchanged."""
+        if pd.api.types.is_integer_dtype(self.dtype) and self.min is not None:
+            for candidate in SMALL_INT_DTYPES:
+                info = np.iinfo(candidate)
+                if info.min <= self.min and self.max <= info.max:
+                    return candidate
+        elif pd.api.types.is_float_dtype(self.dtype) and self.min is not None and self.float32_exact:
+            return np.dtype("float32")
+        elif self.values is not None and len(self.values) <= CATEGORY_MAX_RATIO * self.rows:
+            return pd.CategoricalDtype(sorted(self.values))
+        return self.dtype
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Store each column in its smallest lossless dtype, and print the memory used before and after.
+
+    Integers are downcast to int8/int16/int32 when their range fits, floats to float32 when every
+    value is exactly representable, and texts with few distinct values become categories (e.g.
+    ``seasons``: 4 values for every row). The values are unchanged, so are the outputs.
+    """
+    before = df.memory_usage(deep=True).sum()
+    for col in df.columns:
+        dtype = ColumnProfile.of(df[col]).optimized_dtype()
+        if dtype != df[col].dtype:
+            df[col] = df[col].astype(dtype)
+    after = df.memory_usage(deep=True).sum()
+    print(f"  Optimized dtypes: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB ({before / after:.1f}x smaller)")
+    return df
 
 
 # -----------------------------
@@ -76,73 +392,52 @@ def load_data(csv_path: Path) -> pd.DataFrame:
     return pd.read_csv(csv_path)
 
 
-def task1_import_and_clean(df: pd.DataFrame, outdir: Path) -> pd.DataFrame:
+def task1_import_and_clean(df: pd.DataFrame, outdir: Path, typed_formats: tuple[str, ...] = ()) -> pd.DataFrame:
     """Clean and standardize dataset."""
     print("TASK 1 — Import & Clean")
 
-    if "date" in df.columns:
-        df["date"] = df["date"].apply(to_us_date_with_slashes)
-        bad_dates = (df["date"] == "UnpredictedDateFormat").sum()
-        if bad_dates:
-            print(f"  WARNING: {bad_dates} rows had unexpected date formats.")
-
-    print("\nData snapshot:")
-    print(df.head())
-    print("\nMissing values per column:")
-    print(df.isnull().sum())
-
-    dups = df.duplicated().sum()
-    if dups:
-        print(f"  Found {dups} duplicate rows (not dropped).")
+    df = clean_dates(df)
+    report_cleaning(df.head(), df.isnull().sum(), df.duplicated().sum())
+    # Categories of the whole file, kept by the next tasks (the rows of some values may be filtered out)
+    df.attrs["categories"] = {col: sorted(df[col].dropna().unique()) for col in CATEGORICAL_COLUMNS if col in df.columns}
 
     cleaned_json = outdir / "bike_rental_cleaned.json"
-    df.to_json(cleaned_json, orient="records", lines=True)
+    with_us_dates(df).to_json(cleaned_json, orient="records", lines=True)
     print(f"  Saved cleaned JSON -> {cleaned_json}")
+    write_typed_outputs(df, cleaned_json, typed_formats)
     return df
 
 
-def task2_processing_and_stats(df: pd.DataFrame, source_csv: Path, outdir: Path) -> pd.DataFrame:
+def task2_processing_and_stats(df: pd.DataFrame, source_csv: Path, outdir: Path,
+                               typed_formats: tuple[str, ...] = ()) -> pd.DataFrame:
     """Process columns, compute stats, and save CSV."""
     print("\nTASK 2 — Processing & Statistics")
 
-    for col in ["temp_celcius", "wind_speed_m_per_s", "dew_point_temp_celcius"]:
-        if col in df.columns:
-            df[col] = (df[col] * 10).astype("Int64")
-            print(f"  Converted {col} -> scaled by 10 and cast to Int64")
-
+    scaler = MinMaxScaler()
     if "visibility_10m" in df.columns:
-        scaler = MinMaxScaler()
-        df["visibility_10m"] = scaler.fit_transform(df[["visibility_10m"]])
-        print("  Scaled visibility_10m to [0, 1]")
+        scaler.fit(df[["visibility_10m"]].astype("float64"))
+    df = scale_columns(df, scaler)
+    report_scaling(df.columns)
 
     processed_csv = outdir / "bike_rental_processed.csv"
-    df.to_csv(processed_csv, index=False)
+    with_us_dates(df).to_csv(processed_csv, index=False)
     print(f"  Saved processed CSV -> {processed_csv}")
+    write_typed_outputs(df, processed_csv, typed_formats)
     return df
 
 
-def task3_pandas_analysis(df: pd.DataFrame, outdir: Path) -> pd.DataFrame:
+def task3_pandas_analysis(df: pd.DataFrame, outdir: Path, typed_formats: tuple[str, ...] = ()) -> pd.DataFrame:
     """Perform groupings, add day_of_week, encode categoricals."""
     print("\nTASK 3 — Pandas Analysis")
 
-    if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"], format=US_FORMAT_DATE_SLASHES, errors="coerce")
-        df["day_of_week"] = df["date"].dt.day_name()
-
+    df = encode_columns(df, df.attrs.get("categories", {}).get("seasons"))
     if "functioning_day" in df.columns:
-        df = df[df["functioning_day"] == "Yes"].copy()
         print("  Filtered to functioning_day == 'Yes'")
 
-    if "holiday" in df.columns:
-        df["holiday_code"] = df["holiday"].map({"Holiday": 1, "No Holiday": 0}).astype("Int64")
-    if "functioning_day" in df.columns:
-        df["functioning_day_code"] = df["functioning_day"].map({"Yes": 1, "No": 0}).astype("Int64")
-    if "seasons" in df.columns:
-        df["seasons_code"] = df["seasons"].astype("category").cat.codes.astype("Int64")
-
     dummy_csv = outdir / "Rental_Bike_Data_Dummy.csv"
     df.to_csv(dummy_csv, index=False)
     print(f"  Saved dummy CSV -> {dummy_csv}")
+    write_typed_outputs(df, dummy_csv, typed_formats)
     return df
 
 
@@ -150,40 +445,428 @@ def task4_visualizations(df: pd.DataFrame, outdir: Path) -> None:
     """Generate and save plots."""
     print("\nTASK 4 — Visualizations")
 
+    task4_season_plot(df, outdir)
+    task4_hourly_plot(df, outdir)
+
+    print("  Plots saved successfully.")
+
+
+def task4_season_plot(df: pd.DataFrame, outdir: Path) -> None:
+    """Save the chart of the average rentals by season, if the columns are present."""
     if set(["seasons", "rented_bike_count"]).issubset(df.columns):
-        avg_by_season = df.groupby("seasons")["rented_bike_count"].mean()
-        plt.bar(avg_by_season.index, avg_by_season.values)
-        plt.title("Average Rentals by Season")
-        plt.ylabel("Average Rented Bikes")
-        plt.xlabel("Season")
-        plt.tight_layout()
-        plt.savefig(outdir / "avg_rentals_by_season.png")
-        plt.close()
+        plot_avg_by_season(df.groupby("seasons")["rented_bike_count"].mean(), outdir)
 
+
+def task4_hourly_plot(df: pd.DataFrame, outdir: Path) -> None:
+    """Save the chart of the average rentals by hour, if the columns are present."""
     if set(["hour", "rented_bike_count"]).issubset(df.columns):
-        hourly = df.groupby("hour")["rented_bike_count"].mean()
-        plt.plot(hourly.index, hourly.values, marker="o")
-        plt.title("Hourly Rentals")
-        plt.xlabel("Hour")
-        plt.ylabel("Average Rented Bikes")
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(outdir / "hourly_rentals.png")
-        plt.close()
+        plot_hourly(df.groupby("hour")["rented_bike_count"].mean(), outdir)
+
+
+# The plots use their own Figure rather than the global pyplot state, so they can be drawn in parallel threads.
+def plot_avg_by_season(avg_by_season: pd.Series, outdir: Path) -> None:
+    """Save the bar chart of the average rentals by season."""
+    fig = Figure()
+    ax = fig.subplots()
+    ax.bar(avg_by_season.index, avg_by_season.values)
+    ax.set_title("Average Rentals by Season")
+    ax.set_ylabel("Average Rented Bikes")
+    ax.set_xlabel("Season")
+    fig.tight_layout()
+    fig.savefig(outdir / "avg_rentals_by_season.png")
+
+
+def plot_hourly(hourly: pd.Series, outdir: Path) -> None:
+    """Save the line chart of the average rentals by hour."""
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(hourly.index, hourly.values, marker="o")
+    ax.set_title("Hourly Rentals")
+    ax.set_xlabel("Hour")
+    ax.set_ylabel("Average Rented Bikes")
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig(outdir / "hourly_rentals.png")
+
 
+# -----------------------------
+# Streaming mode
+# -----------------------------
+@dataclass
+class GroupMeans:
+    """Means of a column by group, merged from the sums and counts of each chunk."""
+
+    sums: pd.Series | None = None
+    counts: pd.Series | None = None
+
+    def update(self, keys: pd.Series, values: pd.Series) -> None:
+        # Summed in float64 (exact for integers up to 2**53), as groupby().mean() does: the groupby sums
+        # of a column downcast to int16 would wrap around
+        grouped = values.astype("float64").groupby(keys)
+        sums, counts = grouped.sum(), grouped.count()
+        self.sums = sums if self.sums is None else self.sums.add(sums, fill_value=0)
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+
+    def means(self) -> pd.Series:
+        return (self.sums / self.counts).sort_index()
+
+
+@dataclass
+class FileStatistics:
+    """Statistics of the whole CSV needed to transform each chunk as the whole file would be.
+
+    They are merged chunk by chunk in a first pass over the file:
+    - the profile of each column (ColumnProfile): its dtype (a column of integers in one chunk and
+      floats in another is float), its range and its distinct texts, which give its optimized dtype;
+    - through the profiles, the values of the categorical columns: the sorted seasons give the codes
+      of ``seasons_code``, and the sorted values of each column its categories in the typed outputs;
+    - the minimum and maximum of ``visibility_10m``, for the MinMaxScaler (``partial_fit``).
+    """
+
+    columns: dict[str, ColumnProfile] = field(default_factory=dict)
+    scaler: MinMaxScaler = field(default_factory=MinMaxScaler)
+    rows: int = 0
+
+    @property
+    def dtypes(self) -> dict[str, Any]:
+        return {col: profile.dtype for col, profile in self.columns.items()}
+
+    @property
+    def categories(self) -> dict[str, list[str]]:
+        return {col: sorted(self.columns[col].values) for col in CATEGORICAL_COLUMNS
+                if col in self.columns and self.columns[col].values is not None}
+
+    def read_dtypes(self, optimize: bool) -> dict[str, Any]:
+        """Dtypes to read every chunk with: those of the whole file, optimized or not."""
+        if not optimize:
+            return self.dtypes
+        return {col: profile.optimized_dtype() for col, profile in self.columns.items()}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        for col in chunk.columns:
+            profile = ColumnProfile.of(chunk[col])
+            self.columns[col] = profile if col not in self.columns else self.columns[col].merge(profile)
+        if "visibility_10m" in chunk.columns:
+            self.scaler.partial_fit(chunk[["visibility_10m"]])
+        self.rows += len(chunk)
+
+
+def scan_statistics(csv_path: Path, chunk_size: int) -> FileStatistics:
+    """First pass: merge the statistics of the chunks of the CSV."""
+    stats = FileStatistics()
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        stats.update(chunk)
+    return stats
+
+
+def run_streaming(csv_path: Path, outdir: Path, chunk_size: int, typed_formats: tuple[str, ...] = (),
+                  optimize: bool = False) -> None:
+    """Run tasks 1-4 on the CSV read in chunks of chunk_size rows, with the same outputs as main().
+
+    After the first pass (scan_statistics), each chunk is read again with the dtypes of the whole
+    file (optimized as by optimize_dtypes if optimize is set), cleaned, scaled and encoded, and appended to the JSON and CSV outputs. Duplicate rows are
+    found from a 64-bit hash of each row (8 bytes per row instead of the row), and the plots from
+    the sums and counts of the rentals by season and by hour. The typed outputs get one row group
+    (Parquet) or record batch (Feather) per chunk.
+    """
+    print(f"Loading data from: {csv_path} (streaming, {chunk_size} rows at a time)")
+    stats = scan_statistics(csv_path, chunk_size)
+    print(f"  Scanned {stats.rows} rows")
+
+    cleaned_json = outdir / "bike_rental_cleaned.json"
+    processed_csv = outdir / "bike_rental_processed.csv"
+    dummy_csv = outdir / "Rental_Bike_Data_Dummy.csv"
+    categories = stats.categories
+    season_means, hourly_means = GroupMeans(), GroupMeans()
+    head, missing, row_hashes = None, None, []
+    typed_writers = [TypedChunkWriter(path, typed_formats, categories) for path in (cleaned_json, processed_csv, dummy_csv)]
+    cleaned_typed, processed_typed, dummy_typed = typed_writers
+
+    with open(cleaned_json, "w") as json_file:
+        chunks = pd.read_csv(csv_path, chunksize=chunk_size, dtype=stats.read_dtypes(optimize))
+        for i, chunk in enumerate(chunks):
+            header, mode = (True, "w") if i == 0 else (False, "a")
+
+            chunk = clean_dates(chunk)
+            if head is None:
+                head = chunk.head()
+            chunk_missing = chunk.isnull().sum()
+            missing = chunk_missing if missing is None else missing + chunk_missing
+            row_hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+            json_file.write(with_us_dates(chunk).to_json(orient="records", lines=True))
+            cleaned_typed.write(chunk)
+
+            chunk = scale_columns(chunk, stats.scaler)
+            with_us_dates(chunk).to_csv(processed_csv, index=False, header=header, mode=mode)
+            processed_typed.write(chunk)
+
+            chunk = encode_columns(chunk, categories.get("seasons"))
+            chunk.to_csv(dummy_csv, index=False, header=header, mode=mode)
+            dummy_typed.write(chunk)
+
+            if set(["seasons", "rented_bike_count"]).issubset(chunk.columns):
+                season_means.update(chunk["seasons"], chunk["rented_bike_count"])
+            if set(["hour", "rented_bike_count"]).issubset(chunk.columns):
+                hourly_means.update(chunk["hour"], chunk["rented_bike_count"])
+    for writer in typed_writers:
+        writer.close()
+
+    hashes = np.concatenate(row_hashes) if row_hashes else np.array([], dtype=np.uint64)
+    print("TASK 1 — Import & Clean")
+    report_cleaning(head, missing, len(hashes) - len(np.unique(hashes)))
+    print(f"  Saved cleaned JSON -> {cleaned_json}")
+    report_typed_outputs(cleaned_json, typed_formats)
+
+    print("\nTASK 2 — Processing & Statistics")
+    report_scaling(stats.dtypes)
+    print(f"  Saved processed CSV -> {processed_csv}")
+    report_typed_outputs(processed_csv, typed_formats)
+
+    print("\nTASK 3 — Pandas Analysis")
+    if "functioning_day" in stats.dtypes:
+        print("  Filtered to functioning_day == 'Yes'")
+    print(f"  Saved dummy CSV -> {dummy_csv}")
+    report_typed_outputs(dummy_csv, typed_formats)
+
+    print("\nTASK 4 — Visualizations")
+    if season_means.sums is not None:
+        plot_avg_by_season(season_means.means(), outdir)
+    if hourly_means.sums is not None:
+        plot_hourly(hourly_means.means(), outdir)
     print("  Plots saved successfully.")
 
 
-def main() -> None:
-    csv_path = Path(BIKE_RENTAL_CSV_FILE)
-    outdir = Path(OUTPUT_DIR)
+# -----------------------------
+# Task graph
+# -----------------------------
+TASK_CACHE_DIR = ".task_cache"
+TASK_MANIFEST_FILE = "manifest.json"
+HASH_BLOCK_SIZE = 1 << 20
+
+# Increase to invalidate every cached output, e.g. after changing a module-level constant used by the tasks
+# (the cache keys only cover the source of the functions listed in each task).
+TASK_CACHE_VERSION = 1
+
+
+@dataclass
+class Task:
+    """A stage of the pipeline: ``func`` receives the results of the tasks in ``deps``, in order.
+
+    ``outputs`` are the files it writes in the output folder, ``code`` the functions whose source
+    is its code version, and ``params`` the settings changing its results. A task that is not ``cached`` (e.g. loading the CSV) only runs
+    when a task depending on it runs.
+    """
+
+    name: str
+    func: Callable[..., Any]
+    deps: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    code: tuple[Any, ...] = ()
+    params: tuple[Any, ...] = ()
+    cached: bool = True
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file, read by blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TaskRunner:
+    """Run a task graph, skipping the tasks whose cached outputs are up to date.
+
+    The cache key of a task is the hash of the input file, of the source of its code and of the
+    keys of the tasks it depends on, so changing a task also runs the tasks after it again. The
+    results of the cached tasks that other tasks depend on are pickled in ``TASK_CACHE_DIR``, so a
+    task can run again without running the tasks before it. Tasks whose dependencies are done run
+    in parallel, in up to ``jobs`` threads.
+    """
+
+    def __init__(self, tasks: list[Task], input_path: Path, outdir: Path, jobs: int = JOBS, force: bool = False):
+        self.tasks = {task.name: task for task in tasks}  # In dependency order
+        self.input_path = input_path
+        self.outdir = outdir
+        self.cache_dir = outdir / TASK_CACHE_DIR
+        self.jobs = max(1, jobs)
+        self.force = force
+        self.dependents = {name: [task.name for task in tasks if name in task.deps] for name in self.tasks}
+
+    def task_keys(self) -> dict[str, str]:
+        input_hash = file_hash(self.input_path)
+        keys: dict[str, str] = {}
+        for name, task in self.tasks.items():
+            digest = hashlib.sha256()
+            for part in [str(TASK_CACHE_VERSION), pd.__version__, input_hash, name]:
+                digest.update(part.encode())
+            for obj in task.code:
+                digest.update(inspect.getsource(obj).encode())
+            digest.update(repr(task.params).encode())
+            for dep in task.deps:
+                digest.update(keys[dep].encode())
+            keys[name] = digest.hexdigest()
+        return keys
+
+    def load_manifest(self) -> dict[str, str]:
+        try:
+            with open(self.cache_dir / TASK_MANIFEST_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest: dict[str, str]) -> None:
+        path = self.cache_dir / TASK_MANIFEST_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+        os.replace(tmp, path)
+
+    def result_path(self, name: str) -> Path:
+        return self.cache_dir / f"{name}.pkl"
+
+    def is_fresh(self, task: Task, key: str, manifest: dict[str, str]) -> bool:
+        if self.force or not task.cached or manifest.get(task.name) != key:
+            return False
+        if not all((self.outdir / output).exists() for output in task.outputs):
+            return False
+        return not self.dependents[task.name] or self.result_path(task.name).exists()
+
+    def run(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        keys = self.task_keys()
+        manifest = self.load_manifest()
+        fresh = {name: self.is_fresh(task, keys[name], manifest) for name, task in self.tasks.items()}
+
+        to_run: set[str] = set()
+        for name in reversed(self.tasks):
+            task = self.tasks[name]
+            if task.cached:
+                needed = not fresh[name]
+            else:
+                needed = not self.dependents[name] or any(child in to_run for child in self.dependents[name])
+            if needed:
+                to_run.add(name)
+        for name in self.tasks:
+            if fresh[name]:
+                print(f"  [{name}] up to date, skipped")
+
+        results: dict[str, Any] = {}
+        pending = [name for name in self.tasks if name in to_run]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    task = self.tasks[name]
+                    if any(dep in to_run and dep not in results for dep in task.deps):
+                        continue
+                    args = [results[dep] if dep in to_run else self.load_result(dep) for dep in task.deps]
+                    running[pool.submit(self.timed, task, args)] = name
+                    pending.remove(name)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name], seconds = future.result()
+                    print(f"  [{name}] done in {seconds:.2f} s")
+                    if self.tasks[name].cached:
+                        if self.dependents[name]:
+                            with open(self.result_path(name), "wb") as f:
+                                pickle.dump(results[name], f, protocol=pickle.HIGHEST_PROTOCOL)
+                        manifest[name] = keys[name]
+                        self.save_manifest(manifest)
+
+    @staticmethod
+    def timed(task: Task, args: list[Any]) -> tuple[Any, float]:
+        start = time.perf_counter()
+        result = task.func(*args)
+        return result, time.perf_counter() - start
+
+    def load_result(self, name: str) -> Any:
+        with open(self.result_path(name), "rb") as f:
+            return pickle.load(f)
+
+
+OUTPUT_FILES = {
+    "task1": ("bike_rental_cleaned.json",),
+    "task2": ("bike_rental_processed.csv",),
+    "task3": ("Rental_Bike_Data_Dummy.csv",),
+    "season_plot": ("avg_rentals_by_season.png",),
+    "hourly_plot": ("hourly_rentals.png",),
+}
+
+
+def task_outputs(name: str, typed_formats: tuple[str, ...]) -> tuple[str, ...]:
+    """Files written by a task of the graph, with the typed versions of its text output."""
+    if name not in ("task1", "task2", "task3"):
+        return OUTPUT_FILES[name]
+    return OUTPUT_FILES[name] + typed_output_files(OUTPUT_FILES[name][0], typed_formats)
+
+
+def build_tasks(csv_path: Path, outdir: Path, chunk_size: int | None = None,
+                typed_formats: tuple[str, ...] = (), optimize: bool = False) -> list[Task]:
+    """Task graph of the pipeline: load -> task1 -> task2 -> task3 -> (season_plot, hourly_plot).
+
+    In streaming mode, the chunks go through every task at once, so the graph is a single task.
+    With optimize, the loaded data is stored in smaller dtypes (optimize_dtypes).
+    """
+    typed_code = (typed_frame, write_typed_outputs)
+    if chunk_size:
+        return [
+            Task("streaming", lambda: run_streaming(csv_path, outdir, chunk_size, typed_formats, optimize),
+                 outputs=sum((task_outputs(name, typed_formats) for name in OUTPUT_FILES), ()),
+                 code=(run_streaming, scan_statistics, FileStatistics, ColumnProfile, GroupMeans, clean_dates,
+                       normalize_dates, with_us_dates, scale_columns, encode_columns, plot_avg_by_season, plot_hourly,
+                       TypedChunkWriter) + typed_code,
+                 params=(optimize,)),
+        ]
+    return [
+        Task("load", lambda: optimize_dtypes(load_data(csv_path)) if optimize else load_data(csv_path), cached=False),
+        Task("task1", lambda df: task1_import_and_clean(df, outdir, typed_formats), deps=("load",),
+             outputs=task_outputs("task1", typed_formats),
+             code=(task1_import_and_clean, clean_dates, normalize_dates, with_us_dates, ColumnProfile, optimize_dtypes)
+             + typed_code,
+             params=(optimize,)),
+        Task("task2", lambda df: task2_processing_and_stats(df, csv_path, outdir, typed_formats), deps=("task1",),
+             outputs=task_outputs("task2", typed_formats),
+             code=(task2_processing_and_stats, scale_columns, with_us_dates) + typed_code),
+        Task("task3", lambda df: task3_pandas_analysis(df, outdir, typed_formats), deps=("task2",),
+             outputs=task_outputs("task3", typed_formats), code=(task3_pandas_analysis, encode_columns) + typed_code),
+        Task("season_plot", lambda df: task4_season_plot(df, outdir), deps=("task3",),
+             outputs=OUTPUT_FILES["season_plot"], code=(task4_season_plot, plot_avg_by_season)),
+        Task("hourly_plot", lambda df: task4_hourly_plot(df, outdir), deps=("task3",),
+             outputs=OUTPUT_FILES["hourly_plot"], code=(task4_hourly_plot, plot_hourly)),
+    ]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Clean, process, analyze and plot the bike rental data.")
+    parser.add_argument("csv_file", nargs="?", default=BIKE_RENTAL_CSV_FILE,
+                        help="CSV file of the rentals (default: BIKE_RENTAL_CSV_FILE)")
+    parser.add_argument("-o", "--output-dir", default=OUTPUT_DIR,
+                        help="folder where the outputs are written (default: OUTPUT_DIR)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="process the CSV in chunks of this many rows (streaming mode)")
+    parser.add_argument("-j", "--jobs", type=int, default=JOBS, help="tasks run in parallel (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="run every task, ignoring the cached outputs")
+    parser.add_argument("--optimize-dtypes", action=argparse.BooleanOptionalAction, default=OPTIMIZE_DTYPES,
+                        help="store the loaded data in the smallest lossless dtypes (default: %(default)s)")
+    parser.add_argument("--typed-formats", nargs="*", choices=TYPED_FORMATS,
+                        default=list(TYPED_FORMATS) if pa is not None else [],
+                        help="typed versions of the JSON/CSV outputs to write (default: %(default)s; none without pyarrow)")
+    args = parser.parse_args(argv)
+    if args.typed_formats and pa is None:
+        parser.error("--typed-formats needs the pyarrow package (pip install pyarrow)")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    csv_path = Path(args.csv_file)
+    outdir = Path(args.output_dir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    df = load_data(csv_path)
-    df = task1_import_and_clean(df, outdir)
-    df = task2_processing_and_stats(df, csv_path, outdir)
-    df = task3_pandas_analysis(df, outdir)
-    task4_visualizations(df, outdir)
+    tasks = build_tasks(csv_path, outdir, args.chunk_size, tuple(args.typed_formats), args.optimize_dtypes)
+    TaskRunner(tasks, csv_path, outdir, jobs=args.jobs, force=args.force).run()
 
     print("\nAll tasks completed. Outputs in:", outdir.resolve())
 
@@ -0,0 +1,171 @@
+# %%
+# Alerts on the expenses as they are added:
+# - unusual expense: its amount is more than ALERT_ANOMALY_FACTOR times the recent median amount of its category;
+# - overspend: the expenses of its month exceed the month's budget, or will exceed it at the current pace.
+# The median of each category is estimated by a streaming quantile sketch (P-square algorithm: 5 markers updated in
+# constant time per expense, without keeping the amounts). Each category has a sketch of its last ALERT_WINDOW_EXPENSES
+# expenses and one being filled, so the median follows the recent expenses. When the alerts are first used, the sketches
+# are filled with the most recent expenses of each category only (the file is read backwards until every category has
+# enough expenses, or ALERT_WARM_UP_ROWS expenses were read, so the first check does not depend on the size of the history);
+# afterwards only the expenses added since the last check are read.
+import calendar
+from bisect import insort
+from datetime import date
+from itertools import islice
+
+from expense_reports import monthAbbreviation
+from expense_storage import amountToCents, centsToAmount
+
+ALERT_ANOMALY_FACTOR = 3 # An expense is unusual above this many times the median amount of its category
+ALERT_MIN_EXPENSES = 10 # Expenses of a category needed before unusual expenses are flagged
+ALERT_WINDOW_EXPENSES = 100 # Expenses of a category in each sketch
+ALERT_WARM_UP_ROWS = 20000 # Most recent expenses read at most by the first check (categories seldom used may get fewer expenses)
+ALERT_PROJECTION_MIN_DAYS = 7 # Days of the current month after which its expenses are projected to the end of the month
+MEDIAN_QUANTILE = 0.5
+
+
+# %%
+# Streaming estimate of a quantile (P-square algorithm, Jain and Chlamtac, 1985)
+# Five markers follow the minimum, the quantile, the maximum and two intermediate quantiles; each value moves
+# the markers by at most one position, with a parabolic (or linear) correction of their heights
+class StreamingQuantile:
+
+    def __init__(self, quantile=MEDIAN_QUANTILE):
+        self.quantile = quantile
+        self.count = 0
+        self.heights = list() # Heights of the markers (the first 5 values, sorted, until there are 5)
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired_positions = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value):
+        self.count += 1
+        if self.count <= 5:
+            insort(self.heights, value)
+            return
+        heights, positions = self.heights, self.positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]: cell += 1
+        for marker in range(cell + 1, 5): positions[marker] += 1
+        for marker in range(5): self.desired_positions[marker] += self.increments[marker]
+        for marker in range(1, 4):
+            offset = self.desired_positions[marker] - positions[marker]
+            if (offset >= 1 and positions[marker + 1] - positions[marker] > 1) or (offset <= -1 and positions[marker - 1] - positions[marker] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(marker, step)
+                if not heights[marker - 1] < height < heights[marker + 1]:
+                    height = heights[marker] + step * (heights[marker + step] - heights[marker]) / (positions[marker + step] - positions[marker])
+                heights[marker] = height
+                positions[marker] += step
+
+    def _parabolic(self, marker, step):
+        heights, positions = self.heights, self.positions
+        return heights[marker] + step / (positions[marker + 1] - positions[marker - 1]) * (
+            (positions[marker] - positions[marker - 1] + step) * (heights[marker + 1] - heights[marker]) / (positions[marker + 1] - positions[marker])
+            + (positions[marker + 1] - positions[marker] - step) * (heights[marker] - heights[marker - 1]) / (positions[marker] - positions[marker - 1]))
+
+    # Function to get the estimate of the quantile (exact until there are 5 values), or None without values
+    def value(self):
+        if self.count == 0: return None
+        if self.count <= 5: return self.heights[round(self.quantile * (self.count - 1))]
+        return self.heights[2]
+
+
+# Recent median amount of one category, in cents
+class CategoryMedian:
+
+    def __init__(self):
+        self.previous = None # Sketch of the last ALERT_WINDOW_EXPENSES expenses before the current sketch
+        self.current = StreamingQuantile()
+
+    def add(self, cents):
+        if self.current.count >= ALERT_WINDOW_EXPENSES:
+            self.previous, self.current = self.current, StreamingQuantile()
+        self.current.add(cents)
+
+    def __len__(self):
+        return self.current.count + (self.previous.count if self.previous is not None else 0)
+
+    # The medians of both sketches are weighted by their numbers of expenses
+    def value(self):
+        if self.previous is None or self.current.count == 0:
+            sketch = self.current if self.current.count else self.previous
+            return sketch.value() if sketch is not None else None
+        return ((self.previous.value() * self.previous.count + self.current.value() * self.current.count)
+                / (self.previous.count + self.current.count))
+
+
+# %%
+# Function to project the expenses of a month to its end from the expenses so far, if the month is the current one
+def projectedMonthCents(month_cents, year, month_number, today):
+    if (year, month_number) != (today.year, today.month) or today.day < ALERT_PROJECTION_MIN_DAYS: return month_cents
+    return month_cents * calendar.monthrange(year, month_number)[1] // today.day
+
+
+# Alerts of a storage and its budget store
+class ExpenseAlerts:
+
+    def __init__(self, storage, budgets):
+        self.storage = storage
+        self.budgets = budgets
+        self.medians = None # CategoryMedian of each category code, created by the first check
+        self.synced_rows = 0 # Number of rows of the storage already added to the medians
+
+    # Function to fill the medians with the most recent expenses of each category, reading at most the last ALERT_WARM_UP_ROWS
+    # expenses of the storage backwards
+    def _warmUp(self):
+        self.medians = [CategoryMedian() for _ in self.storage.categories]
+        recent_cents = [list() for _ in self.storage.categories]
+        incomplete_categories = len(recent_cents)
+        for category_code, cents in islice(self.storage.iterCategoryCents(reverse=True), ALERT_WARM_UP_ROWS):
+            category_cents = recent_cents[category_code]
+            if len(category_cents) >= 2 * ALERT_WINDOW_EXPENSES: continue
+            category_cents.append(cents)
+            if len(category_cents) == 2 * ALERT_WINDOW_EXPENSES:
+                incomplete_categories -= 1
+                if incomplete_categories == 0: break
+        for median, category_cents in zip(self.medians, recent_cents):
+            for cents in reversed(category_cents): median.add(cents)
+        self.synced_rows = len(self.storage)
+
+    # Function to add the expenses saved since the last check (by this process or others) to the medians
+    def _catchUp(self):
+        if self.medians is None or len(self.storage) < self.synced_rows: # First check, or file loaded again
+            self._warmUp()
+            return
+        for category_code, cents in self.storage.iterCategoryCents(self.synced_rows):
+            self.medians[category_code].add(cents)
+        self.synced_rows = len(self.storage)
+
+    # Function to get the alerts of an expense about to be saved, as a list of messages (empty if nothing is unusual)
+    # The expense is compared with the expenses already saved; it is taken into account at the next check
+    def check(self, expense, today=None):
+        self._catchUp()
+        alerts = list()
+        cents = amountToCents(expense["amount"])
+        median = self.medians[self.storage.categories.index(expense["category"])]
+        median_cents = median.value()
+        if len(median) >= ALERT_MIN_EXPENSES and median_cents and cents > ALERT_ANOMALY_FACTOR * median_cents:
+            alerts.append(f"Unusual expense: {centsToAmount(cents)} is {cents / median_cents:.1f} times the usual "
+                          f"{expense['category']} expense ({centsToAmount(round(median_cents))})")
+        expense_date = date.fromisoformat(expense["date"])
+        month = monthAbbreviation(expense_date.month)
+        budget = self.budgets.get(str(expense_date.year), {}).get(month)
+        if budget is not None:
+            budget_cents = amountToCents(budget)
+            month_cents = sum(self.storage.categoryCentsForMonth(expense_date.year, expense_date.month).values()) + cents
+            projected_cents = projectedMonthCents(month_cents, expense_date.year, expense_date.month, today or date.today())
+            if month_cents > budget_cents:
+                alerts.append(f"Budget exceeded: the expenses of {month} {expense_date.year} reach {centsToAmount(month_cents)} "
+                              f"for a budget of {centsToAmount(budget_cents)}")
+            elif projected_cents > budget_cents:
+                alerts.append(f"Budget at risk: at this pace, the expenses of {month} {expense_date.year} will reach about "
+                              f"{centsToAmount(projected_cents)} for a budget of {centsToAmount(budget_cents)}")
+        return alerts
@@ -0,0 +1,136 @@
+# %%
+# Persistent store of the monthly budgets: {"2025": {"Apr": 1500.0, "May": 1200.0}}
+# Each change is appended to a journal file (one JSON line, flushed to disk) instead of rewriting the budget file.
+# The budget file is rewritten from time to time (checkpoint) with a write-then-rename, so it is never left half written,
+# and the journal is then emptied. Loading reads the budget file and replays the journal.
+# Several processes (e.g. the command line and the HTTP server) can change the same budgets: the files are only read and
+# written under a lock, and the journal entries of the other processes are replayed before each change and each checkpoint.
+import json
+import os
+
+from expense_storage import ExpenseFileLock, jsonAmount
+
+BUDGET_JOURNAL_SUFFIX = ".journal"
+BUDGET_JOURNAL_CHECKPOINT = 100 # Number of journal entries after which the budget file is rewritten
+
+
+# %%
+# Function to replace the content of a file atomically: the content is written in a temporary file which is then renamed
+def writeFileAtomically(path, content, mode='w'):
+    temporary_path = path + ".tmp"
+    temporary_file = open(temporary_path, mode)
+    temporary_file.write(content)
+    temporary_file.flush()
+    os.fsync(temporary_file.fileno())
+    temporary_file.close()
+    os.replace(temporary_path, path)
+
+
+# %%
+# The budgets are loaded the first time they are read or changed
+class BudgetStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + BUDGET_JOURNAL_SUFFIX
+        self.budgets = None
+        self.journal_entries = 0
+        self.file_states = None # States of the budget file and journal when they were last read or written (see fileStates)
+        self.version = 0 # Incremented whenever the budgets change, e.g. to know when cached reports are outdated
+
+    # Function to read the budget file and replay the journal. An incomplete last journal line (interrupted write) is ignored
+    def load(self):
+        with ExpenseFileLock(self.path):
+            return self._load()
+
+    # Function to get the state of the budget file and of the journal (identity, size and modification time, None if missing),
+    # which changes when another process sets a budget or writes a checkpoint
+    def fileStates(self):
+        states = list()
+        for path in (self.path, self.journal_path):
+            try:
+                file_status = os.stat(path)
+            except FileNotFoundError:
+                states.append(None)
+                continue
+            states.append((file_status.st_dev, file_status.st_ino, file_status.st_size, file_status.st_mtime_ns))
+        return tuple(states)
+
+    # Function to load the budgets again if the files were changed by another process since they were read.
+    # Returns True if they were loaded again
+    def refresh(self):
+        if self.budgets is not None and self.fileStates() == self.file_states: return False
+        self.load()
+        return True
+
+    # Function to load the budgets, the lock being held
+    def _load(self):
+        self.budgets = dict()
+        self.journal_entries = 0
+        self.version += 1
+        if os.path.exists(self.path):
+            budget_file = open(self.path, 'r')
+            self.budgets = json.load(budget_file)
+            budget_file.close()
+        if os.path.exists(self.journal_path):
+            journal_file = open(self.journal_path, 'r+b')
+            valid_size = 0
+            for journal_line in journal_file:
+                try:
+                    if not journal_line.endswith(b"\n"): raise ValueError("incomplete journal line")
+                    entry = json.loads(journal_line)
+                except ValueError:
+                    break
+                self.budgets.setdefault(entry["year"], dict())[entry["month"]] = entry["budget"]
+                self.journal_entries += 1
+                valid_size += len(journal_line)
+            journal_file.truncate(valid_size) # So that the next entries are not appended to an incomplete line
+            journal_file.close()
+        self.file_states = self.fileStates()
+        return self.budgets
+
+    def _loaded(self):
+        if self.budgets is None: self.load()
+        return self.budgets
+
+    def __contains__(self, year):
+        return str(year) in self._loaded()
+
+    def __getitem__(self, year):
+        return self._loaded()[str(year)]
+
+    def get(self, year, default=None):
+        return self._loaded().get(str(year), default)
+
+    def items(self):
+        return self._loaded().items()
+
+    # Function to set the budget of a month (year as "2025", month as "Apr")
+    # The budgets are loaded again first, so that those set by other processes are kept by the next checkpoint
+    def set(self, year, month, budget):
+        with ExpenseFileLock(self.path):
+            self._load()
+            journal_file = open(self.journal_path, 'a')
+            journal_file.write(json.dumps({"year": str(year), "month": month, "budget": budget}, default=jsonAmount) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+            journal_file.close()
+            self.budgets.setdefault(str(year), dict())[month] = budget
+            self.journal_entries += 1
+            self.version += 1
+            if self.journal_entries >= BUDGET_JOURNAL_CHECKPOINT: self._checkpoint()
+            self.file_states = self.fileStates()
+
+    # Function to rewrite the budget file with all budgets and empty the journal
+    # If the process stops between the two steps, replaying the journal again gives the same budgets
+    def checkpoint(self):
+        with ExpenseFileLock(self.path):
+            self._load()
+            self._checkpoint()
+            self.file_states = self.fileStates()
+
+    # Function to write the checkpoint of the budgets loaded under the lock
+    def _checkpoint(self):
+        writeFileAtomically(self.path, json.dumps(self.budgets, indent=2, sort_keys=True, default=jsonAmount))
+        open(self.journal_path, 'w').close()
+        self.journal_entries = 0
@@ -0,0 +1,113 @@
+# %%
+# Compact in-memory representation of the expenses.
+# Each field is kept in a typed array (date as a day ordinal, category as its index in the list of categories,
+# amount in integer cents) and descriptions are interned in a pool, so a row costs a few bytes instead of a dictionary.
+# Reading a row still returns the usual expense dictionary.
+import array
+import sys
+from decimal import Decimal
+
+from expense_dates import dateOrdinal, formatDateOrdinal
+
+MIN_AMOUNT_CENTS = -2**63 # Range of the amount column (signed 64-bit integers)
+MAX_AMOUNT_CENTS = 2**63 - 1
+
+
+class ExpenseColumns:
+
+    def __init__(self, categories):
+        self.categories = tuple(categories)
+        self.category_codes = {category: code for code, category in enumerate(self.categories)}
+        self.date_ordinals = array.array('i')
+        self.category_codes_column = array.array('B')
+        self.amount_cents = array.array('q')
+        self.description_ids = array.array('I')
+        self.description_pool = list()
+        self.description_pool_ids = dict()
+
+    def __len__(self):
+        return len(self.date_ordinals)
+
+    # Function to get the id of a description in the pool, adding it if needed
+    def internDescription(self, description):
+        description_id = self.description_pool_ids.get(description)
+        if description_id is None:
+            description_id = len(self.description_pool)
+            self.description_pool.append(description)
+            self.description_pool_ids[description] = description_id
+        return description_id
+
+    # Function to add a row whose fields are already encoded
+    # If a field does not fit its column (OverflowError, TypeError), the columns already appended to are truncated back,
+    # so all the columns keep the same length
+    def appendRow(self, date_ordinal, category_code, cents, description):
+        row = len(self)
+        try:
+            self.date_ordinals.append(date_ordinal)
+            self.category_codes_column.append(category_code)
+            self.amount_cents.append(cents)
+            self.description_ids.append(self.internDescription(description))
+        except (OverflowError, TypeError):
+            for column in (self.date_ordinals, self.category_codes_column, self.amount_cents, self.description_ids):
+                del column[row:]
+            raise
+
+    # Function to add an expense (date as YYYY-MM-DD, category name, amount in cents, description)
+    def append(self, expense_date, category, cents, description):
+        self.appendRow(dateOrdinal(expense_date), self.category_codes[category], cents, description)
+
+    # Function to rebuild the expense dictionary of a row
+    def expenseAt(self, row):
+        return {"date": formatDateOrdinal(self.date_ordinals[row]),
+                "category": self.categories[self.category_codes_column[row]],
+                "amount": Decimal(self.amount_cents[row]).scaleb(-2),
+                "description": self.description_pool[self.description_ids[row]]}
+
+    def __getitem__(self, row):
+        if row < 0: row += len(self)
+        if not 0 <= row < len(self): raise IndexError("expense row out of range")
+        return self.expenseAt(row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.expenseAt(row)
+
+    # Function to get lazily the rows matching the filters (None means no filter), as a pipeline of generators
+    # The date limits are day ordinals and the amount limits are in cents, all inclusive
+    # The rows to filter can be given (e.g. the rows found by a description search), otherwise all rows are filtered
+    def iterRows(self, first_ordinal=None, last_ordinal=None, category=None, min_cents=None, max_cents=None, rows=None):
+        rows = iter(rows if rows is not None else range(len(self)))
+        if first_ordinal is not None or last_ordinal is not None:
+            date_ordinals = self.date_ordinals
+            low = first_ordinal if first_ordinal is not None else -2**31
+            high = last_ordinal if last_ordinal is not None else 2**31 - 1
+            rows = (row for row in rows if low <= date_ordinals[row] <= high)
+        if category is not None:
+            category_codes_column = self.category_codes_column
+            category_code = self.category_codes.get(category)
+            rows = (row for row in rows if category_codes_column[row] == category_code)
+        if min_cents is not None or max_cents is not None:
+            amount_cents = self.amount_cents
+            low = min_cents if min_cents is not None else MIN_AMOUNT_CENTS
+            high = max_cents if max_cents is not None else MAX_AMOUNT_CENTS
+            rows = (row for row in rows if low <= amount_cents[row] <= high)
+        return rows
+
+    # Function to sum the amounts in cents of the rows whose date is between two ordinals (inclusive),
+    # optionally restricted to one category
+    def totalCentsBetween(self, first_ordinal, last_ordinal, category=None):
+        amount_cents = self.amount_cents
+        if category is None:
+            return sum(amount_cents[row] for row, date_ordinal in enumerate(self.date_ordinals)
+                       if first_ordinal <= date_ordinal <= last_ordinal)
+        category_code = self.category_codes[category]
+        category_codes_column = self.category_codes_column
+        return sum(amount_cents[row] for row, date_ordinal in enumerate(self.date_ordinals)
+                   if first_ordinal <= date_ordinal <= last_ordinal and category_codes_column[row] == category_code)
+
+    # Function to get the approximate memory used by the columns and the description pool, in bytes
+    def memoryUsage(self):
+        columns_size = sum(column.buffer_info()[1] * column.itemsize for column in
+                           (self.date_ordinals, self.category_codes_column, self.amount_cents, self.description_ids))
+        pool_size = sys.getsizeof(self.description_pool) + sum(sys.getsizeof(description) for description in self.description_pool)
+        return columns_size + pool_size + sys.getsizeof(self.description_pool_ids)
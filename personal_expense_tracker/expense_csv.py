@@ -0,0 +1,126 @@
+# %%
+# Streaming reader of CSV files (RFC 4180), used to load the expense files.
+# The file is read in fixed-size chunks and its records are returned one at a time, so the memory used does not
+# depend on the size of the file. Lines without quotes (nearly all the lines of an expense file) are simply split on
+# the delimiter; lines with quotes are parsed by the csv module, and a quoted field may span several lines.
+# Malformed records are returned with their line number and the reason, instead of stopping the reading.
+import csv
+
+CSV_READ_CHUNK_SIZE = 1 << 20 # Bytes read at a time
+CSV_QUOTE = '"'
+CSV_MAX_RECORD_LINES = 100 # Lines of a record with a quoted new line after which its quote is considered never closed
+
+# States of the scan of a line containing quotes
+CSV_FIELD_START = 0
+CSV_IN_FIELD = 1
+CSV_IN_QUOTED_FIELD = 2
+CSV_QUOTE_IN_QUOTED_FIELD = 3
+
+
+# %%
+# Function to find whether a line ends inside a quoted field, i.e. whether its record continues on the next line
+# Returns the state at the end of the line, starting from the given state
+def scanQuotes(line, delimiter, state=CSV_FIELD_START):
+    for char in line:
+        if state == CSV_IN_QUOTED_FIELD:
+            if char == CSV_QUOTE: state = CSV_QUOTE_IN_QUOTED_FIELD
+        elif char == delimiter:
+            state = CSV_FIELD_START
+        elif state == CSV_FIELD_START:
+            state = CSV_IN_QUOTED_FIELD if char == CSV_QUOTE else CSV_IN_FIELD
+        elif state == CSV_QUOTE_IN_QUOTED_FIELD:
+            state = CSV_IN_QUOTED_FIELD if char == CSV_QUOTE else CSV_IN_FIELD # "" is an escaped quote
+    return state
+
+# Function to split a record containing quotes into fields. Returns (fields, None), or (None, reason) if it is malformed
+def parseQuotedRecord(record, delimiter):
+    try:
+        return next(csv.reader((record,), delimiter=delimiter, strict=True)), None
+    except csv.Error as error:
+        return None, f"malformed quoted field ({error})"
+
+# Function to format a field, quoting it if it contains the delimiter, a quote or a new line
+def formatCsvField(value, delimiter=","):
+    value = str(value)
+    if delimiter in value or CSV_QUOTE in value or "\n" in value or "\r" in value:
+        return CSV_QUOTE + value.replace(CSV_QUOTE, CSV_QUOTE * 2) + CSV_QUOTE
+    return value
+
+
+# %%
+# Reader of the records of a CSV file opened in binary mode, from its current position.
+# Iterating gives (line number, fields, None) for each record, or (line number, None, reason) for a malformed record.
+# Blank lines are skipped. After the iteration, offset is the position in the file after the last record read
+# and line_number the number of the next line, to continue reading the file later (e.g. after other lines are appended).
+# With complete_only, a last record without new line (possibly still being written) is not read.
+# size limits the number of bytes read (e.g. to the size of the file when it was locked).
+class CsvRecordReader:
+
+    def __init__(self, csv_file, delimiter=",", first_line_number=1, complete_only=False, size=None,
+                 chunk_size=CSV_READ_CHUNK_SIZE):
+        self.csv_file = csv_file
+        self.delimiter = delimiter
+        self.offset = csv_file.tell()
+        self.line_number = first_line_number
+        self.complete_only = complete_only
+        self.size = size
+        self.chunk_size = chunk_size
+        self.record_lines = None # Lines of a record whose quoted field continues on the next line
+        self.record_line_number = 0
+        self.quote_state = CSV_FIELD_START
+
+    def __iter__(self):
+        pending = b"" # Bytes after the last new line read
+        remaining_size = self.size
+        while remaining_size is None or remaining_size > 0:
+            chunk = self.csv_file.read(self.chunk_size if remaining_size is None else min(self.chunk_size, remaining_size))
+            if not chunk: break
+            if remaining_size is not None: remaining_size -= len(chunk)
+            data = pending + chunk
+            end = data.rfind(b"\n") + 1
+            pending = data[end:]
+            if end == 0: continue
+            lines = data[:end].decode("utf-8", errors="replace").split("\n")
+            lines.pop() # Empty string after the last new line
+            self.offset += end
+            yield from self._records(lines)
+        if pending and not self.complete_only:
+            yield from self._records([pending.decode("utf-8", errors="replace")])
+            self.offset += len(pending)
+            self.line_number -= 1 # The last line has no new line yet: lines appended later may complete it
+        if self.record_lines is not None:
+            if self.complete_only:
+                self.offset -= sum(len(line.encode("utf-8")) + 1 for line in self.record_lines)
+                self.line_number = self.record_line_number
+            else:
+                yield self.record_line_number, None, "quoted field not closed at the end of the file"
+            self.record_lines = None
+
+    # Function to get the records of complete lines (without their new line)
+    def _records(self, lines):
+        delimiter = self.delimiter
+        line_number = self.line_number - 1
+        for line in lines:
+            line_number += 1
+            if self.record_lines is None:
+                if CSV_QUOTE not in line:
+                    if line[-1:] == "\r": line = line[:-1]
+                    if line: yield line_number, line.split(delimiter), None
+                    continue
+                self.quote_state = scanQuotes(line, delimiter)
+                if self.quote_state != CSV_IN_QUOTED_FIELD:
+                    yield (line_number,) + parseQuotedRecord(line[:-1] if line.endswith("\r") else line, delimiter)
+                    continue
+                self.record_lines, self.record_line_number = [line], line_number
+                continue
+            # Line continuing a quoted field
+            self.record_lines.append(line)
+            self.quote_state = scanQuotes(line, delimiter, self.quote_state)
+            if self.quote_state != CSV_IN_QUOTED_FIELD:
+                record = "\n".join(self.record_lines)
+                self.record_lines = None
+                yield (self.record_line_number,) + parseQuotedRecord(record[:-1] if record.endswith("\r") else record, delimiter)
+            elif len(self.record_lines) >= CSV_MAX_RECORD_LINES:
+                self.record_lines = None
+                yield self.record_line_number, None, f"quoted field not closed (lines {self.record_line_number} to {line_number} skipped)"
+        self.line_number = line_number + 1
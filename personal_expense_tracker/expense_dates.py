@@ -0,0 +1,60 @@
+# %%
+# Date parsing of the expense tracker.
+# Dates are parsed once into day ordinals (number of days since 0001-01-01), and all date comparisons are done
+# on these integers. Dates in the canonical YYYY-MM-DD form are parsed with the fast ISO parser; other spellings accepted
+# by the original validation (e.g. 2025-4-5) fall back to strptime, about 30 times slower, which is memoized.
+# A column of dates is parsed once per distinct date (parseDateOrdinals), since a ledger repeats the same dates many times.
+import array
+from datetime import date, datetime
+from functools import lru_cache
+
+VALID_DATE_FORMAT = "%Y-%m-%d"
+DATE_CACHE_SIZE = 65536
+
+
+# %%
+# Function to parse a date in format YYYY-MM-DD. Returns (ordinal, year, month), or None if the date is invalid
+def parseDate(date_text):
+    try:
+        if len(date_text) == 10 and date_text[4] == "-" and date_text[7] == "-":
+            parsed_date = date.fromisoformat(date_text)
+        else:
+            parsed_date = parseLooseDate(date_text)
+    except (ValueError, TypeError):
+        return None
+    return parsed_date.toordinal(), parsed_date.year, parsed_date.month
+
+# Function to parse a date written without the leading zeros (e.g. 2025-4-5) with strptime; raises ValueError if it is invalid
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parseLooseDate(date_text):
+    return datetime.strptime(date_text, VALID_DATE_FORMAT).date()
+
+# Function to get the day ordinal of a date in format YYYY-MM-DD; raises ValueError if the date is invalid
+def dateOrdinal(date_text):
+    parsed_date = parseDate(date_text)
+    if parsed_date is None: raise ValueError(f"Invalid date {date_text!r}: expected format YYYY-MM-DD")
+    return parsed_date[0]
+
+# Function to format a day ordinal as YYYY-MM-DD
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def formatDateOrdinal(date_ordinal):
+    return date.fromordinal(date_ordinal).strftime(VALID_DATE_FORMAT)
+
+# Function to normalize a valid date to YYYY-MM-DD (e.g. 2025-4-5 becomes 2025-04-05)
+def normalizeDate(date_text):
+    return formatDateOrdinal(dateOrdinal(date_text))
+
+def todayOrdinal():
+    return date.today().toordinal()
+
+# Function to parse a column of dates at once: each distinct date is parsed once
+# Returns the day ordinals in an array; raises ValueError if a date is invalid
+def parseDateOrdinals(date_texts):
+    ordinals = {date_text: dateOrdinal(date_text) for date_text in set(date_texts)}
+    return array.array('i', map(ordinals.__getitem__, date_texts))
+
+# Function to get the first and last day ordinals of a month
+def monthOrdinalRange(year, month_number):
+    first_ordinal = date(year, month_number, 1).toordinal()
+    next_month_ordinal = date(year + month_number // 12, month_number % 12 + 1, 1).toordinal()
+    return first_ordinal, next_month_ordinal - 1
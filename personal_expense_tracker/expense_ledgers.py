@@ -0,0 +1,146 @@
+# %%
+# Ledgers of many users (or households) served by one process.
+# Each user has their own expense file and budget file in a directory <root>/<shard>/<user>/, where the shard is
+# derived from a hash of the user name, so that no directory holds too many users. The ledgers used most recently
+# are kept open in memory with their rollups and reports (least recently used cache); the others are closed
+# and loaded again when needed.
+import hashlib
+import os
+import re
+from collections import OrderedDict
+
+from expense_alerts import ExpenseAlerts
+from expense_budgets import BudgetStore
+from expense_recurring import RecurringRuleStore, materializeRecurringExpenses
+from expense_reports import ReportEngine
+from expense_storage import BinaryExpenseStorage, CsvExpenseStorage
+
+USER_NAME_PATTERN = re.compile(r"[a-z0-9_-][a-z0-9_.-]{0,63}") # User names are case insensitive, stored in lowercase
+LEDGER_SHARD_COUNT = 256
+DEFAULT_OPEN_LEDGERS = 1000 # Number of ledgers kept open in memory
+USER_EXPENSE_FILE = "expense_database.csv"
+USER_LEDGER_FILE = "expense_database.ledger"
+USER_BUDGET_FILE = "budget_database.json"
+USER_RECURRING_FILE = "recurring_expenses.json"
+
+
+# %%
+# Function to check and normalize a user name; raises ValueError if it cannot be used as a directory name
+def normalizeUserName(user):
+    if not isinstance(user, str) or USER_NAME_PATTERN.fullmatch(user.lower()) is None:
+        raise ValueError(f"Invalid user name {user!r}: expected 1 to 64 letters, digits, '_', '-' or '.' (not first)")
+    return user.lower()
+
+# Function to get the directory of a user's files: <root>/<shard>/<user>
+def userDirectory(root, user):
+    user = normalizeUserName(user)
+    shard = int.from_bytes(hashlib.sha1(user.encode("utf-8")).digest()[:4], "big") % LEDGER_SHARD_COUNT
+    return os.path.join(root, f"{shard:02x}", user)
+
+# Function to get the paths of a user's expense CSV file, expense ledger file and budget file
+def userLedgerPaths(root, user):
+    directory = userDirectory(root, user)
+    return (os.path.join(directory, USER_EXPENSE_FILE), os.path.join(directory, USER_LEDGER_FILE),
+            os.path.join(directory, USER_BUDGET_FILE))
+
+# Function to get the path of a user's recurring expense rules
+def userRecurringPath(root, user):
+    return os.path.join(userDirectory(root, user), USER_RECURRING_FILE)
+
+# Function to list the users having a directory under root, in alphabetical order
+def listUsers(root):
+    users = list()
+    if not os.path.isdir(root): return users
+    for shard in os.listdir(root):
+        shard_directory = os.path.join(root, shard)
+        if len(shard) != 2 or not os.path.isdir(shard_directory): continue
+        users += [user for user in os.listdir(shard_directory)
+                  if USER_NAME_PATTERN.fullmatch(user) and userDirectory(root, user) == os.path.join(shard_directory, user)]
+    return sorted(users)
+
+
+# %%
+# Expense storage, budgets and reports of one user
+class UserLedger:
+
+    def __init__(self, root, user, categories, backend="csv", delimiter=","):
+        self.user = normalizeUserName(user)
+        self.directory = userDirectory(root, self.user)
+        database_path, ledger_path, budget_path = userLedgerPaths(root, self.user)
+        if backend == "binary":
+            self.storage = BinaryExpenseStorage(ledger_path, categories)
+        else:
+            self.storage = CsvExpenseStorage(database_path, categories, delimiter)
+        self.budgets = BudgetStore(budget_path)
+        self.recurring = RecurringRuleStore(userRecurringPath(root, self.user))
+        self.reports = ReportEngine(self.storage, self.budgets)
+        self.alerts = ExpenseAlerts(self.storage, self.budgets)
+
+    # Function to load the user's expenses, creating their directory and expense file the first time
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.storage.exists(): self.storage.load()
+        else: self.storage.create()
+        return self
+
+    def close(self):
+        self.storage.close()
+
+
+# Least recently used cache of the open ledgers
+class LedgerPool:
+
+    def __init__(self, root, categories, backend="csv", capacity=DEFAULT_OPEN_LEDGERS, delimiter=","):
+        self.root = root
+        self.categories = tuple(categories)
+        self.backend = backend
+        self.capacity = capacity
+        self.delimiter = delimiter
+        self.ledgers = OrderedDict() # user -> UserLedger, from the least to the most recently used
+        self.pinned = set() # Users whose ledger is in use (e.g. written by another thread) and must not be closed
+
+    def __len__(self):
+        return len(self.ledgers)
+
+    def __contains__(self, user):
+        return normalizeUserName(user) in self.ledgers
+
+    # Function to check if a user has a ledger (open, or an expense file of the backend on disk), without creating anything
+    def exists(self, user):
+        user = normalizeUserName(user)
+        if user in self.ledgers: return True
+        database_path, ledger_path, _ = userLedgerPaths(self.root, user)
+        return os.path.exists(ledger_path if self.backend == "binary" else database_path)
+
+    # Function to get the ledger of a user, loading it if it is not open. The least recently used ledgers are closed if needed,
+    # except the pinned ones (the pool then holds more ledgers than its capacity until they are unpinned)
+    def get(self, user):
+        user = normalizeUserName(user)
+        ledger = self.ledgers.get(user)
+        if ledger is not None:
+            self.ledgers.move_to_end(user)
+            return ledger
+        ledger = UserLedger(self.root, user, self.categories, self.backend, self.delimiter).open()
+        self.ledgers[user] = ledger
+        for evicted_user in list(self.ledgers):
+            if len(self.ledgers) <= self.capacity: break
+            if evicted_user not in self.pinned: self.ledgers.pop(evicted_user).close()
+        return ledger
+
+    # Function to materialize the recurring expenses due up to through_date of each user (see expense_recurring),
+    # with one write per user. The ledger of a user is only loaded if one of their rules has an occurrence due.
+    # Returns {user: number of expenses added} for the users whose ledger was loaded
+    def materializeRecurringExpenses(self, users, through_date):
+        added_counts = dict()
+        for user in users:
+            user = normalizeUserName(user)
+            ledger = self.ledgers.get(user)
+            rule_store = ledger.recurring if ledger is not None else RecurringRuleStore(userRecurringPath(self.root, user))
+            if not rule_store.dueExpenses(through_date): continue
+            ledger = self.get(user)
+            added_counts[user] = len(materializeRecurringExpenses(ledger.storage, ledger.recurring, through_date))
+        return added_counts
+
+    def close(self):
+        for ledger in self.ledgers.values(): ledger.close()
+        self.ledgers.clear()
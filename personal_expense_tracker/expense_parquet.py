@@ -0,0 +1,125 @@
+# %%
+# Export of the expenses to Parquet files for analytics tools (pandas, DuckDB, Spark...), and import back.
+# The files are partitioned by year and month in Hive-style directories (<directory>/year=2025/month=4/expenses-0.parquet),
+# so a query on some months only reads their files, and the columns are typed:
+# date (date32), category (dictionary of the expense categories), amount (decimal with 2 digits, exact) and description.
+# The columns are built directly from the typed arrays of the storage (see expense_columns), without a dictionary per expense.
+# pyarrow is optional: it is only needed by the functions of this module, which import it the first time they are called
+# (importing it takes longer than starting the tracker).
+import array
+import calendar
+from datetime import date
+
+from expense_columns import ExpenseColumns
+from expense_storage import amountToCents
+
+ARROW_EPOCH_ORDINAL = date(1970, 1, 1).toordinal() # Arrow dates are numbers of days since 1970-01-01
+PARQUET_BASENAME_TEMPLATE = "expenses-{i}.parquet"
+PARQUET_AMOUNT_PRECISION = 19 # Digits of the amounts, 2 of them after the decimal point (enough for any 64-bit amount in cents)
+PARQUET_COLUMNS = ("date", "category", "amount", "description")
+
+
+# %%
+# Function to import pyarrow and the modules used here; raises ImportError if it is not installed
+def requireArrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+    except ImportError as error:
+        raise ImportError("The Parquet export needs the pyarrow package (pip install pyarrow)") from error
+    return pyarrow
+
+# Function to widen the dates of an export (YYYY-MM-DD or None) to whole months, the unit of the partitions
+def monthAlignedDates(first_date=None, last_date=None):
+    if first_date is not None: first_date = date.fromisoformat(first_date).replace(day=1).isoformat()
+    if last_date is not None:
+        last_date = date.fromisoformat(last_date)
+        last_date = last_date.replace(day=calendar.monthrange(last_date.year, last_date.month)[1]).isoformat()
+    return first_date, last_date
+
+def partitionSchema():
+    pyarrow = requireArrow()
+    return pyarrow.schema([("year", pyarrow.int16()), ("month", pyarrow.int8())])
+
+def expenseSchema():
+    pyarrow = requireArrow()
+    return pyarrow.schema([("date", pyarrow.date32()),
+                           ("category", pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+                           ("amount", pyarrow.decimal128(PARQUET_AMOUNT_PRECISION, 2)),
+                           ("description", pyarrow.string())])
+
+# Function to wrap the content of a typed array into an Arrow array of the given type (one copy of the bytes)
+def arrowArray(arrow_type, values):
+    pyarrow = requireArrow()
+    return pyarrow.Array.from_buffers(arrow_type, len(values), [None, pyarrow.py_buffer(values.tobytes())])
+
+# Function to convert amounts in cents into Arrow decimals with 2 digits after the decimal point
+# A decimal is stored as a 128-bit integer (the amount in cents), i.e. the 64-bit cents followed by their sign extension
+def centsToArrowDecimals(amount_cents):
+    pyarrow = requireArrow()
+    decimal_words = array.array('q', bytes(16 * len(amount_cents)))
+    decimal_words[0::2] = amount_cents
+    decimal_words[1::2] = array.array('q', (-1 if cents < 0 else 0 for cents in amount_cents))
+    return pyarrow.Array.from_buffers(pyarrow.decimal128(PARQUET_AMOUNT_PRECISION, 2), len(amount_cents),
+                                      [None, pyarrow.py_buffer(decimal_words.tobytes())])
+
+# Function to get the expenses of a storage (optionally between two dates YYYY-MM-DD) as an Arrow table,
+# with the year and month columns used for the partitions
+def expenseTable(storage, first_date=None, last_date=None):
+    pyarrow = requireArrow()
+    columns = getattr(storage, "expenses", None)
+    if not isinstance(columns, ExpenseColumns) or first_date is not None or last_date is not None:
+        columns = ExpenseColumns(storage.categories)
+        for expense in storage.iterExpenses(first_date, last_date):
+            columns.append(expense["date"], expense["category"], amountToCents(expense["amount"]), expense["description"])
+    days = pyarrow.compute.subtract(arrowArray(pyarrow.int32(), columns.date_ordinals), ARROW_EPOCH_ORDINAL)
+    dates = days.cast(pyarrow.int32()).view(pyarrow.date32())
+    categories = pyarrow.DictionaryArray.from_arrays(arrowArray(pyarrow.uint8(), columns.category_codes_column).cast(pyarrow.int8()),
+                                                     pyarrow.array(columns.categories, pyarrow.string()))
+    descriptions = pyarrow.array(columns.description_pool, pyarrow.string()).take(arrowArray(pyarrow.uint32(), columns.description_ids))
+    return pyarrow.Table.from_arrays(
+        [dates, categories, centsToArrowDecimals(columns.amount_cents), descriptions,
+         pyarrow.compute.year(dates).cast(pyarrow.int16()), pyarrow.compute.month(dates).cast(pyarrow.int8())],
+        schema=expenseSchema().append(pyarrow.field("year", pyarrow.int16()))
+                                                .append(pyarrow.field("month", pyarrow.int8())))
+
+# Function to export the expenses of a storage (optionally between two dates) to Parquet files partitioned by year and month
+# The partitions of the exported months are replaced; the other partitions already in the directory are kept,
+# so the export of the last month can be added to a complete export. Returns the number of expenses exported
+# The dates are widened to whole months: a partition replaced by only part of its month would lose the other expenses
+def exportParquet(storage, directory, first_date=None, last_date=None):
+    pyarrow = requireArrow()
+    table = expenseTable(storage, *monthAlignedDates(first_date, last_date))
+    pyarrow.dataset.write_dataset(table, directory, format="parquet",
+                                  partitioning=pyarrow.dataset.partitioning(partitionSchema(), flavor="hive"),
+                                  basename_template=PARQUET_BASENAME_TEMPLATE, existing_data_behavior="delete_matching")
+    return table.num_rows
+
+# Function to read exported expenses as an Arrow table, optionally between two dates (YYYY-MM-DD) and only some columns
+# Only the partitions of the months between the two dates are read
+# The files are read with the current schema, so the amounts of older exports (precision 18) are read with the current precision
+def readParquet(directory, first_date=None, last_date=None, columns=PARQUET_COLUMNS):
+    pyarrow = requireArrow()
+    schema = expenseSchema()
+    for field in partitionSchema(): schema = schema.append(field)
+    dataset = pyarrow.dataset.dataset(directory, format="parquet", schema=schema,
+                                      partitioning=pyarrow.dataset.partitioning(partitionSchema(), flavor="hive"))
+    year, month, expense_date = pyarrow.dataset.field("year"), pyarrow.dataset.field("month"), pyarrow.dataset.field("date")
+    expression = None
+    if first_date is not None:
+        first_date = date.fromisoformat(first_date)
+        expression = (((year > first_date.year) | ((year == first_date.year) & (month >= first_date.month)))
+                      & (expense_date >= first_date))
+    if last_date is not None:
+        last_date = date.fromisoformat(last_date)
+        last_expression = (((year < last_date.year) | ((year == last_date.year) & (month <= last_date.month)))
+                           & (expense_date <= last_date))
+        expression = last_expression if expression is None else expression & last_expression
+    return dataset.to_table(columns=list(columns), filter=expression)
+
+# Function to read exported expenses as rows of texts [date, category, amount, description], e.g. to import them
+def readParquetRows(directory, first_date=None, last_date=None):
+    table = readParquet(directory, first_date, last_date)
+    return [[expense_date.isoformat(), category, str(amount), description or ""]
+            for expense_date, category, amount, description in zip(*(table.column(name).to_pylist() for name in PARQUET_COLUMNS))]
@@ -0,0 +1,132 @@
+# %%
+# Recurring expenses (rent, insurance premiums, subscriptions...): rules saved in a JSON file and materialized as
+# expenses by a scheduler run, e.g. from a nightly cron job.
+# {"Home insurance": {"category": "Housing", "amount": 682.42, "description": "Home insurance premium",
+#                     "frequency": "monthly", "day": 5, "start": "2025-01-05", "end": null, "materialized_through": "2025-04-30"}}
+# A run creates the occurrences due since the previous run up to a given date and saves them with a single write.
+# Running it again does nothing: each rule remembers the date up to which it was materialized, and an occurrence
+# already in the ledger (same date, category, amount and description, e.g. after a run interrupted between
+# the write of the expenses and the save of the rules) is not added again.
+import calendar
+import json
+import os
+from collections import Counter
+from datetime import date, timedelta
+
+from expense_budgets import writeFileAtomically
+from expense_storage import amountToCents, centsToAmount, jsonAmount, makeExpense
+
+RECURRING_FREQUENCY_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12} # Months between two occurrences
+
+
+# %%
+# Function to get the dates of the occurrences of a rule between two dates (inclusive)
+# The day of the rule is moved to the last day of the shorter months (e.g. day 31 in April is April 30)
+def ruleOccurrences(rule, first_date, last_date):
+    start = date.fromisoformat(rule["start"])
+    if rule.get("end") is not None: last_date = min(last_date, date.fromisoformat(rule["end"]))
+    first_date = max(first_date, start)
+    step = RECURRING_FREQUENCY_MONTHS[rule["frequency"]]
+    year, month_number = start.year, start.month
+    while True:
+        occurrence = date(year, month_number, min(rule["day"], calendar.monthrange(year, month_number)[1]))
+        if occurrence > last_date: return
+        if occurrence >= first_date: yield occurrence
+        month_number += step
+        year, month_number = year + (month_number - 1) // 12, (month_number - 1) % 12 + 1
+
+# Function to get the key identifying an expense when looking for the occurrences already in the ledger
+def expenseKey(expense):
+    return expense["date"], expense["category"], amountToCents(expense["amount"]), expense["description"]
+
+
+# %%
+# Rules of the recurring expenses of a ledger, by name. The rule file is loaded the first time it is used
+class RecurringRuleStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.rules = None
+
+    def load(self):
+        self.rules = dict()
+        if os.path.exists(self.path):
+            rule_file = open(self.path, 'r')
+            self.rules = json.load(rule_file)
+            rule_file.close()
+        return self.rules
+
+    def _loaded(self):
+        return self.rules if self.rules is not None else self.load()
+
+    def save(self):
+        writeFileAtomically(self.path, json.dumps(self._loaded(), indent=2, sort_keys=True, default=jsonAmount))
+
+    def __len__(self):
+        return len(self._loaded())
+
+    def items(self):
+        return self._loaded().items()
+
+    # Function to add or replace a rule; raises ValueError if it is invalid
+    # The category and the description are not checked here: they are checked by the tracker like those of any expense
+    def set(self, name, category, amount, description, start, day=None, frequency="monthly", end=None):
+        if not isinstance(name, str) or not name.strip(): raise ValueError("The name of a recurring expense must be a non-empty text")
+        if frequency not in RECURRING_FREQUENCY_MONTHS: raise ValueError(f"Unknown frequency {frequency!r}: expected one of {', '.join(RECURRING_FREQUENCY_MONTHS)}")
+        start_date = date.fromisoformat(start)
+        day = int(day) if day is not None else start_date.day
+        if not 1 <= day <= 31: raise ValueError(f"Invalid day {day!r}: expected a number between 1 and 31")
+        if end is not None and date.fromisoformat(end) < start_date: raise ValueError(f"The end date {end} is before the start date {start}")
+        if amountToCents(amount) <= 0: raise ValueError(f"Invalid amount {amount!r}: expected a number greater than 0")
+        rule = {"category": category, "amount": centsToAmount(amountToCents(amount)), "description": description,
+                "frequency": frequency, "day": day, "start": start_date.isoformat(), "end": end}
+        previous_rule = self._loaded().get(name)
+        if previous_rule is not None and previous_rule.get("materialized_through") is not None:
+            rule["materialized_through"] = previous_rule["materialized_through"] # Past occurrences are not created again
+        self.rules[name] = rule
+        self.save()
+        return rule
+
+    def remove(self, name):
+        if name not in self._loaded(): raise ValueError(f"Unknown recurring expense {name!r}")
+        del self.rules[name]
+        self.save()
+
+    # Function to get the expenses of the occurrences due up to a date and not materialized yet, in the order of the rules
+    def dueExpenses(self, through_date):
+        expenses = list()
+        for rule in self._loaded().values():
+            materialized_through = rule.get("materialized_through")
+            first_date = date.fromisoformat(materialized_through) + timedelta(days=1) if materialized_through else date.min
+            for occurrence in ruleOccurrences(rule, first_date, through_date):
+                expenses.append(makeExpense(occurrence.isoformat(), rule["category"], centsToAmount(amountToCents(rule["amount"])), rule["description"]))
+        return expenses
+
+    # Function to record that the rules were materialized up to a date
+    def markMaterialized(self, through_date):
+        changed = False
+        for rule in self._loaded().values():
+            if rule.get("materialized_through") is None or rule["materialized_through"] < through_date.isoformat():
+                rule["materialized_through"] = through_date.isoformat()
+                changed = True
+        if changed: self.save()
+
+
+# %%
+# Function to materialize the occurrences due up to through_date in a storage, with a single write. Returns the expenses added
+# The expenses already in the storage between the first due date and through_date are read once to skip the occurrences
+# already recorded (counted, so that two identical rules still give two expenses)
+def materializeRecurringExpenses(storage, rule_store, through_date):
+    expenses = rule_store.dueExpenses(through_date)
+    if expenses:
+        first_date = min(expense["date"] for expense in expenses)
+        recorded = Counter(map(expenseKey, storage.iterExpenses(first_date=first_date, last_date=through_date.isoformat())))
+        new_expenses = list()
+        for expense in expenses:
+            key = expenseKey(expense)
+            if recorded[key] > 0: recorded[key] -= 1
+            else: new_expenses.append(expense)
+        expenses = sorted(new_expenses, key=lambda expense: expense["date"])
+        if expenses: storage.extend(expenses)
+    rule_store.markMaterialized(through_date)
+    return expenses
@@ -0,0 +1,147 @@
+# %%
+# Period reports of the expense tracker: budget versus actual expenses by month, by quarter, over a rolling window
+# of days and by category. Monthly figures come from the rollups of the storage (no expense is read); a rolling window
+# is summed in one pass over its rows. Reports are memoized and computed again only after the expenses or the budgets
+# changed, which is detected with the version numbers of the storage and of the budget store.
+import csv
+import io
+import json
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from expense_dates import monthOrdinalRange
+from expense_storage import amountToCents, centsToAmount, jsonAmount
+
+REPORT_PERIODS = ("year", "quarter", "rolling", "category")
+REPORT_FORMATS = ("csv", "json")
+REPORT_COLUMNS = ("period", "category", "budget", "expenses", "remaining", "budget_used")
+REPORT_ALL_CATEGORIES = "All"
+DEFAULT_ROLLING_DAYS = 30
+REPORT_CACHE_SIZE = 64 # Number of reports kept in memory
+
+
+# %%
+# Function to build a report row. Amounts are given in cents (budget None if no budget is defined)
+# budget_used is the share of the budget spent, in percent; the budget of a category row is the budget of the whole period
+def reportRow(period, category, budget_cents, expense_cents, show_budget=True):
+    return {
+        "period": period,
+        "category": category,
+        "budget": centsToAmount(budget_cents) if show_budget and budget_cents is not None else None,
+        "expenses": centsToAmount(expense_cents),
+        "remaining": centsToAmount(budget_cents - expense_cents) if show_budget and budget_cents is not None else None,
+        "budget_used": round(100 * expense_cents / budget_cents, 1) if budget_cents else None
+    }
+
+# Function to format report rows as CSV (empty cell when there is no value) or JSON
+def formatReport(rows, report_format):
+    if report_format == "json": return json.dumps(rows, indent=2, default=jsonAmount)
+    if report_format != "csv": raise ValueError(f"Unknown report format {report_format!r}: expected one of {', '.join(REPORT_FORMATS)}")
+    output = io.StringIO()
+    writer = csv.DictWriter(output, REPORT_COLUMNS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+def monthAbbreviation(month_number):
+    return date(2000, month_number, 1).strftime('%b')
+
+
+# %%
+class ReportEngine:
+
+    def __init__(self, storage, budgets):
+        self.storage = storage
+        self.budgets = budgets
+        self.cache = OrderedDict() # (report arguments) -> (storage version, budgets version, rows)
+
+    # Function to get a report as a list of rows (see REPORT_COLUMNS), from the cache if nothing changed since it was computed
+    # period: "year" (each month of the year), "quarter" (each quarter of the year), "rolling" (the given number of days
+    # up to end_date, by category) or "category" (each category over the year)
+    def report(self, period, year=None, end_date=None, days=DEFAULT_ROLLING_DAYS):
+        if period not in REPORT_PERIODS: raise ValueError(f"Unknown report period {period!r}: expected one of {', '.join(REPORT_PERIODS)}")
+        year = int(year) if year is not None else date.today().year
+        end_date = date.fromisoformat(end_date) if isinstance(end_date, str) else (end_date or date.today())
+        if int(days) < 1: raise ValueError(f"Invalid number of days {days!r}: expected a number greater than 0")
+        key = (period, year, end_date, int(days)) if period == "rolling" else (period, year)
+        versions = (self.storage.version, self.budgets.version)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == versions:
+            self.cache.move_to_end(key)
+            return cached[1]
+        match period:
+            case "year": rows = self.yearReport(year)
+            case "quarter": rows = self.quarterReport(year)
+            case "rolling": rows = self.rollingReport(end_date, int(days))
+            case "category": rows = self.categoryReport(year)
+        self.cache[key] = (versions, rows)
+        self.cache.move_to_end(key)
+        if len(self.cache) > REPORT_CACHE_SIZE: self.cache.popitem(last=False)
+        return rows
+
+    # Function to get the budget of a month in cents, or None if no budget was set
+    def monthBudgetCents(self, year, month_number):
+        budget = self.budgets.get(str(year), {}).get(monthAbbreviation(month_number))
+        return amountToCents(budget) if budget is not None else None
+
+    def monthExpenseCents(self, year, month_number):
+        return sum(self.storage.categoryCentsForMonth(year, month_number).values())
+
+    # Function to sum budgets in cents, ignoring the months without budget (None if no month has a budget)
+    def sumBudgets(self, budgets_cents):
+        budgets_cents = [budget_cents for budget_cents in budgets_cents if budget_cents is not None]
+        return sum(budgets_cents) if budgets_cents else None
+
+    def yearReport(self, year):
+        months = [(month_number, self.monthBudgetCents(year, month_number), self.monthExpenseCents(year, month_number))
+                  for month_number in range(1, 13)]
+        rows = [reportRow(f"{year}-{month_number:02d}", REPORT_ALL_CATEGORIES, budget_cents, expense_cents)
+                for month_number, budget_cents, expense_cents in months]
+        rows.append(reportRow(str(year), REPORT_ALL_CATEGORIES, self.sumBudgets(month[1] for month in months),
+                              sum(month[2] for month in months)))
+        return rows
+
+    def quarterReport(self, year):
+        rows = list()
+        year_budgets, year_expense_cents = list(), 0
+        for quarter in range(1, 5):
+            month_numbers = range(3 * quarter - 2, 3 * quarter + 1)
+            budgets_cents = [self.monthBudgetCents(year, month_number) for month_number in month_numbers]
+            expense_cents = sum(self.monthExpenseCents(year, month_number) for month_number in month_numbers)
+            rows.append(reportRow(f"{year}-Q{quarter}", REPORT_ALL_CATEGORIES, self.sumBudgets(budgets_cents), expense_cents))
+            year_budgets += budgets_cents
+            year_expense_cents += expense_cents
+        rows.append(reportRow(str(year), REPORT_ALL_CATEGORIES, self.sumBudgets(year_budgets), year_expense_cents))
+        return rows
+
+    # The budget of a rolling window is the share of each month's budget for the days of that month in the window
+    def rollingReport(self, end_date, days):
+        first_date = end_date - timedelta(days=days - 1)
+        first_ordinal, last_ordinal = first_date.toordinal(), end_date.toordinal()
+        budgets_cents = list()
+        year, month_number = first_date.year, first_date.month
+        while (year, month_number) <= (end_date.year, end_date.month):
+            month_first_ordinal, month_last_ordinal = monthOrdinalRange(year, month_number)
+            budget_cents = self.monthBudgetCents(year, month_number)
+            if budget_cents is not None:
+                window_days = min(last_ordinal, month_last_ordinal) - max(first_ordinal, month_first_ordinal) + 1
+                budgets_cents.append(budget_cents * window_days // (month_last_ordinal - month_first_ordinal + 1))
+            year, month_number = (year + 1, 1) if month_number == 12 else (year, month_number + 1)
+        budget_cents = self.sumBudgets(budgets_cents)
+        period = f"{first_date.isoformat()}/{end_date.isoformat()}"
+        category_cents = self.storage.categoryCentsBetween(first_ordinal, last_ordinal)
+        rows = [reportRow(period, category, budget_cents, cents, show_budget=False)
+                for category, cents in category_cents.items()]
+        rows.append(reportRow(period, REPORT_ALL_CATEGORIES, budget_cents, sum(category_cents.values())))
+        return rows
+
+    def categoryReport(self, year):
+        category_cents = dict()
+        for month_number in range(1, 13):
+            for category, cents in self.storage.categoryCentsForMonth(year, month_number).items():
+                category_cents[category] = category_cents.get(category, 0) + cents
+        budget_cents = self.sumBudgets(self.monthBudgetCents(year, month_number) for month_number in range(1, 13))
+        categories = [category for category in self.storage.categories if category in category_cents]
+        rows = [reportRow(str(year), category, budget_cents, category_cents[category], show_budget=False) for category in categories]
+        rows.append(reportRow(str(year), REPORT_ALL_CATEGORIES, budget_cents, sum(category_cents.values())))
+        return rows
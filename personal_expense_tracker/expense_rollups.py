@@ -0,0 +1,53 @@
+# %%
+# Aggregate rollups of the expenses: year -> month -> category -> [total in cents, number of expenses]
+# The table is updated as expenses are loaded or added, so monthly and per-category totals are dictionary lookups.
+# Amounts are kept in integer cents; the storage backends convert them to and from the amounts used in memory.
+
+ROLLUP_TOTAL = 0
+ROLLUP_COUNT = 1
+
+
+class ExpenseRollups:
+
+    def __init__(self):
+        self.years = dict()
+
+    # Function to add the amount of one expense to its year, month and category
+    def add(self, year, month_number, category, cents):
+        months = self.years.setdefault(year, dict())
+        categories = months.setdefault(month_number, dict())
+        rollup = categories.get(category)
+        if rollup is None:
+            categories[category] = [cents, 1]
+        else:
+            rollup[ROLLUP_TOTAL] += cents
+            rollup[ROLLUP_COUNT] += 1
+
+    def hasMonth(self, year, month_number):
+        return month_number in self.years.get(year, {})
+
+    # Function to mark a month as computed even if it has no expense
+    def setEmptyMonth(self, year, month_number):
+        self.years.setdefault(year, dict()).setdefault(month_number, dict())
+
+    def categoriesForMonth(self, year, month_number):
+        return self.years.get(year, {}).get(month_number, {})
+
+    # Function to get the total in cents of a month, optionally restricted to one category
+    def totalCents(self, year, month_number, category=None):
+        categories = self.categoriesForMonth(year, month_number)
+        if category is not None:
+            return categories.get(category, (0, 0))[ROLLUP_TOTAL]
+        return sum(rollup[ROLLUP_TOTAL] for rollup in categories.values())
+
+    # Function to get the number of expenses of a month, optionally restricted to one category
+    def count(self, year, month_number, category=None):
+        categories = self.categoriesForMonth(year, month_number)
+        if category is not None:
+            return categories.get(category, (0, 0))[ROLLUP_COUNT]
+        return sum(rollup[ROLLUP_COUNT] for rollup in categories.values())
+
+    # Function to get the totals in cents of a month by category, e.g. {"Housing": 68242, "Groceries": 4970}
+    def totalsCentsByCategory(self, year, month_number):
+        return {category: rollup[ROLLUP_TOTAL]
+                for category, rollup in self.categoriesForMonth(year, month_number).items()}
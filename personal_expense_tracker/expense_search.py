@@ -0,0 +1,72 @@
+# %%
+# Inverted index over the expense descriptions.
+# Each word of a description points to the descriptions containing it, and each description to the rows
+# (positions in the storage) of the expenses having it. Descriptions repeat a lot in a ledger
+# ("Monthly stock-up from Kroger"), so each distinct description is split into words only once.
+import array
+import heapq
+import re
+from bisect import bisect_left
+
+WORD_PATTERN = re.compile(r"\w+")
+PREFIX_WILDCARD = "*"
+
+
+# %%
+# Function to split a text into lowercase words
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+class DescriptionIndex:
+
+    def __init__(self):
+        self.word_descriptions = dict() # word -> set of descriptions
+        self.description_rows = dict() # description -> array of rows, in increasing order
+        self.sorted_words = None # Vocabulary in alphabetical order for prefix queries, rebuilt after new words are added
+
+    # Function to index the description of a row. Rows must be added in increasing order
+    def add(self, row, description):
+        rows = self.description_rows.get(description)
+        if rows is None: rows = self._addDescription(description)
+        rows.append(row)
+
+    # Function to index a new description with all its rows at once (e.g. read from a snapshot), in increasing order
+    def addRows(self, description, rows):
+        self._addDescription(description).extend(rows)
+
+    def _addDescription(self, description):
+        rows = self.description_rows[description] = array.array('I')
+        for word in tokenize(description):
+            descriptions = self.word_descriptions.get(word)
+            if descriptions is None:
+                descriptions = self.word_descriptions[word] = set()
+                self.sorted_words = None
+            descriptions.add(description)
+        return rows
+
+    # Function to get the descriptions containing a word, or a word starting with a prefix
+    def descriptionsMatching(self, word, prefix=False):
+        if not prefix: return self.word_descriptions.get(word, set())
+        if self.sorted_words is None: self.sorted_words = sorted(self.word_descriptions)
+        descriptions = set()
+        position = bisect_left(self.sorted_words, word)
+        while position < len(self.sorted_words) and self.sorted_words[position].startswith(word):
+            descriptions |= self.word_descriptions[self.sorted_words[position]]
+            position += 1
+        return descriptions
+
+    # Function to get the rows whose description contains all the words of a query, in increasing order
+    # A word ending with * matches the words starting with it, e.g. "pet*" matches "PetSmart" and "pets"
+    def search(self, query):
+        descriptions = None
+        for term in query.split():
+            words = tokenize(term)
+            for position, word in enumerate(words):
+                # Only the last word of a term like "pet-sm*" is a prefix
+                prefix = term.endswith(PREFIX_WILDCARD) and position == len(words) - 1
+                matching = self.descriptionsMatching(word, prefix)
+                descriptions = matching if descriptions is None else descriptions & matching
+                if not descriptions: return iter(())
+        if descriptions is None: return iter(())
+        return heapq.merge(*(self.description_rows[description] for description in descriptions))
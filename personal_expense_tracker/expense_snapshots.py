@@ -0,0 +1,124 @@
+# %%
+# Snapshots of a loaded expense file, to start without parsing the whole file again.
+# A snapshot (<path>.snapshot) holds the typed columns of the expenses, the description pool, the rollups and the
+# description index of the first bytes of the expense file, with the size of that part and a fingerprint of it.
+# Since expenses are only appended to the file, loading it is then reading the snapshot and parsing only the lines
+# written after it. A new snapshot is written when the lines parsed after the last one exceed SNAPSHOT_MIN_TAIL_SIZE,
+# so the part of the file parsed at startup stays bounded however long the history is.
+# The snapshot is ignored (and the whole file parsed) if it is missing, damaged, written for other categories, or if the
+# beginning or the end of the part of the file it covers changed (e.g. the file was edited or replaced).
+import array
+import json
+import os
+import struct
+import sys
+import zlib
+
+from expense_columns import ExpenseColumns
+from expense_rollups import ExpenseRollups
+from expense_search import DescriptionIndex
+
+SNAPSHOT_FILE_SUFFIX = ".snapshot"
+SNAPSHOT_MIN_TAIL_SIZE = 4 << 20 # Bytes parsed after the last snapshot from which a new snapshot is written
+SNAPSHOT_FINGERPRINT_SIZE = 4096 # Bytes of the beginning and of the end of the covered part of the file in the fingerprint
+
+# Snapshot layout: header (magic, size of the metadata, number of rows), metadata as JSON, then the arrays:
+# date ordinals, category codes, amounts in cents, description ids, rows of each description in pool order
+# and number of rows of each description
+SNAPSHOT_MAGIC = b"PETSNAP\x01"
+SNAPSHOT_HEADER = struct.Struct("<8sQQ")
+
+
+# %%
+# Function to compute the fingerprint of the first size bytes of a file opened in binary mode
+def fileFingerprint(data_file, size):
+    data_file.seek(0)
+    fingerprint = zlib.crc32(data_file.read(min(size, SNAPSHOT_FINGERPRINT_SIZE)))
+    if size > SNAPSHOT_FINGERPRINT_SIZE:
+        data_file.seek(max(SNAPSHOT_FINGERPRINT_SIZE, size - SNAPSHOT_FINGERPRINT_SIZE))
+        fingerprint = zlib.crc32(data_file.read(size - data_file.tell()), fingerprint)
+    return fingerprint
+
+# Function to write the snapshot of a CSV storage, for the part of its file already read, in a temporary file renamed
+# at the end (each process has its own temporary file, so processes writing a snapshot at the same time do not mix them)
+def saveSnapshot(storage):
+    expenses, index = storage.expenses, storage.description_index
+    expense_file = open(storage.path, 'rb')
+    fingerprint = fileFingerprint(expense_file, storage.loaded_size)
+    expense_file.close()
+    metadata = {
+        "categories": list(storage.categories),
+        "delimiter": storage.delimiter,
+        "byteorder": sys.byteorder,
+        "checksums": storage.checksums,
+        "loaded_size": storage.loaded_size,
+        "next_line_number": storage.next_line_number,
+        "fingerprint": fingerprint,
+        "invalid_lines": storage.invalid_lines,
+        "descriptions": expenses.description_pool,
+        "rollups": [[year, month_number, category, rollup[0], rollup[1]]
+                    for year, months in storage.rollups.years.items()
+                    for month_number, categories in months.items()
+                    for category, rollup in categories.items()]
+    }
+    metadata = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+    description_rows = [index.description_rows[description] for description in expenses.description_pool]
+    temporary_path = f"{storage.path}{SNAPSHOT_FILE_SUFFIX}.{os.getpid()}.tmp"
+    snapshot_file = open(temporary_path, 'wb')
+    try:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(metadata), len(expenses)))
+        snapshot_file.write(metadata)
+        for column in (expenses.date_ordinals, expenses.category_codes_column, expenses.amount_cents, expenses.description_ids):
+            column.tofile(snapshot_file)
+        for rows in description_rows: rows.tofile(snapshot_file)
+        array.array('I', map(len, description_rows)).tofile(snapshot_file)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+        snapshot_file.close()
+        os.replace(temporary_path, storage.path + SNAPSHOT_FILE_SUFFIX)
+    except BaseException:
+        snapshot_file.close()
+        os.remove(temporary_path)
+        raise
+
+# Function to restore a CSV storage from its snapshot, if there is a valid one for its file (opened in binary mode,
+# of the given size). Returns False if there is none; the storage must then load the whole file
+def loadSnapshot(storage, expense_file, file_size):
+    try:
+        snapshot_file = open(storage.path + SNAPSHOT_FILE_SUFFIX, 'rb')
+    except FileNotFoundError:
+        return False
+    try:
+        magic, metadata_size, row_count = SNAPSHOT_HEADER.unpack(snapshot_file.read(SNAPSHOT_HEADER.size))
+        if magic != SNAPSHOT_MAGIC: return False
+        metadata = json.loads(snapshot_file.read(metadata_size).decode("utf-8"))
+        if (metadata["categories"] != list(storage.categories) or metadata["delimiter"] != storage.delimiter
+                or metadata["byteorder"] != sys.byteorder or metadata["loaded_size"] > file_size
+                or metadata["fingerprint"] != fileFingerprint(expense_file, metadata["loaded_size"])):
+            return False
+        expenses = ExpenseColumns(storage.categories)
+        for column in (expenses.date_ordinals, expenses.category_codes_column, expenses.amount_cents, expenses.description_ids):
+            column.fromfile(snapshot_file, row_count)
+        expenses.description_pool = metadata["descriptions"]
+        expenses.description_pool_ids = {description: description_id
+                                         for description_id, description in enumerate(expenses.description_pool)}
+        index_rows, row_counts = array.array('I'), array.array('I')
+        index_rows.fromfile(snapshot_file, row_count)
+        row_counts.fromfile(snapshot_file, len(expenses.description_pool))
+    except (OSError, EOFError, ValueError, KeyError, TypeError, struct.error):
+        return False # Damaged or incomplete snapshot
+    finally:
+        snapshot_file.close()
+    index = DescriptionIndex()
+    position = 0
+    for description, count in zip(expenses.description_pool, row_counts):
+        index.addRows(description, index_rows[position:position + count])
+        position += count
+    rollups = ExpenseRollups()
+    for year, month_number, category, cents, count in metadata["rollups"]:
+        rollups.years.setdefault(year, dict()).setdefault(month_number, dict())[category] = [cents, count]
+    storage.expenses, storage.rollups, storage.description_index = expenses, rollups, index
+    storage.invalid_lines = [tuple(invalid_line) for invalid_line in metadata["invalid_lines"]]
+    storage.checksums = metadata["checksums"]
+    storage.loaded_size, storage.next_line_number = metadata["loaded_size"], metadata["next_line_number"]
+    return True
@@ -0,0 +1,712 @@
+# %%
+# Storage backends for the personal expense tracker.
+# CsvExpenseStorage keeps the original expense_database.csv format and is also used for import/export.
+# BinaryExpenseStorage is an append-only ledger of fixed-width records with a per-month row index,
+# so opening it costs the same whatever the size of the history and monthly totals only read that month's rows.
+import array
+import os
+import struct
+import zlib
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from expense_columns import MAX_AMOUNT_CENTS, MIN_AMOUNT_CENTS, ExpenseColumns
+from expense_csv import CsvRecordReader, formatCsvField
+from expense_dates import dateOrdinal, formatDateOrdinal, parseDate
+from expense_rollups import ExpenseRollups
+from expense_search import DescriptionIndex
+from expense_snapshots import SNAPSHOT_MIN_TAIL_SIZE, loadSnapshot, saveSnapshot
+
+EXPENSE_KEYS = ("date", "category", "amount", "description")
+CSV_HEADER_FIELDS = ("Date", "Category", "Amount", "Description")
+CSV_CHECKSUM_FIELD = "Checksum" # Last column of the expense files created by the tracker: CRC-32 of the rest of the line
+LOCK_FILE_SUFFIX = ".lock"
+
+# Binary ledger layout: a 16-byte header followed by 32-byte records
+# (date ordinal, category code, amount in cents, description offset and length in the description heap)
+LEDGER_MAGIC = b"PETLEDG\x01"
+LEDGER_HEADER = struct.Struct("<8sII")
+LEDGER_RECORD = struct.Struct("<iB3xqQH6x")
+LEDGER_READ_BLOCK_RECORDS = 4096
+LEDGER_MAX_DESCRIPTION_SIZE = 2**16 - 1 # Bytes of a description (its length is stored in 16 bits)
+LEDGER_INDEX_ROW_COUNT_FILE = "row_count" # Number of records covered by the month index, written after the month index files
+
+
+# %%
+# Function to convert an amount (string, float or Decimal) into integer cents
+# Raises ValueError if the amount is not a finite number or does not fit in the signed 64-bit amount columns and records
+def amountToCents(amount):
+    try:
+        cents = int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (ArithmeticError, ValueError) as error:
+        raise ValueError(f"Invalid amount {amount!r}: expected a number") from error
+    if not MIN_AMOUNT_CENTS <= cents <= MAX_AMOUNT_CENTS: raise ValueError(f"Amount out of range {amount!r}")
+    return cents
+
+# Function to convert integer cents back into the amount used in memory, an exact Decimal with two decimals (12.50)
+def centsToAmount(cents):
+    return Decimal(cents).scaleb(-2)
+
+# Function to round an amount to the cent the way it is stored (half up, on its decimal value: 2.675 gives 2.68)
+def roundAmount(amount):
+    return centsToAmount(amountToCents(amount))
+
+# Function to write the Decimal amounts in JSON (default= of json.dumps): as a number when it keeps every cent, otherwise as a text
+def jsonAmount(value):
+    if not isinstance(value, Decimal): raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return float(value) if Decimal(repr(float(value))) == value else str(value)
+
+# Function to build the in-memory expense dictionary
+def makeExpense(date, category, amount, description):
+    return {"date": date, "category": category, "amount": amount, "description": description}
+
+# Function to convert the optional filters of iterExpenses() (dates as YYYY-MM-DD, amounts) into ordinals and cents
+def encodeExpenseFilters(first_date, last_date, min_amount, max_amount):
+    return (dateOrdinal(first_date) if first_date is not None else None,
+            dateOrdinal(last_date) if last_date is not None else None,
+            amountToCents(min_amount) if min_amount is not None else None,
+            amountToCents(max_amount) if max_amount is not None else None)
+
+
+# %%
+# Lock shared by all the processes using the same expense file, held while reading or writing it.
+# The lock is taken on a separate <path>.lock file, so the expense file itself can still be read by other tools.
+# Writers take an exclusive lock; readers take a shared lock (exclusive on Windows, which has no shared lock)
+class ExpenseFileLock:
+
+    def __init__(self, path, exclusive=True):
+        self.lock_path = path + LOCK_FILE_SUFFIX
+        self.exclusive = exclusive
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(self.lock_path, 'a+b')
+        if os.name == "nt":
+            import msvcrt
+            self.lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError: # LK_LOCK gives up after 10 seconds
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exception):
+        if os.name == "nt":
+            import msvcrt
+            self.lock_file.seek(0)
+            msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        self.lock_file.close()
+        self.lock_file = None
+
+
+# Function to compute the checksum of a line of the expense file (8 hexadecimal digits)
+def lineChecksum(line):
+    return format(zlib.crc32(line.encode("utf-8")), "08x")
+
+# Function to identify a file from its status (os.stat result): it changes when the file is replaced by another one
+def fileIdentity(file_status):
+    return file_status.st_dev, file_status.st_ino
+
+
+# %%
+# Original storage: one text line per expense in a CSV file, fully loaded in memory as typed columns
+# Several processes can add expenses to the same file: each write is done in one piece under the file lock,
+# and files created by the tracker end each line with a checksum, so a line left incomplete by an interrupted
+# process is detected and reported instead of being loaded as a wrong expense.
+# Files without the Checksum column (e.g. written by another tool) are still read and appended to, without checksum.
+# The file is read with the streaming CSV reader: fields containing the delimiter or quotes are quoted (RFC 4180),
+# and the size of the file read so far is kept, so that the expenses appended by other programs can be read with
+# refresh() without reading the file again.
+# Loading starts from the snapshot of the file if there is one (see expense_snapshots), and parses only the lines after it.
+class CsvExpenseStorage:
+
+    def __init__(self, path, categories, delimiter=","):
+        self.path = path
+        self.categories = tuple(categories)
+        self.delimiter = delimiter
+        self.expenses = ExpenseColumns(self.categories)
+        self.invalid_lines = list() # (line number, reason) of the records of the file that are malformed or invalid
+        self.rollups = ExpenseRollups()
+        self.description_index = DescriptionIndex() # Words of the descriptions -> rows of self.expenses
+        self.checksums = True # Whether the lines of the file end with a checksum (read from the header)
+        self.version = 0 # Incremented whenever the expenses in memory change, e.g. to know when cached reports are outdated
+        self.loaded_size = 0 # Number of bytes of the file already read
+        self.next_line_number = 1 # Number of the next line of the file to read
+        self.file_identity = None # Identity of the file read, to detect that it was replaced
+        self.snapshot_size = 0 # Number of bytes of the file covered by the last snapshot read or written
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _reset(self):
+        self.expenses = ExpenseColumns(self.categories)
+        self.invalid_lines = list()
+        self.rollups = ExpenseRollups()
+        self.description_index = DescriptionIndex()
+
+    # Function to create an empty expense file containing only the header
+    def create(self):
+        expense_file = open(self.path, 'x', encoding="utf-8")
+        expense_file.write(self.delimiter.join(CSV_HEADER_FIELDS + (CSV_CHECKSUM_FIELD,)) + "\n")
+        expense_file.close()
+        self._reset()
+        self.checksums = True
+        file_status = os.stat(self.path)
+        self.loaded_size, self.file_identity = file_status.st_size, fileIdentity(file_status)
+        self.next_line_number = 2
+        self.snapshot_size = 0
+        self.version += 1
+        return self.expenses
+
+    # Function to read every expense of the file in memory and compute the rollups
+    # Only the size of the file is read under the file lock: since expenses are only appended, the bytes up to that size
+    # do not change while they are parsed
+    # If the file has a valid snapshot, it is read instead of the part of the file it covers; a new snapshot is written
+    # when many lines were parsed after it
+    def load(self):
+        self._reset()
+        with ExpenseFileLock(self.path, exclusive=False):
+            expense_file = open(self.path, 'rb')
+            file_status = os.fstat(expense_file.fileno())
+        if loadSnapshot(self, expense_file, file_status.st_size):
+            self.snapshot_size = self.loaded_size
+            expense_file.seek(self.loaded_size)
+            reader = CsvRecordReader(expense_file, self.delimiter, self.next_line_number,
+                                     size=file_status.st_size - self.loaded_size)
+            self._addRecords(reader)
+        else:
+            self.snapshot_size = 0
+            expense_file.seek(0)
+            reader = CsvRecordReader(expense_file, self.delimiter, size=file_status.st_size)
+            records = iter(reader)
+            header = next(records, None)
+            self.checksums = header is not None and header[1] is not None and header[1][-1] == CSV_CHECKSUM_FIELD
+            self._addRecords(records)
+        expense_file.close()
+        self.loaded_size, self.next_line_number = reader.offset, reader.line_number
+        self.file_identity = fileIdentity(file_status)
+        self.version += 1
+        self.snapshotIfNeeded()
+        return self.expenses
+
+    # Function to write a snapshot of the expenses read so far, so that the next load starts from it
+    # A snapshot is only an optimization: if it cannot be written (e.g. read-only directory), the file is simply parsed next time
+    def snapshot(self):
+        try:
+            saveSnapshot(self)
+        except OSError:
+            return False
+        self.snapshot_size = self.loaded_size
+        return True
+
+    # Function to write a snapshot if many lines were read since the last one
+    def snapshotIfNeeded(self):
+        if self.loaded_size - self.snapshot_size >= SNAPSHOT_MIN_TAIL_SIZE: self.snapshot()
+
+    # Function to add the records read from the file to the expenses in memory. Returns the number of valid expenses added
+    def _addRecords(self, records):
+        added_count = 0
+        for line_number, fields, reason in records:
+            if fields is not None:
+                try:
+                    expense = self.parseFields(fields)
+                except ValueError as error:
+                    reason = str(error)
+                else:
+                    if self._addExpense(expense):
+                        added_count += 1
+                        continue
+                    reason = "invalid date, category or amount"
+            self.invalid_lines.append((line_number, reason))
+        return added_count
+
+    # Function to read the lines added to the file after the bytes already read
+    # With complete_only, a last line without new line (possibly still being written by another program) is left for later
+    def _readNewLines(self, expense_file, complete_only=True):
+        expense_file.seek(self.loaded_size)
+        reader = CsvRecordReader(expense_file, self.delimiter, self.next_line_number, complete_only)
+        added_count = self._addRecords(reader)
+        self.loaded_size, self.next_line_number = reader.offset, reader.line_number
+        return added_count
+
+    # Function to read the expenses appended to the file by other programs since it was loaded or last refreshed.
+    # Only the new part of the file is read, and the rollups and description index are updated with the new expenses.
+    # If the file was replaced or truncated, it is loaded again. Returns the number of expenses read
+    def refresh(self):
+        with ExpenseFileLock(self.path, exclusive=False):
+            expense_file = open(self.path, 'rb')
+            file_size = expense_file.seek(0, os.SEEK_END)
+            replaced = fileIdentity(os.fstat(expense_file.fileno())) != self.file_identity or file_size < self.loaded_size
+            added_count = self._readNewLines(expense_file) if not replaced else 0
+            expense_file.close()
+        if replaced:
+            self.load()
+            return len(self)
+        if added_count: self.version += 1
+        return added_count
+
+    # Function to format an expense as a line of the file, with its checksum if the file has checksums
+    # The checksum is computed on the fields before quoting
+    def formatLine(self, expense):
+        fields = [str(expense[key]) for key in EXPENSE_KEYS]
+        expense_line = self.delimiter.join(formatCsvField(field, self.delimiter) for field in fields)
+        if self.checksums: expense_line += self.delimiter + lineChecksum(self.delimiter.join(fields))
+        return expense_line + "\n"
+
+    # Function to build an expense dictionary from the fields of a record; raises ValueError if the record is malformed
+    # Descriptions containing the delimiter without quotes (written by previous versions) are joined back
+    def parseFields(self, fields):
+        field_count = len(EXPENSE_KEYS) + 1 if self.checksums else len(EXPENSE_KEYS)
+        if len(fields) < field_count:
+            raise ValueError(f"{len(fields)} fields instead of {field_count}")
+        if self.checksums:
+            checksum = fields.pop()
+        if len(fields) > len(EXPENSE_KEYS):
+            fields[3:] = [self.delimiter.join(fields[3:])]
+        if self.checksums and lineChecksum(self.delimiter.join(fields)) != checksum:
+            raise ValueError("wrong checksum (incomplete or modified line)")
+        return dict(zip(EXPENSE_KEYS, fields))
+
+    # Function to append lines to the file in a single write, under the file lock
+    # If the file does not end with a new line (last line written without one, or interrupted write), a new line is started first
+    # Lines added by other programs since the file was read are read first, so that the expenses stay in the order of the file
+    def _writeLines(self, expense_lines):
+        data = "".join(expense_lines).encode("utf-8")
+        with ExpenseFileLock(self.path):
+            expense_file = open(self.path, 'a+b')
+            file_size = expense_file.seek(0, os.SEEK_END)
+            same_file = fileIdentity(os.fstat(expense_file.fileno())) == self.file_identity
+            if same_file and self.loaded_size < file_size and self._readNewLines(expense_file, complete_only=False):
+                self.version += 1
+            if file_size > 0:
+                expense_file.seek(-1, os.SEEK_END)
+                if expense_file.read(1) != b"\n": data = b"\n" + data
+            expense_file.write(data)
+            expense_file.flush()
+            os.fsync(expense_file.fileno())
+            if same_file:
+                self.loaded_size = expense_file.tell()
+                self.next_line_number += data.count(b"\n")
+            expense_file.close()
+
+    # Function to encode the fields of an expense dictionary for the columns: (date ordinal, year, month, category code, cents)
+    # Raises ValueError if the expense is invalid, before anything is changed
+    def _encodeExpense(self, expense):
+        try:
+            date_ordinal, year, month_number = parseDate(expense["date"])
+            category_code = self.expenses.category_codes[expense["category"]]
+            cents = amountToCents(expense["amount"])
+            if not isinstance(expense["description"], str): raise TypeError("the description must be a text")
+        except (KeyError, TypeError, ValueError, ArithmeticError) as error:
+            raise ValueError(f"Invalid expense {expense!r}") from error
+        return date_ordinal, year, month_number, category_code, cents
+
+    # Function to add an expense dictionary to the columns, the rollups and the description index; returns False if the expense is invalid
+    def _addExpense(self, expense, encoded_expense=None):
+        try:
+            date_ordinal, year, month_number, category_code, cents = encoded_expense or self._encodeExpense(expense)
+            self.expenses.appendRow(date_ordinal, category_code, cents, expense["description"])
+        except (ValueError, TypeError, ArithmeticError):
+            return False
+        self.rollups.add(year, month_number, expense["category"], cents)
+        self.description_index.add(len(self.expenses) - 1, expense["description"])
+        return True
+
+    # Function to save an expense in the file and keep it in memory; raises ValueError if it is invalid, without writing it
+    def append(self, expense):
+        self.extend([expense])
+
+    # Function to save many expenses with a single buffered write, e.g. for a bulk import
+    # Every expense is checked before the write: if one is invalid, ValueError is raised and none is saved
+    def extend(self, expenses):
+        expenses = list(expenses)
+        encoded_expenses = [self._encodeExpense(expense) for expense in expenses]
+        self._writeLines([self.formatLine(expense) for expense in expenses])
+        for expense, encoded_expense in zip(expenses, encoded_expenses): self._addExpense(expense, encoded_expense)
+        self.version += 1
+
+    def __len__(self):
+        return len(self.expenses)
+
+    def __iter__(self):
+        return iter(self.expenses)
+
+    # Function to get lazily the category code and amount in cents of the rows from first_row, from the last row backwards with reverse
+    def iterCategoryCents(self, first_row=0, reverse=False):
+        category_codes_column, amount_cents = self.expenses.category_codes_column, self.expenses.amount_cents
+        rows = range(len(self) - 1, first_row - 1, -1) if reverse else range(first_row, len(self))
+        return ((category_codes_column[row], amount_cents[row]) for row in rows)
+
+    # Function to get lazily the expenses matching the optional filters, in the order of the file
+    def iterExpenses(self, first_date=None, last_date=None, category=None, min_amount=None, max_amount=None):
+        first_ordinal, last_ordinal, min_cents, max_cents = encodeExpenseFilters(first_date, last_date, min_amount, max_amount)
+        rows = self.expenses.iterRows(first_ordinal, last_ordinal, category, min_cents, max_cents)
+        return (self.expenses.expenseAt(row) for row in rows)
+
+    # Function to get lazily the expenses whose description contains all the words of a query (e.g. "petsmart" or "pet*"),
+    # in the order of the file, with the same optional filters as iterExpenses()
+    def searchExpenses(self, query, first_date=None, last_date=None, category=None, min_amount=None, max_amount=None):
+        first_ordinal, last_ordinal, min_cents, max_cents = encodeExpenseFilters(first_date, last_date, min_amount, max_amount)
+        rows = self.expenses.iterRows(first_ordinal, last_ordinal, category, min_cents, max_cents,
+                                      rows=self.description_index.search(query))
+        return (self.expenses.expenseAt(row) for row in rows)
+
+    # Function to get the total amount of the expenses made in a given year and month, optionally for one category
+    def totalForMonth(self, year, month_number, category=None):
+        return centsToAmount(self.rollups.totalCents(year, month_number, category))
+
+    # Function to get the totals in cents of each category for a given year and month
+    def categoryCentsForMonth(self, year, month_number):
+        return self.rollups.totalsCentsByCategory(year, month_number)
+
+    # Function to get the totals in cents of each category between two day ordinals (inclusive), in one pass over the rows
+    def categoryCentsBetween(self, first_ordinal, last_ordinal):
+        category_cents = [0] * len(self.categories)
+        category_codes_column, amount_cents = self.expenses.category_codes_column, self.expenses.amount_cents
+        for row in self.expenses.iterRows(first_ordinal, last_ordinal):
+            category_cents[category_codes_column[row]] += amount_cents[row]
+        return {category: cents for category, cents in zip(self.categories, category_cents) if cents}
+
+    def close(self):
+        self.snapshotIfNeeded()
+
+
+# %%
+# Append-only binary ledger.
+# Files: <path> (header + fixed-width records), <path>.desc (UTF-8 descriptions, appended in record order)
+# and <path>.idx/YYYY-MM.rows (row numbers of the expenses of each month, as unsigned 32-bit integers),
+# with <path>.idx/row_count (number of records covered by the index): the index is rebuilt when it differs from the ledger.
+class BinaryExpenseStorage:
+
+    def __init__(self, path, categories):
+        self.path = path
+        self.description_path = path + ".desc"
+        self.index_dir = path + ".idx"
+        self.categories = tuple(categories)
+        self.category_codes = {category: code for code, category in enumerate(self.categories)}
+        self.record_file = None
+        self.description_file = None
+        self.row_count = 0
+        self.rollups = ExpenseRollups() # Filled month by month, the first time a month is queried
+        self.description_index = None # Built the first time descriptions are searched, then completed with the new rows
+        self.indexed_rows = 0 # Number of rows in the description index
+        self.version = 0 # Incremented whenever expenses are added or the ledger is opened again
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # Function to create an empty ledger (header, empty description heap and empty index)
+    def create(self):
+        record_file = open(self.path, 'xb')
+        record_file.write(LEDGER_HEADER.pack(LEDGER_MAGIC, LEDGER_RECORD.size, 0))
+        record_file.close()
+        open(self.description_path, 'wb').close()
+        os.makedirs(self.index_dir, exist_ok=True)
+        return self.load()
+
+    # Function to open the ledger. Only the header is read: the number of records is derived from the file size
+    def load(self):
+        self.close()
+        self.record_file = open(self.path, 'r+b')
+        magic, record_size, _ = LEDGER_HEADER.unpack(self.record_file.read(LEDGER_HEADER.size))
+        if magic != LEDGER_MAGIC or record_size != LEDGER_RECORD.size:
+            self.record_file.close()
+            self.record_file = None
+            raise ValueError(f"{self.path} is not an expense ledger file")
+        # A record partially written by an interrupted process is ignored and overwritten by the next append
+        file_size = self.record_file.seek(0, os.SEEK_END)
+        self.row_count = (file_size - LEDGER_HEADER.size) // LEDGER_RECORD.size
+        self.rollups = ExpenseRollups()
+        self.description_index = None
+        self.indexed_rows = 0
+        self.version += 1
+        self.description_file = open(self.description_path, 'a+b')
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Records written by a process stopped before indexing them (or a ledger copied without its index) are indexed again.
+        # The check is repeated under the lock, since another process may be between writing its records and indexing them
+        if self._indexRowCount() != self.row_count:
+            with ExpenseFileLock(self.path):
+                self._readNewRecords()
+                if self._indexRowCount() != self.row_count: self.rebuildIndex()
+        return self
+
+    def close(self):
+        if self.record_file is not None:
+            self.record_file.close()
+            self.record_file = None
+        if self.description_file is not None:
+            self.description_file.close()
+            self.description_file = None
+
+    def _monthIndexPath(self, year, month_number):
+        return os.path.join(self.index_dir, f"{int(year):04d}-{int(month_number):02d}.rows")
+
+    # Function to read the number of records covered by the month index (0 for a new index or an index being rebuilt)
+    def _indexRowCount(self):
+        try:
+            row_count_file = open(os.path.join(self.index_dir, LEDGER_INDEX_ROW_COUNT_FILE), 'r')
+        except FileNotFoundError:
+            return 0
+        row_count = row_count_file.read()
+        row_count_file.close()
+        return int(row_count) if row_count.isascii() and row_count.isdigit() else None
+
+    # Function to record the number of records covered by the month index, replacing the file with a write-then-rename
+    def _setIndexRowCount(self, row_count):
+        row_count_path = os.path.join(self.index_dir, LEDGER_INDEX_ROW_COUNT_FILE)
+        row_count_file = open(row_count_path + ".tmp", 'w')
+        row_count_file.write(str(row_count))
+        row_count_file.close()
+        os.replace(row_count_path + ".tmp", row_count_path)
+
+    # Function to encode the fields of an expense dictionary for a record: (date ordinal, year, month, category code, cents,
+    # UTF-8 description). Raises ValueError if the expense is invalid, before anything is written
+    def _encodeExpense(self, expense):
+        try:
+            date_ordinal, year, month_number = parseDate(expense["date"])
+            category_code = self.category_codes[expense["category"]]
+            cents = amountToCents(expense["amount"])
+            description = str(expense["description"]).encode("utf-8")
+        except (KeyError, TypeError, ValueError, ArithmeticError) as error:
+            raise ValueError(f"Invalid expense {expense!r}") from error
+        if len(description) > LEDGER_MAX_DESCRIPTION_SIZE: raise ValueError(f"Description too long in expense {expense!r}")
+        return date_ordinal, year, month_number, category_code, cents, description
+
+    # Function to write an encoded expense as a record at the end of the ledger
+    def _writeRecord(self, encoded_expense):
+        date_ordinal, year, month_number, category_code, cents, description = encoded_expense
+        description_offset = self.description_file.seek(0, os.SEEK_END)
+        self.description_file.write(description)
+        self.description_file.flush()
+        record = LEDGER_RECORD.pack(date_ordinal, category_code, cents, description_offset, len(description))
+        row = self.row_count
+        self.record_file.seek(LEDGER_HEADER.size + row * LEDGER_RECORD.size)
+        self.record_file.write(record)
+        self.row_count += 1
+        if self.rollups.hasMonth(year, month_number):
+            self.rollups.add(year, month_number, self.categories[category_code], cents)
+        return row, (year, month_number)
+
+    # Function to save an expense in the ledger and index it under its month; raises ValueError if it is invalid, without writing it
+    def append(self, expense):
+        self.extend([expense])
+
+    # Function to save many expenses at once, with a single index write per month
+    # Every expense is checked before the write: if one is invalid, ValueError is raised and none is saved
+    # The ledger is locked while writing, and records added by other processes since the ledger was opened are counted first,
+    # so that several processes can append to the same ledger
+    # The records are written first, then their month index entries, then the number of indexed records: if the process stops
+    # in between, the next process opening or extending the ledger finds that number smaller than the ledger and rebuilds the index
+    def extend(self, expenses):
+        encoded_expenses = [self._encodeExpense(expense) for expense in expenses]
+        rows_per_month = dict()
+        with ExpenseFileLock(self.path):
+            self._readNewRecords()
+            if self._indexRowCount() != self.row_count: self.rebuildIndex()
+            for encoded_expense in encoded_expenses:
+                row, month_key = self._writeRecord(encoded_expense)
+                rows_per_month.setdefault(month_key, array.array('I')).append(row)
+            self.record_file.flush()
+            for (year, month_number), rows in rows_per_month.items():
+                month_index_file = open(self._monthIndexPath(year, month_number), 'ab')
+                rows.tofile(month_index_file)
+                month_index_file.close()
+            self._setIndexRowCount(self.row_count)
+        self.version += 1
+
+    # Function to count the records appended by other processes, adding them to the rollups of the months already computed
+    # Returns the number of new records
+    def _readNewRecords(self):
+        file_size = self.record_file.seek(0, os.SEEK_END)
+        row_count = (file_size - LEDGER_HEADER.size) // LEDGER_RECORD.size
+        if row_count <= self.row_count: return 0
+        first_row, self.row_count = self.row_count, row_count
+        for record in self._iterRecords(first_row):
+            expense_date = date.fromordinal(record[0])
+            if self.rollups.hasMonth(expense_date.year, expense_date.month):
+                self.rollups.add(expense_date.year, expense_date.month, self.categories[record[1]], record[2])
+        self.version += 1
+        return row_count - first_row
+
+    # Function to take into account the expenses appended to the ledger by other processes since it was opened or last
+    # refreshed. Only the new records are read. Returns the number of new expenses
+    def refresh(self):
+        with ExpenseFileLock(self.path, exclusive=False):
+            return self._readNewRecords()
+
+    # Function to rebuild the month index from the records, e.g. after copying the ledger file alone
+    # Called under the ledger lock by load() and extend() when the index does not cover every record
+    # The number of indexed records is removed first and written last, so an interrupted rebuild is started again
+    def rebuildIndex(self):
+        self.rollups = ExpenseRollups()
+        row_count_path = os.path.join(self.index_dir, LEDGER_INDEX_ROW_COUNT_FILE)
+        if os.path.exists(row_count_path): os.remove(row_count_path)
+        for file_name in os.listdir(self.index_dir):
+            os.remove(os.path.join(self.index_dir, file_name))
+        rows_per_month = dict()
+        for row, record in enumerate(self._iterRecords()):
+            expense_date = date.fromordinal(record[0])
+            rows_per_month.setdefault((expense_date.year, expense_date.month), array.array('I')).append(row)
+        for (year, month_number), rows in rows_per_month.items():
+            month_index_file = open(self._monthIndexPath(year, month_number), 'wb')
+            rows.tofile(month_index_file)
+            month_index_file.close()
+        self._setIndexRowCount(self.row_count)
+        self.version += 1
+
+    def __len__(self):
+        return self.row_count
+
+    # Function to read the raw records of the ledger, block by block, optionally starting from a given row
+    def _iterRecords(self, first_row=0):
+        row = first_row
+        while row < self.row_count:
+            block_rows = min(LEDGER_READ_BLOCK_RECORDS, self.row_count - row)
+            self.record_file.seek(LEDGER_HEADER.size + row * LEDGER_RECORD.size)
+            yield from LEDGER_RECORD.iter_unpack(self.record_file.read(block_rows * LEDGER_RECORD.size))
+            row += block_rows
+
+    # Function to read the raw records of the ledger backwards, block by block, down to a given row
+    def _iterRecordsReversed(self, first_row=0):
+        row = self.row_count
+        while row > first_row:
+            block_rows = min(LEDGER_READ_BLOCK_RECORDS, row - first_row)
+            row -= block_rows
+            self.record_file.seek(LEDGER_HEADER.size + row * LEDGER_RECORD.size)
+            yield from reversed(list(LEDGER_RECORD.iter_unpack(self.record_file.read(block_rows * LEDGER_RECORD.size))))
+
+    # Function to get lazily the category code and amount in cents of the rows from first_row, from the last row backwards with reverse
+    def iterCategoryCents(self, first_row=0, reverse=False):
+        records = self._iterRecordsReversed(first_row) if reverse else self._iterRecords(first_row)
+        return ((record[1], record[2]) for record in records)
+
+    # Function to read the description of a record from the description heap
+    def _readDescription(self, offset, length):
+        self.description_file.seek(offset)
+        return self.description_file.read(length).decode("utf-8")
+
+    def _recordToExpense(self, record):
+        date_ordinal, category_code, cents, description_offset, description_length = record
+        return makeExpense(formatDateOrdinal(date_ordinal),
+                           self.categories[category_code],
+                           centsToAmount(cents),
+                           self._readDescription(description_offset, description_length))
+
+    def __iter__(self):
+        for record in self._iterRecords():
+            yield self._recordToExpense(record)
+
+    # Function to read the records of the expenses made in a given year and month, using the month index
+    def recordsForMonth(self, year, month_number):
+        index_path = self._monthIndexPath(year, month_number)
+        if not os.path.exists(index_path):
+            return
+        rows = array.array('I')
+        month_index_file = open(index_path, 'rb')
+        rows.frombytes(month_index_file.read())
+        month_index_file.close()
+        for row in rows:
+            if row >= self.row_count: continue # Index entry of a record that was never completely written
+            yield self._readRecord(row)
+
+    def _readRecord(self, row):
+        self.record_file.seek(LEDGER_HEADER.size + row * LEDGER_RECORD.size)
+        return LEDGER_RECORD.unpack(self.record_file.read(LEDGER_RECORD.size))
+
+    # Function to list the months that have an index file, as (year, month) in chronological order
+    def indexedMonths(self):
+        return sorted((int(file_name[0:4]), int(file_name[5:7])) for file_name in os.listdir(self.index_dir)
+                      if file_name.endswith(".rows"))
+
+    # Function to get lazily the expenses matching the optional filters
+    # With a date filter, only the months of the date range are read through the month index (in chronological order of months)
+    def iterExpenses(self, first_date=None, last_date=None, category=None, min_amount=None, max_amount=None):
+        first_ordinal, last_ordinal, min_cents, max_cents = encodeExpenseFilters(first_date, last_date, min_amount, max_amount)
+        records = self._recordsBetween(first_ordinal, last_ordinal)
+        records = self._filterRecords(records, first_ordinal, last_ordinal, category, min_cents, max_cents)
+        return (self._recordToExpense(record) for record in records)
+
+    # Function to read the records of the months between two day ordinals (None means no limit) through the month index
+    # The records of the first and last months are not filtered on their day
+    def _recordsBetween(self, first_ordinal, last_ordinal):
+        if first_ordinal is None and last_ordinal is None:
+            return self._iterRecords()
+        first_month = (date.fromordinal(first_ordinal).year, date.fromordinal(first_ordinal).month) if first_ordinal is not None else (0, 0)
+        last_month = (date.fromordinal(last_ordinal).year, date.fromordinal(last_ordinal).month) if last_ordinal is not None else (9999, 12)
+        return (record for year, month_number in self.indexedMonths() if first_month <= (year, month_number) <= last_month
+                for record in self.recordsForMonth(year, month_number))
+
+    # Function to filter lazily records on their date ordinal, category and amount in cents (None means no filter)
+    def _filterRecords(self, records, first_ordinal, last_ordinal, category, min_cents, max_cents):
+        if first_ordinal is not None: records = (record for record in records if record[0] >= first_ordinal)
+        if last_ordinal is not None: records = (record for record in records if record[0] <= last_ordinal)
+        if category is not None:
+            category_code = self.category_codes.get(category)
+            records = (record for record in records if record[1] == category_code)
+        if min_cents is not None: records = (record for record in records if record[2] >= min_cents)
+        if max_cents is not None: records = (record for record in records if record[2] <= max_cents)
+        return records
+
+    # Function to get the description index, indexing first the rows added since it was last used
+    # (all rows the first time, which reads the whole ledger once)
+    def _descriptionIndex(self):
+        if self.description_index is None:
+            self.description_index = DescriptionIndex()
+            self.indexed_rows = 0
+        for row, record in enumerate(self._iterRecords(self.indexed_rows), self.indexed_rows):
+            self.description_index.add(row, self._readDescription(record[3], record[4]))
+        self.indexed_rows = max(self.indexed_rows, self.row_count)
+        return self.description_index
+
+    # Function to get lazily the expenses whose description contains all the words of a query (e.g. "petsmart" or "pet*"),
+    # in the order of the ledger, with the same optional filters as iterExpenses()
+    def searchExpenses(self, query, first_date=None, last_date=None, category=None, min_amount=None, max_amount=None):
+        first_ordinal, last_ordinal, min_cents, max_cents = encodeExpenseFilters(first_date, last_date, min_amount, max_amount)
+        records = (self._readRecord(row) for row in self._descriptionIndex().search(query))
+        records = self._filterRecords(records, first_ordinal, last_ordinal, category, min_cents, max_cents)
+        return (self._recordToExpense(record) for record in records)
+
+    # Function to compute the rollups of a month from its indexed records, the first time the month is queried
+    def _monthRollups(self, year, month_number):
+        if not self.rollups.hasMonth(year, month_number):
+            self.rollups.setEmptyMonth(year, month_number)
+            for record in self.recordsForMonth(year, month_number):
+                self.rollups.add(year, month_number, self.categories[record[1]], record[2])
+        return self.rollups
+
+    # Function to get the total amount of the expenses made in a given year and month, optionally for one category
+    def totalForMonth(self, year, month_number, category=None):
+        return centsToAmount(self._monthRollups(year, month_number).totalCents(year, month_number, category))
+
+    # Function to get the totals in cents of each category for a given year and month
+    def categoryCentsForMonth(self, year, month_number):
+        return self._monthRollups(year, month_number).totalsCentsByCategory(year, month_number)
+
+    # Function to get the totals in cents of each category between two day ordinals (inclusive), reading only the months of the range
+    def categoryCentsBetween(self, first_ordinal, last_ordinal):
+        category_cents = [0] * len(self.categories)
+        records = self._filterRecords(self._recordsBetween(first_ordinal, last_ordinal), first_ordinal, last_ordinal, None, None, None)
+        for record in records:
+            category_cents[record[1]] += record[2]
+        return {category: cents for category, cents in zip(self.categories, category_cents) if cents}
+
+    # Function to import the expenses of a CSV file (same format as expense_database.csv)
+    def importCsv(self, csv_path, delimiter=","):
+        csv_storage = CsvExpenseStorage(csv_path, self.categories, delimiter)
+        self.extend(csv_storage.load())
+        return len(csv_storage)
+
+    # Function to export the whole ledger to a CSV file (same format as expense_database.csv)
+    def exportCsv(self, csv_path, delimiter=","):
+        csv_file = open(csv_path, 'w')
+        csv_file.write(delimiter.join(CSV_HEADER_FIELDS))
+        for expense in self:
+            csv_file.write("\n" + delimiter.join(formatCsvField(expense[key], delimiter) for key in EXPENSE_KEYS))
+        csv_file.close()
@@ -0,0 +1,446 @@
+# %%
+# Benchmarks of the personal expense tracker data structures, on generated expenses.
+# Usage: python expense_tracker_benchmarks.py [--rows N] [--writers N] [benchmark ...]
+import argparse
+import array
+import statistics
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from expense_alerts import ALERT_WINDOW_EXPENSES, ExpenseAlerts, StreamingQuantile
+from expense_budgets import BudgetStore
+from expense_columns import ExpenseColumns
+from expense_csv import CsvRecordReader
+from expense_ledgers import LedgerPool, listUsers
+from expense_dates import dateOrdinal, parseDate, parseDateOrdinals, monthOrdinalRange
+from expense_parquet import exportParquet, readParquet
+from expense_search import DescriptionIndex
+from expense_snapshots import SNAPSHOT_FILE_SUFFIX
+from expense_storage import CSV_HEADER_FIELDS, EXPENSE_KEYS, CsvExpenseStorage, amountToCents, centsToAmount, makeExpense
+from personal_expense_tracker import EXPENSE_CATEGORIES as BENCHMARK_CATEGORIES
+
+BENCHMARK_DESCRIPTIONS = ("Home insurance premium", "Gas fill-up for Mary's car", "School supplies for Peter", "Trash collection fee",
+                          "Pet supplies from PetSmart", "Bob and Mary date night", "Tollway charges", "Kids activity club monthly fee",
+                          "Monthly stock-up from Kroger")
+DEFAULT_BENCHMARK_ROWS = 200000
+DEFAULT_BENCHMARK_WRITERS = 8
+DEFAULT_BENCHMARK_USERS = 20
+MONEY_CHECK_LEDGERS = 1000 # Random ledgers whose totals are compared with the Decimal reference
+BENCHMARK_RECURRING_RULES = 10 # Monthly rules of each user, started one year ago
+
+
+# %%
+# Function to generate expense lines in the expense_database.csv format (without header)
+def generateExpenseLines(rows, seed=0):
+    generator = random.Random(seed)
+    first_day = date(2015, 1, 1)
+    return [f"{(first_day + timedelta(days=generator.randrange(3650))).isoformat()},{generator.choice(BENCHMARK_CATEGORIES)},"
+            f"{generator.uniform(1, 700):.2f},{generator.choice(BENCHMARK_DESCRIPTIONS)}" for _ in range(rows)]
+
+# Function to measure the time of a function call
+def timeCall(function, *arguments):
+    start_time = time.perf_counter()
+    result = function(*arguments)
+    return result, time.perf_counter() - start_time
+
+# Function to measure the memory still allocated after a function call, i.e. the size of the object it builds
+def memoryOfCall(function, *arguments):
+    tracemalloc.start()
+    result = function(*arguments)
+    allocated_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return allocated_memory
+
+# Function to measure the highest memory allocated during a function call
+def peakMemoryOfCall(function, *arguments):
+    tracemalloc.start()
+    function(*arguments)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_memory
+
+def printResult(label, elapsed_time, allocated_memory=None, rows=None, peak_memory=None):
+    line = f"  {label:<45} {elapsed_time * 1000:10.1f} ms"
+    if allocated_memory is not None and rows:
+        line += f"  {allocated_memory / rows:8.1f} bytes/row"
+    if peak_memory is not None:
+        line += f"  {peak_memory / 2**20:8.1f} MiB peak"
+    print(line)
+
+
+# %%
+# Columnar store versus the list of dictionaries: memory per row and monthly aggregation speed
+def buildExpenseDicts(expense_lines):
+    return [dict(zip(("date", "category", "amount", "description"), expense_line.split(",", 3))) for expense_line in expense_lines]
+
+def buildExpenseColumns(expense_lines):
+    expense_columns = ExpenseColumns(BENCHMARK_CATEGORIES)
+    for expense_line in expense_lines:
+        expense_date, category, amount, description = expense_line.split(",", 3)
+        expense_columns.append(expense_date, category, amountToCents(amount), description)
+    return expense_columns
+
+def totalForMonthDicts(expenses, year, month_number):
+    total_expenses = 0
+    for expense in expenses:
+        expense_date = datetime.strptime(expense["date"], "%Y-%m-%d")
+        if expense_date.year == year and expense_date.month == month_number:
+            total_expenses += float(expense["amount"])
+    return round(total_expenses, 2)
+
+def totalForMonthColumns(expense_columns, year, month_number):
+    first_ordinal, last_ordinal = monthOrdinalRange(year, month_number)
+    return round(expense_columns.totalCentsBetween(first_ordinal, last_ordinal) / 100, 2)
+
+def benchmarkColumnarStore(rows):
+    print(f"Columnar store versus list of dictionaries ({rows} rows)")
+    expense_lines = generateExpenseLines(rows)
+    expense_dicts, elapsed_time = timeCall(buildExpenseDicts, expense_lines)
+    printResult("build list of dictionaries", elapsed_time, memoryOfCall(buildExpenseDicts, expense_lines), rows)
+    expense_columns, elapsed_time = timeCall(buildExpenseColumns, expense_lines)
+    printResult("build columns", elapsed_time, memoryOfCall(buildExpenseColumns, expense_lines), rows)
+    dicts_total, elapsed_time = timeCall(totalForMonthDicts, expense_dicts, 2020, 4)
+    printResult("monthly total, list of dictionaries", elapsed_time)
+    columns_total, elapsed_time = timeCall(totalForMonthColumns, expense_columns, 2020, 4)
+    printResult("monthly total, columns", elapsed_time)
+    if dicts_total != columns_total:
+        print(f"  WARNING: totals differ ({dicts_total} != {columns_total})")
+
+
+# %%
+# Concurrent writers: several processes append to the same expense file, then the file is checked for corruption
+def writeExpensesFromProcess(arguments):
+    path, writer_number, rows = arguments
+    expense_storage = CsvExpenseStorage(path, BENCHMARK_CATEGORIES)
+    expense_storage.load()
+    for sequence in range(rows):
+        expense_storage.append(makeExpense("2025-04-05", BENCHMARK_CATEGORIES[sequence % len(BENCHMARK_CATEGORIES)],
+                                           f"{sequence % 500 + 1}.25", f"Writer {writer_number}, expense {sequence}"))
+    return rows
+
+def benchmarkConcurrentWriters(rows, writers):
+    rows_per_writer = max(1, rows // writers)
+    print(f"Concurrent writers ({writers} processes, {rows_per_writer} expenses each)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "expense_database.csv")
+        CsvExpenseStorage(path, BENCHMARK_CATEGORIES).create()
+        start_time = time.perf_counter()
+        with multiprocessing.Pool(writers) as pool:
+            written_rows = sum(pool.map(writeExpensesFromProcess, [(path, writer_number, rows_per_writer) for writer_number in range(writers)]))
+        elapsed_time = time.perf_counter() - start_time
+        printResult(f"append {written_rows} expenses", elapsed_time)
+        print(f"  {written_rows / elapsed_time:,.0f} expenses/second")
+
+        expense_storage = CsvExpenseStorage(path, BENCHMARK_CATEGORIES)
+        expense_storage.load()
+        descriptions = set(expense["description"] for expense in expense_storage)
+        expected_descriptions = set(f"Writer {writer_number}, expense {sequence}"
+                                    for writer_number in range(writers) for sequence in range(rows_per_writer))
+        if len(expense_storage) == written_rows and not expense_storage.invalid_lines and descriptions == expected_descriptions:
+            print("  OK: every expense was read back, no corrupted line")
+        else:
+            print(f"  ERROR: {len(expense_storage)} expenses read back, {len(expense_storage.invalid_lines)} invalid lines, "
+                  f"{len(expected_descriptions - descriptions)} expenses missing")
+
+
+# %%
+# Date parsing: strptime on every row (previous getTotalExpense() and validators) versus parsing each distinct date once
+def parseDatesStrptime(date_texts):
+    return [datetime.strptime(date_text, "%Y-%m-%d").toordinal() for date_text in date_texts]
+
+def parseDatesFromIsoFormat(date_texts):
+    return [date.fromisoformat(date_text).toordinal() for date_text in date_texts]
+
+def parseDatesParseDate(date_texts):
+    return [parseDate(date_text)[0] for date_text in date_texts]
+
+def benchmarkDateParsing(rows):
+    print(f"Date parsing ({rows} dates)")
+    date_texts = [expense_line[0:10] for expense_line in generateExpenseLines(rows)]
+    reference_ordinals, elapsed_time = timeCall(parseDatesStrptime, date_texts)
+    printResult("strptime on every row", elapsed_time)
+    _, elapsed_time = timeCall(parseDatesFromIsoFormat, date_texts)
+    printResult("date.fromisoformat on every row", elapsed_time)
+    _, elapsed_time = timeCall(parseDatesParseDate, date_texts)
+    printResult("parseDate on every row", elapsed_time)
+    ordinals, elapsed_time = timeCall(parseDateOrdinals, date_texts)
+    printResult("parseDateOrdinals (column at once)", elapsed_time)
+    if list(ordinals) != reference_ordinals:
+        print("  WARNING: the parsed dates differ")
+
+
+# %%
+# Reading an expense file: whole file read and split on new lines and commas (previous loadExpenses()) versus the
+# streaming CSV reader. Each row is turned into an expense dictionary, which is then dropped
+def readExpenseFileSplit(path):
+    expense_file = open(path, 'r', encoding="utf-8", newline="")
+    expense_list = expense_file.read().split("\n")
+    expense_file.close()
+    record_count = 0
+    for expense_line in expense_list[1:]:
+        expense_line = expense_line.rstrip("\r")
+        if expense_line == "": continue
+        dict(zip(EXPENSE_KEYS, expense_line.split(",", 3)))
+        record_count += 1
+    return record_count
+
+def readExpenseFileStreaming(path):
+    expense_file = open(path, 'rb')
+    records = iter(CsvRecordReader(expense_file))
+    next(records, None) # Header
+    record_count = 0
+    for _, fields, _ in records:
+        dict(zip(EXPENSE_KEYS, fields))
+        record_count += 1
+    expense_file.close()
+    return record_count
+
+def benchmarkCsvReading(rows):
+    print(f"Reading an expense file ({rows} rows)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "expense_database.csv")
+        expense_file = open(path, 'w', encoding="utf-8")
+        expense_file.write(",".join(CSV_HEADER_FIELDS) + "\n" + "\n".join(generateExpenseLines(rows)) + "\n")
+        expense_file.close()
+        split_count, elapsed_time = timeCall(readExpenseFileSplit, path)
+        printResult("read whole file and split", elapsed_time, peak_memory=peakMemoryOfCall(readExpenseFileSplit, path))
+        streaming_count, elapsed_time = timeCall(readExpenseFileStreaming, path)
+        printResult("streaming CSV reader", elapsed_time, peak_memory=peakMemoryOfCall(readExpenseFileStreaming, path))
+        if split_count != streaming_count:
+            print(f"  WARNING: the number of rows differ ({split_count} != {streaming_count})")
+
+
+# %%
+# Description search: substring scan of every expense dictionary versus the inverted index of the descriptions
+def searchExpenseDicts(expenses, word, first_date, category):
+    return [expense for expense in expenses if word in expense["description"].lower()
+            and expense["date"] >= first_date and expense["category"] == category]
+
+def buildDescriptionIndex(expense_columns):
+    description_index = DescriptionIndex()
+    description_pool, description_ids = expense_columns.description_pool, expense_columns.description_ids
+    for row in range(len(expense_columns)):
+        description_index.add(row, description_pool[description_ids[row]])
+    return description_index
+
+def searchDescriptionIndex(expense_columns, description_index, query, first_date, category):
+    rows = expense_columns.iterRows(dateOrdinal(first_date), None, category, rows=description_index.search(query))
+    return [expense_columns.expenseAt(row) for row in rows]
+
+def benchmarkDescriptionSearch(rows):
+    print(f"Description search ({rows} rows)")
+    expense_lines = generateExpenseLines(rows)
+    expense_dicts = buildExpenseDicts(expense_lines)
+    expense_columns = buildExpenseColumns(expense_lines)
+    description_index, elapsed_time = timeCall(buildDescriptionIndex, expense_columns)
+    printResult("build description index", elapsed_time)
+    scanned_expenses, elapsed_time = timeCall(searchExpenseDicts, expense_dicts, "petsmart", "2024-01-01", "Miscellaneous")
+    printResult("substring scan of the dictionaries", elapsed_time)
+    indexed_expenses, elapsed_time = timeCall(searchDescriptionIndex, expense_columns, description_index, "petsmart", "2024-01-01", "Miscellaneous")
+    printResult("index search, word", elapsed_time)
+    _, elapsed_time = timeCall(searchDescriptionIndex, expense_columns, description_index, "pet*", "2024-01-01", "Miscellaneous")
+    printResult("index search, prefix", elapsed_time)
+    if [(expense["date"], expense["description"]) for expense in scanned_expenses] != \
+       [(expense["date"], expense["description"]) for expense in indexed_expenses]:
+        print("  WARNING: the search results differ")
+
+
+# %%
+# Cold start: parsing the whole expense file versus reading its snapshot and parsing only the lines written after it
+def loadExpenseStorage(path):
+    storage = CsvExpenseStorage(path, BENCHMARK_CATEGORIES)
+    storage.load()
+    return storage
+
+def benchmarkSnapshotLoading(rows):
+    print(f"Loading an expense file with a snapshot ({rows} rows, then {rows // 100} rows appended)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "expense_database.csv")
+        storage = CsvExpenseStorage(path, BENCHMARK_CATEGORIES)
+        storage.create()
+        storage.extend(dict(zip(EXPENSE_KEYS, line.split(","))) for line in generateExpenseLines(rows))
+        full_storage, elapsed_time = timeCall(loadExpenseStorage, path)
+        printResult("parse the whole file", elapsed_time)
+        _, elapsed_time = timeCall(full_storage.snapshot)
+        printResult("write the snapshot", elapsed_time)
+        storage.extend(dict(zip(EXPENSE_KEYS, line.split(","))) for line in generateExpenseLines(rows // 100, seed=1))
+        snapshot_storage, elapsed_time = timeCall(loadExpenseStorage, path)
+        printResult("read the snapshot and parse the new lines", elapsed_time)
+        os.remove(path + SNAPSHOT_FILE_SUFFIX)
+        parsed_storage = loadExpenseStorage(path)
+        if list(snapshot_storage) != list(parsed_storage) or snapshot_storage.rollups.years != parsed_storage.rollups.years:
+            print("  WARNING: the expenses loaded from the snapshot differ")
+
+
+# %%
+# Money arithmetic: totals of float amounts versus integer cents, compared with exact Decimal totals
+def totalOfFloats(amounts):
+    return round(sum(amounts), 2)
+
+def totalOfCents(amount_cents):
+    return sum(amount_cents)
+
+def totalOfDecimals(decimal_amounts):
+    return sum(decimal_amounts, Decimal(0))
+
+# Function to check on random ledgers that the totals and budget balances in cents are those of the Decimal reference,
+# including budgets spent exactly (balance 0). Returns the number of wrong totals in cents and in floats
+def checkMoneyTotals(ledgers, seed=0):
+    generator = random.Random(seed)
+    wrong_cents_totals, wrong_float_totals = 0, 0
+    for _ in range(ledgers):
+        amounts = [f"{generator.randrange(1, 100000) / 100:.2f}" for _ in range(generator.randrange(1, 500))]
+        reference_total = sum(map(Decimal, amounts), Decimal(0))
+        amount_cents = array.array('q', map(amountToCents, amounts))
+        budget_cents = amountToCents(reference_total) # Budget spent exactly
+        if centsToAmount(sum(amount_cents)) != reference_total or centsToAmount(budget_cents - sum(amount_cents)) != 0:
+            wrong_cents_totals += 1
+        float_total = sum(float(amount) for amount in amounts)
+        if float_total != float(reference_total): wrong_float_totals += 1
+    return wrong_cents_totals, wrong_float_totals
+
+def benchmarkMoneyArithmetic(rows):
+    print(f"Total of the amounts ({rows} rows)")
+    amounts = [line.split(",")[2] for line in generateExpenseLines(rows)]
+    float_amounts = [float(amount) for amount in amounts]
+    decimal_amounts = [Decimal(amount) for amount in amounts]
+    amount_cents = array.array('q', map(amountToCents, amounts))
+    reference_total, elapsed_time = timeCall(totalOfDecimals, decimal_amounts)
+    printResult("Decimal amounts (reference)", elapsed_time)
+    float_total, elapsed_time = timeCall(totalOfFloats, float_amounts)
+    printResult("float amounts", elapsed_time)
+    cents_total, elapsed_time = timeCall(totalOfCents, amount_cents)
+    printResult("integer cents", elapsed_time)
+    print(f"  totals: Decimal {reference_total}, float {float_total!r}, cents {centsToAmount(cents_total)}")
+    if centsToAmount(cents_total) != reference_total:
+        print("  WARNING: the total in cents differs from the Decimal reference")
+    wrong_cents_totals, wrong_float_totals = checkMoneyTotals(MONEY_CHECK_LEDGERS)
+    print(f"  {MONEY_CHECK_LEDGERS} random ledgers: {wrong_cents_totals} wrong totals or balances in cents, "
+          f"{wrong_float_totals} unrounded float totals differing from the Decimal reference")
+    if wrong_cents_totals:
+        print("  WARNING: totals in cents differ from the Decimal reference")
+
+
+# %%
+# Expense alerts: check of each new expense with the streaming medians versus exact medians of the recent expenses
+# of its category, recomputed from the columns at each check
+def checkWithExactMedian(expense_columns, category, cents):
+    category_code = expense_columns.category_codes[category]
+    category_codes_column, amount_cents = expense_columns.category_codes_column, expense_columns.amount_cents
+    recent_cents = list()
+    for row in range(len(expense_columns) - 1, -1, -1):
+        if category_codes_column[row] == category_code:
+            recent_cents.append(amount_cents[row])
+            if len(recent_cents) == 2 * ALERT_WINDOW_EXPENSES: break
+    return cents > 3 * statistics.median(recent_cents)
+
+def benchmarkExpenseAlerts(rows):
+    checks = 1000
+    print(f"Alerts on {checks} new expenses ({rows} rows)")
+    with tempfile.TemporaryDirectory() as directory:
+        storage = CsvExpenseStorage(os.path.join(directory, "expense_database.csv"), BENCHMARK_CATEGORIES)
+        storage.create()
+        storage.extend(dict(zip(EXPENSE_KEYS, line.split(","))) for line in generateExpenseLines(rows))
+        alerts = ExpenseAlerts(storage, BudgetStore(os.path.join(directory, "budget_database.json")))
+        new_expenses = [dict(zip(EXPENSE_KEYS, line.split(","))) for line in generateExpenseLines(checks, seed=1)]
+        _, elapsed_time = timeCall(alerts.check, new_expenses[0])
+        printResult("first check (reads the recent expenses)", elapsed_time)
+        _, elapsed_time = timeCall(lambda: [alerts.check(expense) for expense in new_expenses])
+        printResult(f"{checks} checks with streaming medians", elapsed_time)
+        _, elapsed_time = timeCall(lambda: [checkWithExactMedian(storage.expenses, expense["category"], amountToCents(expense["amount"]))
+                                            for expense in new_expenses])
+        printResult(f"{checks} checks with exact medians", elapsed_time)
+        amounts = [amountToCents(line.split(",")[2]) for line in generateExpenseLines(rows)]
+        sketch = StreamingQuantile()
+        for cents in amounts: sketch.add(cents)
+        print(f"  median of all the amounts: streaming {centsToAmount(round(sketch.value()))}, exact {centsToAmount(statistics.median(amounts))}")
+
+
+# %%
+# Parquet export partitioned by year and month: reading one month only reads its partition
+def benchmarkParquetExport(rows):
+    print(f"Parquet export ({rows} rows)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "expense_database.csv")
+        storage = CsvExpenseStorage(path, BENCHMARK_CATEGORIES)
+        storage.create()
+        storage.extend(dict(zip(EXPENSE_KEYS, line.split(","))) for line in generateExpenseLines(rows))
+        parquet_directory = os.path.join(directory, "parquet")
+        try:
+            _, elapsed_time = timeCall(exportParquet, storage, parquet_directory)
+        except ImportError as error:
+            print(f"  skipped: {error}")
+            return
+        printResult("export", elapsed_time)
+        table, elapsed_time = timeCall(readParquet, parquet_directory)
+        printResult("read every partition", elapsed_time)
+        month_table, elapsed_time = timeCall(readParquet, parquet_directory, "2020-03-01", "2020-03-31")
+        printResult(f"read one month ({month_table.num_rows} rows)", elapsed_time)
+        _, elapsed_time = timeCall(readParquet, parquet_directory, "2020-03-01", "2020-03-31", ("amount",))
+        printResult("read one column of one month", elapsed_time)
+        amounts = table.column("amount").to_pylist()
+        if table.num_rows != len(storage) or amountToCents(sum(amounts)) != sum(storage.expenses.amount_cents):
+            print("  WARNING: the exported expenses differ")
+
+
+# %%
+# Recurring expenses of many users: one scheduler run (one write per user), the same run again (nothing to add),
+# and the same expenses appended one at a time
+def benchmarkRecurringExpenses(users):
+    print(f"Recurring expenses ({users} users, {BENCHMARK_RECURRING_RULES} monthly rules each, one year)")
+    through_date = date.today()
+    start = (through_date - timedelta(days=365)).isoformat()
+    with tempfile.TemporaryDirectory() as directory:
+        pool = LedgerPool(os.path.join(directory, "users"), BENCHMARK_CATEGORIES)
+        for user_number in range(users):
+            ledger = pool.get(f"user{user_number}")
+            for rule_number in range(BENCHMARK_RECURRING_RULES):
+                ledger.recurring.set(f"rule{rule_number}", BENCHMARK_CATEGORIES[rule_number % len(BENCHMARK_CATEGORIES)],
+                                     10 + rule_number, BENCHMARK_DESCRIPTIONS[rule_number % len(BENCHMARK_DESCRIPTIONS)], start)
+        expenses = [expense for _, ledger in sorted(pool.ledgers.items()) for expense in ledger.recurring.dueExpenses(through_date)]
+        user_names = listUsers(pool.root)
+        added_counts, elapsed_time = timeCall(pool.materializeRecurringExpenses, user_names, through_date)
+        printResult(f"scheduler run, {sum(added_counts.values())} expenses", elapsed_time)
+        added_counts, elapsed_time = timeCall(pool.materializeRecurringExpenses, user_names, through_date)
+        printResult("same run again (nothing due)", elapsed_time)
+        if sum(added_counts.values()):
+            print("  WARNING: the second run added expenses")
+        storage = CsvExpenseStorage(os.path.join(directory, "expense_database.csv"), BENCHMARK_CATEGORIES)
+        storage.create()
+        _, elapsed_time = timeCall(lambda: [storage.append(expense) for expense in expenses])
+        printResult(f"{len(expenses)} expenses appended one at a time", elapsed_time)
+        pool.close()
+
+
+# %%
+BENCHMARKS = {
+    "alerts": lambda options: benchmarkExpenseAlerts(options.rows),
+    "columns": lambda options: benchmarkColumnarStore(options.rows),
+    "csv": lambda options: benchmarkCsvReading(options.rows),
+    "dates": lambda options: benchmarkDateParsing(options.rows),
+    "money": lambda options: benchmarkMoneyArithmetic(options.rows),
+    "parquet": lambda options: benchmarkParquetExport(options.rows),
+    "recurring": lambda options: benchmarkRecurringExpenses(options.users),
+    "search": lambda options: benchmarkDescriptionSearch(options.rows),
+    "snapshot": lambda options: benchmarkSnapshotLoading(options.rows),
+    "writers": lambda options: benchmarkConcurrentWriters(options.rows, options.writers),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the personal expense tracker")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run among {', '.join(BENCHMARKS)} (all by default)")
+    parser.add_argument("--rows", type=int, default=DEFAULT_BENCHMARK_ROWS, help="number of generated expenses")
+    parser.add_argument("--users", type=int, default=DEFAULT_BENCHMARK_USERS, help="number of users with recurring expenses")
+    parser.add_argument("--writers", type=int, default=DEFAULT_BENCHMARK_WRITERS, help="number of concurrent writer processes")
+    options = parser.parse_args()
+    for benchmark_name in options.benchmarks:
+        if benchmark_name not in BENCHMARKS: parser.error(f"unknown benchmark {benchmark_name!r}")
+    for benchmark_name in options.benchmarks or BENCHMARKS:
+        BENCHMARKS[benchmark_name](options)
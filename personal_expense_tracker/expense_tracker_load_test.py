@@ -0,0 +1,79 @@
+# %%
+# Load test of the expense tracker HTTP API (expense_tracker_server.py), standard library only.
+# Start the server on a scratch expense file first, since the test adds expenses:
+#   python expense_tracker_server.py --database load_test_expenses.csv --budgets load_test_budgets.json
+#   python expense_tracker_load_test.py --requests 20000 --connections 50 --write-ratio 0.5
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date
+
+from personal_expense_tracker import EXPENSE_CATEGORIES
+
+
+# %%
+# Function to send one request on an open connection and read the JSON response. Returns the status
+async def sendRequest(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    content_length = 0
+    while True:
+        header_line = await reader.readline()
+        if header_line in (b"\r\n", b""): break
+        name, _, value = header_line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length": content_length = int(value)
+    await reader.readexactly(content_length)
+    return status
+
+# Function to run the requests of one client connection. Returns the latencies (seconds) and the number of errors
+async def runClient(host, port, requests, write_ratio, seed):
+    generator = random.Random(seed)
+    today = date.today()
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = list()
+    errors = 0
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        if generator.random() < write_ratio:
+            status = await sendRequest(reader, writer, "POST", "/expenses", {
+                "date": today.replace(day=generator.randint(1, today.day)).isoformat(),
+                "category": generator.choice(EXPENSE_CATEGORIES),
+                "amount": round(generator.uniform(1, 300), 2),
+                "description": "Load test expense"})
+        else:
+            status = await sendRequest(reader, writer, "GET", f"/budgets/{today.year}/{today.month}")
+        latencies.append(time.perf_counter() - start_time)
+        if status >= 400: errors += 1
+    writer.close()
+    return latencies, errors
+
+async def runLoadTest(host, port, requests, connections, write_ratio):
+    requests_per_connection = max(1, requests // connections)
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(runClient(host, port, requests_per_connection, write_ratio, seed)
+                                     for seed in range(connections)))
+    elapsed_time = time.perf_counter() - start_time
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    print(f"{len(latencies)} requests on {connections} connections in {elapsed_time:.2f} s "
+          f"({write_ratio:.0%} expense additions, {1 - write_ratio:.0%} budget lookups)")
+    print(f"  {len(latencies) / elapsed_time:,.0f} requests/second, {errors} errors")
+    for percentile in (50, 90, 99):
+        print(f"  p{percentile} latency: {latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)] * 1000:.2f} ms")
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the expense tracker HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=10000, help="total number of requests")
+    parser.add_argument("--connections", type=int, default=50, help="number of concurrent client connections")
+    parser.add_argument("--write-ratio", type=float, default=0.5, help="share of requests that add an expense")
+    options = parser.parse_args()
+    asyncio.run(runLoadTest(options.host, options.port, options.requests, options.connections, options.write_ratio))
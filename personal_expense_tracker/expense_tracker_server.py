@@ -0,0 +1,349 @@
+# %%
+# Local HTTP JSON API of the personal expense tracker, served by asyncio (standard library only).
+# Usage: python expense_tracker_server.py [--host 127.0.0.1] [--port 8080] [--database expense_database.csv] ...
+#
+#   POST /expenses                 {"date": "2025-04-05", "category": "Groceries", "amount": 49.7, "description": "Kroger"}
+#                                  returns the expense with its "alerts" (unusual amount, budget exceeded or at risk)
+#   GET  /expenses?from=2025-04-01&to=2025-04-30&category=Groceries&min_amount=10&max_amount=100&search=pet*&limit=100
+#   GET  /budgets/2025/4           budget, total expenses, remaining balance and category totals of the month
+#   PUT  /budgets/2025/4           {"amount": 1500}
+#   GET  /reports/quarter?year=2025 budget versus expenses report: year, quarter, rolling (&end=2025-04-30&days=30) or category
+#
+# The same paths under /users/<user> (e.g. /users/alice/expenses) use the expense and budget files of that user,
+# in the users directory (--users-dir), created by the first POST or PUT of the user (a GET of an unknown user answers 404). The most recently used user ledgers are kept open in memory (--open-ledgers).
+#
+# Expenses are validated when received, then written in groups: the expenses received while the previous group
+# was being written are saved together with a single write, and every request of the group is answered after that write.
+# The writes are made in a thread, so the other connections are served meanwhile; the requests reading the ledger
+# being written wait for the end of its write (one lock per ledger).
+# Budget statuses are kept in memory and recomputed only after the expenses or the budgets change, including the expenses
+# and budgets saved by other processes (e.g. the command line), which are read before answering.
+import argparse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+import personal_expense_tracker as tracker
+from expense_ledgers import DEFAULT_OPEN_LEDGERS, LedgerPool, normalizeUserName
+from expense_reports import DEFAULT_ROLLING_DAYS, REPORT_PERIODS
+from expense_storage import jsonAmount
+
+DEFAULT_SERVER_HOST = "127.0.0.1"
+DEFAULT_SERVER_PORT = 8080
+GROUP_COMMIT_MAX_EXPENSES = 1000 # Maximum number of expenses saved by one write
+EXPENSE_LIST_DEFAULT_LIMIT = 100
+HTTP_MAX_BODY_SIZE = 65536
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+# %%
+# Writer task saving the expenses in groups (group commit): one write per user in each group
+# The writes of the users of a group are made at the same time, each in a thread of the default executor
+class GroupCommitWriter:
+
+    def __init__(self, storage_of, writing_ledger):
+        self.queue = asyncio.Queue()
+        self.storage_of = storage_of # Function returning the expense storage of a user (None for the configured files)
+        self.writing_ledger = writing_ledger # Function returning the async context manager held while a user's ledger is written
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    # Function to queue an expense of a user; returns once it is saved
+    async def submit(self, user, expense):
+        saved = asyncio.get_running_loop().create_future()
+        await self.queue.put((user, expense, saved))
+        return await saved
+
+    async def run(self):
+        while True:
+            group = [await self.queue.get()]
+            while len(group) < GROUP_COMMIT_MAX_EXPENSES and not self.queue.empty():
+                group.append(self.queue.get_nowait())
+            user_groups = dict()
+            for user, expense, saved in group:
+                user_groups.setdefault(user, list()).append((expense, saved))
+            await asyncio.gather(*(self.commit(user, user_group) for user, user_group in user_groups.items()))
+
+    # Function to save the expenses of a user in one write, then answer their requests
+    async def commit(self, user, user_group):
+        expenses = [expense for expense, _ in user_group]
+        try:
+            async with self.writing_ledger(user):
+                storage = self.storage_of(user)
+                await asyncio.get_running_loop().run_in_executor(None, storage.extend, expenses)
+        except Exception as error:
+            for _, saved in user_group:
+                if not saved.done(): saved.set_exception(error)
+            return
+        for expense, saved in user_group:
+            if not saved.done(): saved.set_result(expense)
+
+
+# %%
+# Cache of the budget statuses, by (user, year, month number), with the versions of the expenses and budgets they were computed from
+# The expenses and budgets saved by other processes are read first, so a status is recomputed after any change
+class BudgetStatusCache:
+
+    def __init__(self, ledger_of):
+        self.ledger_of = ledger_of # Function returning the expense storage and budget store of a user
+        self.statuses = dict() # (user, year, month number) -> (storage version, budgets version, status)
+
+    def get(self, user, year, month_number):
+        storage, budgets = self.ledger_of(user)
+        storage.refresh()
+        budgets.refresh()
+        versions = (storage.version, budgets.version)
+        cached = self.statuses.get((user, year, month_number))
+        if cached is not None and cached[0] == versions: return cached[1]
+        status = tracker.getBudgetStatus(year, month_number, storage, budgets)
+        self.statuses[(user, year, month_number)] = (versions, status)
+        return status
+
+
+# %%
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Function to check that a text is a number written with the digits 0 to 9 only (str.isdigit also accepts "²", which int() rejects)
+def isAsciiNumber(value):
+    return value.isascii() and value.isdigit()
+
+# Function to read the Content-Length header of a request (0 when there is none): a number of bytes written with digits only
+def parseContentLength(value):
+    if not value: return 0
+    if not isAsciiNumber(value): raise HttpError(400, f"Invalid Content-Length {value!r}")
+    return int(value)
+
+# Function to read the JSON object of a request body
+def parseJsonBody(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HttpError(400, "The request body must be a JSON object")
+    if not isinstance(payload, dict): raise HttpError(400, "The request body must be a JSON object")
+    return payload
+
+# Function to read the year and month number of a /budgets/<year>/<month> path
+def parseBudgetPath(path_parts):
+    if len(path_parts) != 3 or not isAsciiNumber(path_parts[1]) or not isAsciiNumber(path_parts[2]) or not tracker.isValidMonth(path_parts[2]):
+        raise HttpError(404, "Expected /budgets/<year>/<month number>")
+    return int(path_parts[1]), int(path_parts[2])
+
+
+class ExpenseTrackerServer:
+
+    def __init__(self, users_directory=None, open_ledgers=DEFAULT_OPEN_LEDGERS):
+        self.ledgers = LedgerPool(users_directory or tracker.USERS_DIRECTORY, tracker.EXPENSE_CATEGORIES,
+                                  tracker.EXPENSE_STORAGE_BACKEND, open_ledgers, tracker.CSV_DELIMITER)
+        self.budget_cache = BudgetStatusCache(self.ledgerOf)
+        self.ledger_locks = dict() # User (None for the configured files) -> asyncio.Lock held while their ledger is used
+        self.writer = GroupCommitWriter(lambda user: self.ledgerOf(user)[0], self.writingLedger)
+
+    # Function to hold the lock of a user's ledger, so that it is not read while a thread writes it
+    def ledgerLock(self, user):
+        lock = self.ledger_locks.get(user)
+        if lock is None: lock = self.ledger_locks[user] = asyncio.Lock()
+        return lock
+
+    # Context manager held while a thread writes the ledger of a user: the ledger is locked and is not closed by the pool
+    @asynccontextmanager
+    async def writingLedger(self, user):
+        async with self.ledgerLock(user):
+            if user is not None: self.ledgers.pinned.add(user)
+            try:
+                yield
+            finally:
+                self.ledgers.pinned.discard(user)
+
+    # Function to get the expense storage and budget store of a user (None for the files configured in the tracker)
+    def ledgerOf(self, user):
+        if user is None: return tracker.getStorage(), tracker.BUDGETS
+        ledger = self.ledgers.get(user)
+        return ledger.storage, ledger.budgets
+
+    def reportsOf(self, user):
+        if user is None: return tracker.getReportEngine()
+        return self.ledgers.get(user).reports
+
+    def alertsOf(self, user):
+        if user is None: return tracker.getExpenseAlerts()
+        return self.ledgers.get(user).alerts
+
+    # Function to answer a request. Returns the status and the JSON payload
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        path_parts = [part for part in url.path.split("/") if part]
+        user = None
+        if path_parts and path_parts[0] == "users":
+            if len(path_parts) < 3: raise HttpError(404, "Expected /users/<user>/expenses or /users/<user>/budgets/<year>/<month number>")
+            try:
+                user = normalizeUserName(path_parts[1])
+            except ValueError as error:
+                raise HttpError(404, str(error))
+            path_parts = path_parts[2:]
+        if path_parts == ["expenses"] and method == "POST": return 201, await self.addExpense(user, parseJsonBody(body))
+        async with self.ledgerLock(user):
+            return self.routeLedger(method, url, path_parts, body, user)
+
+    # Function to answer a request other than a new expense, the lock of the user's ledger being held
+    # Reading the ledger of a user who has none answers 404: only the requests saving something create the user's files
+    def routeLedger(self, method, url, path_parts, body, user):
+        if method == "GET" and user is not None and not self.ledgers.exists(user): raise HttpError(404, f"Unknown user {user!r}")
+        if path_parts == ["expenses"]:
+            if method == "GET": return 200, self.listExpenses(user, parse_qs(url.query))
+            raise HttpError(405, f"{method} is not allowed on /expenses")
+        if path_parts and path_parts[0] == "budgets":
+            year, month_number = parseBudgetPath(path_parts)
+            if method == "GET": return 200, self.budget_cache.get(user, year, month_number)
+            if method == "PUT": return 200, self.setBudget(user, year, month_number, parseJsonBody(body))
+            raise HttpError(405, f"{method} is not allowed on /budgets")
+        if len(path_parts) == 2 and path_parts[0] == "reports":
+            if method == "GET": return 200, self.getReport(user, path_parts[1], parse_qs(url.query))
+            raise HttpError(405, f"{method} is not allowed on /reports")
+        raise HttpError(404, f"Unknown path {url.path}")
+
+    async def addExpense(self, user, payload):
+        try:
+            expense = tracker.validateExpense(payload.get("date"), payload.get("category"), payload.get("amount"),
+                                              payload.get("description", ""))
+        except ValueError as error:
+            raise HttpError(400, str(error))
+        async with self.ledgerLock(user):
+            alerts = self.alertsOf(user).check(expense)
+        return dict(await self.writer.submit(user, expense), alerts=alerts)
+
+    def listExpenses(self, user, query):
+        def parameter(name, validator=None, message=""):
+            value = query.get(name, [None])[-1]
+            if value is not None and validator is not None and not validator(value): raise HttpError(400, message.format(value))
+            return value
+        first_date = parameter("from", tracker.isValidDate, "Invalid date {!r}: expected format YYYY-MM-DD")
+        last_date = parameter("to", tracker.isValidDate, "Invalid date {!r}: expected format YYYY-MM-DD")
+        category = parameter("category", lambda value: value in tracker.EXPENSE_CATEGORIES, "Unknown category {!r}")
+        min_amount = parameter("min_amount", tracker.isValidAmount, "Invalid amount {!r}")
+        max_amount = parameter("max_amount", tracker.isValidAmount, "Invalid amount {!r}")
+        search = parameter("search")
+        limit = parameter("limit", isAsciiNumber, "Invalid limit {!r}")
+        limit = int(limit) if limit is not None else EXPENSE_LIST_DEFAULT_LIMIT
+        try:
+            storage = self.ledgerOf(user)[0]
+            if search:
+                expenses = storage.searchExpenses(search, first_date, last_date, category, min_amount, max_amount)
+            else:
+                expenses = storage.iterExpenses(first_date, last_date, category, min_amount, max_amount)
+            return list(islice(expenses, limit))
+        except ValueError as error:
+            raise HttpError(400, str(error))
+
+    def getReport(self, user, period, query):
+        year = query.get("year", [None])[-1]
+        end_date = query.get("end", [None])[-1]
+        days = query.get("days", [DEFAULT_ROLLING_DAYS])[-1]
+        if period not in REPORT_PERIODS: raise HttpError(404, f"Unknown report {period!r}: expected one of {', '.join(REPORT_PERIODS)}")
+        if year is not None and not isAsciiNumber(year): raise HttpError(400, f"Invalid year {year!r}")
+        if end_date is not None and not tracker.isValidDate(end_date): raise HttpError(400, f"Invalid date {end_date!r}: expected format YYYY-MM-DD")
+        if not isAsciiNumber(str(days)): raise HttpError(400, f"Invalid number of days {days!r}")
+        try:
+            return self.reportsOf(user).report(period, year, tracker.normalizeDate(end_date) if end_date else None, int(days))
+        except ValueError as error:
+            raise HttpError(400, str(error))
+
+    def setBudget(self, user, year, month_number, payload):
+        try:
+            tracker.setBudget(year, month_number, payload.get("amount"), self.ledgerOf(user)[1])
+        except ValueError as error:
+            raise HttpError(400, str(error))
+        return self.budget_cache.get(user, year, month_number)
+
+    # Function to serve the HTTP/1.1 requests of a connection (kept open between requests unless the client closes it)
+    async def handleConnection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                try:
+                    method, target, _ = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = dict()
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""): break
+                    name, _, value = header_line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                content_length = None
+                try:
+                    content_length = parseContentLength(headers.get("content-length"))
+                    if content_length > HTTP_MAX_BODY_SIZE: raise HttpError(413, "The request body is too large")
+                    body = await reader.readexactly(content_length) if content_length else b""
+                    status, payload = await self.route(method.upper(), target, body)
+                except HttpError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except Exception as error:
+                    status, payload = 500, {"error": str(error)}
+                # The connection is closed when the body was not read, since the next request would start inside it
+                keep_alive = headers.get("connection", "").lower() != "close" and content_length is not None and status != 413
+                response_body = json.dumps(payload, default=jsonAmount).encode("utf-8")
+                writer.write((f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(response_body)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + response_body)
+                await writer.drain()
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        tracker.getStorage()
+        self.writer.start()
+        server = await asyncio.start_server(self.handleConnection, host, port)
+        print(f"Expense tracker API listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.writer.stop()
+            self.ledgers.close()
+
+
+# %%
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="HTTP JSON API of the personal expense tracker")
+    parser.add_argument("--host", default=DEFAULT_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT)
+    parser.add_argument("--open-ledgers", type=int, default=DEFAULT_OPEN_LEDGERS, help="number of user ledgers kept in memory")
+    tracker.addStorageArguments(parser)
+    options = parser.parse_args(arguments)
+    tracker.configureStorage(options.database, options.ledger, options.backend, options.budgets, options.recurring)
+    if options.user is not None:
+        try:
+            tracker.configureUser(options.user, options.users_dir)
+        except ValueError as error:
+            parser.error(str(error))
+    try:
+        asyncio.run(ExpenseTrackerServer(options.users_dir, options.open_ledgers).serve(options.host, options.port))
+    except KeyboardInterrupt:
+        print("Bye!")
+
+
+if __name__ == "__main__":
+    main()
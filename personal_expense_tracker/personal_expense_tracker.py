@@ -1,10 +1,27 @@
 # %%
+import argparse
+import csv
 import os
+import sys
 from datetime import datetime
+from itertools import islice
+from expense_alerts import ExpenseAlerts
+from expense_budgets import BudgetStore
+from expense_dates import normalizeDate, parseDate, todayOrdinal
+from expense_ledgers import LedgerPool, listUsers, userLedgerPaths, userRecurringPath
+from expense_parquet import exportParquet, readParquetRows
+from expense_recurring import RECURRING_FREQUENCY_MONTHS, RecurringRuleStore, materializeRecurringExpenses
+from expense_reports import DEFAULT_ROLLING_DAYS, REPORT_FORMATS, REPORT_PERIODS, ReportEngine, formatReport
+from expense_storage import CsvExpenseStorage, BinaryExpenseStorage, amountToCents, centsToAmount, makeExpense, roundAmount
 
 # Definition of global variables
 EXPENSE_DATABASE_FILE = "expense_database.csv"
 #EXPENSE_DATABASE_FILE = "test.txt"
+EXPENSE_LEDGER_FILE = "expense_database.ledger"
+BUDGET_DATABASE_FILE = "budget_database.json"
+RECURRING_DATABASE_FILE = "recurring_expenses.json"
+USERS_DIRECTORY = "users" # Expense and budget files of each user, when the tracker is used by several users (--user)
+EXPENSE_STORAGE_BACKEND = "csv" # "csv" for expense_database.csv, "binary" for the indexed ledger file
 VALID_DATE_FORMAT = "%Y-%m-%d"
 EXPENSE_CATEGORIES = ("Housing", "Utilities", "Groceries", "Transportation", "Health", "Childcare", "Education", "Dining & Entertainment", "Travel", "Miscellaneous")
 NUMBER_OF_EXPENSE_CATEGORIES = len(EXPENSE_CATEGORIES)
@@ -12,8 +29,15 @@ CURRENT_YEAR = datetime.now().year
 EXPENSE_DESCRIPTION_MAX_LENGTH = 100
 CSV_DELIMITER = ","
 EXPENSE_TRACKER_COMMANDS = ("Add expense","View expenses","Track budget","Set budget","Exit")
+EXPENSE_VIEW_PAGE_SIZE = 20 # Number of expenses displayed at a time by the "View expenses" menu option
+EXPENSE_LINE_TEMPLATE = "date: {date}\tcategory: {category}\tamount: {amount}\tdescription: {description}\t\n"
+BULK_IMPORT_REJECTED_SUFFIX = ".rejected.csv" # Rejected rows of a bulk import are written next to the imported file
 EXPENSES = list() # Initiate the list containing all expenses
-BUDGETS = dict() # Initiate the dictionary containing all budgets
+BUDGETS = BudgetStore(BUDGET_DATABASE_FILE) # Budgets saved in the budget file, loaded the first time they are used
+RECURRING = RecurringRuleStore(RECURRING_DATABASE_FILE) # Recurring expense rules, loaded the first time they are used
+STORAGE = None # Storage backend, opened by loadExpenses()
+REPORTS = None # Report engine of the storage backend, created by getReportEngine()
+ALERTS = None # Expense alerts of the storage backend, created by getExpenseAlerts()
 
 # %%
 # Menu List of expense categories
@@ -25,17 +49,20 @@ def displayCategoriesMenuList():
     print(categories_list)
 
 # %%
-displayCategoriesMenuList()
-
-# %%
-# Run this to play with some test data
+# Run writeTestData() to play with some test data (it replaces the content of the expense database file)
 test_data = "Date,Category,Amount,Description\n2025-04-05,Housing,682.42,Home insurance premium\n2025-04-06,Transportation,55.82,Gas fill-up for Mary's car\n2025-04-12,Education,37.54,School supplies for Peter\n2025-03-23,Utilities,50.62,Trash collection fee\n2025-04-08,Miscellaneous,50.39,Pet supplies from PetSmart\n2025-01-30,Dining & Entertainment,20.96,Bob and Mary date night\n2025-01-13,Transportation,69.72,Tollway charges\n2025-02-05,Dining & Entertainment,14.24,Bob and Mary date night\n2025-03-21,Childcare,214.12,Kids activity club monthly fee\n2025-04-05,Groceries,49.7,Monthly stock-up from Kroger"
-print(test_data)
-test_file = open(EXPENSE_DATABASE_FILE, "w")
-test_file.write(test_data)
-test_file.close()
+
+def writeTestData():
+    print(test_data)
+    test_file = open(EXPENSE_DATABASE_FILE, "w")
+    test_file.write(test_data)
+    test_file.close()
 
 # %%
+# Function to format an expense (or a recurring expense rule) as a line of "key: value" fields (amounts as 12.50)
+def formatExpenseLine(expense):
+    return "\t".join(f"{key}: {value}" for key, value in expense.items())
+
 # Function to print an expense entry
 def printExpenseLine(expense):
     if not isinstance(expense, dict):
@@ -48,64 +75,105 @@ def printExpenseLine(expense):
         expense_line = ""
         for i, j in expense.items():
             if str(j) == "":
-                print("Expense details are incomplete on this record:", expense)
+                print("Expense details are incomplete on this record:", formatExpenseLine(expense))
                 return
             else:
                 expense_line += str(i) + ": "+ str(j) + "\t"
         print(expense_line)
 
-# Function to diplay all expenses
-def viewExpenses():
-    for expense in EXPENSES: printExpenseLine(expense)
+# Function to diplay the expenses matching the optional filters (dates in format YYYY-MM-DD, category name, amounts,
+# words of the description such as "petsmart" or "pet*")
+# The expenses are read lazily from the storage. Without page size, they are all displayed; otherwise they are displayed
+# page by page and the user is asked whether to continue after each page. Returns the number of expenses displayed
+def viewExpenses(first_date=None, last_date=None, category=None, min_amount=None, max_amount=None, page_size=None, search=None):
+    if search:
+        expenses = STORAGE.searchExpenses(search, first_date, last_date, category, min_amount, max_amount)
+    else:
+        expenses = STORAGE.iterExpenses(first_date, last_date, category, min_amount, max_amount)
+    lines = (EXPENSE_LINE_TEMPLATE.format_map(expense) for expense in expenses)
+    if page_size is None:
+        displayed_count = 0
+        for line in lines:
+            sys.stdout.write(line)
+            displayed_count += 1
+        return displayed_count
+    displayed_count = 0
+    while True:
+        page = list(islice(lines, page_size))
+        sys.stdout.write("".join(page))
+        displayed_count += len(page)
+        if len(page) < page_size: break
+        if input("Press Enter to see more expenses, or q to stop:").strip().lower() == "q": break
+    if displayed_count == 0: print("No expense matches these filters.")
+    return displayed_count
 
 # %%
+# Function to open the storage backend selected by EXPENSE_STORAGE_BACKEND
+def openExpenseStorage():
+    if EXPENSE_STORAGE_BACKEND == "binary":
+        return BinaryExpenseStorage(EXPENSE_LEDGER_FILE, EXPENSE_CATEGORIES)
+    return CsvExpenseStorage(EXPENSE_DATABASE_FILE, EXPENSE_CATEGORIES, CSV_DELIMITER)
+
 # Load expenses from expense database file, or create expense database file if it does not exist
-def loadExpenses():
-    global EXPENSES
-    EXPENSES = list()
-    if not os.path.exists(EXPENSE_DATABASE_FILE):
-        expense_file = open(EXPENSE_DATABASE_FILE, 'x')
-        expense_file.write(f'Date{CSV_DELIMITER}Category{CSV_DELIMITER}Amount{CSV_DELIMITER}Description')
-        expense_file.close()
-        print("A new expense tracker file was created. You do not have any recorded expense yet.")
+# With the binary backend, only the ledger header is read: the expenses are read from the file when needed
+# With verbose=False, nothing is displayed (used by the command line and library functions)
+def loadExpenses(verbose=True):
+    global EXPENSES, STORAGE
+    if STORAGE is not None: STORAGE.close()
+    STORAGE = openExpenseStorage()
+    if not STORAGE.exists():
+        STORAGE.create()
+        EXPENSES = STORAGE
+        if verbose: print("A new expense tracker file was created. You do not have any recorded expense yet.")
     else:
-        expense_file = open(EXPENSE_DATABASE_FILE, 'r')
-        expense_file_content = expense_file.read()
-        expense_list = expense_file_content.split("\n")
-        #print(expense_list)
-        expense_keys = ['date','category','amount','description']
-        i = 0
-        for expense_line in expense_list:
-            i += 1
-            if i == 1: continue # Skip header
-            expense_line_split = expense_line.split(CSV_DELIMITER,3)
-            expense_dict = dict(zip(expense_keys, expense_line_split))
-            #print(expense_dict)
-            EXPENSES.append(expense_dict)
-            #print(EXPENSES)
-        expense_file.close()
-        print("Below is the list of all your recorded expenses\n")
-        viewExpenses()
-
-# %%
-loadExpenses()
+        STORAGE.load()
+        EXPENSES = STORAGE
+        if not verbose: return
+        if EXPENSE_STORAGE_BACKEND == "binary":
+            print(f"Your expense ledger contains {len(STORAGE)} recorded expenses.")
+        else:
+            print("Below is the list of all your recorded expenses\n")
+            viewExpenses()
+            # Records that could not be loaded (incomplete line, invalid date, category or amount) are flagged
+            for line_number, reason in STORAGE.invalid_lines: print(f"ERROR: line {line_number} of {STORAGE.path} was not loaded: {reason}")
+
+# Function to read only the expenses added to the expense file by other programs since it was loaded, instead of
+# loading the whole file again. Returns the number of expenses read
+def refreshExpenses(verbose=True):
+    if STORAGE is None:
+        loadExpenses(verbose)
+        return len(STORAGE)
+    new_expense_count = STORAGE.refresh()
+    if verbose and new_expense_count: print(f"{new_expense_count} new expenses were read from the expense file.")
+    return new_expense_count
+
+# Function to copy the expenses of expense_database.csv into the binary ledger, e.g. before switching backend
+def importCsvIntoLedger(csv_path=EXPENSE_DATABASE_FILE):
+    ledger = BinaryExpenseStorage(EXPENSE_LEDGER_FILE, EXPENSE_CATEGORIES)
+    if ledger.exists(): ledger.load()
+    else: ledger.create()
+    imported_count = ledger.importCsv(csv_path, CSV_DELIMITER)
+    ledger.close()
+    print(f"{imported_count} expenses imported from {csv_path} into {EXPENSE_LEDGER_FILE}")
+
+# Function to export the binary ledger to a CSV file in the expense_database.csv format
+def exportLedgerToCsv(csv_path):
+    ledger = BinaryExpenseStorage(EXPENSE_LEDGER_FILE, EXPENSE_CATEGORIES)
+    ledger.load()
+    ledger.exportCsv(csv_path, CSV_DELIMITER)
+    ledger.close()
+    print(f"{EXPENSE_LEDGER_FILE} exported to {csv_path}")
 
 # %%
 # Funtion to check if an input value is a date in the format YYYY-MM-DD
+# Dates are parsed by parseDate(), which remembers the dates it already parsed
 def isValidDate(date_input):
-    try:
-        datetime.strptime(date_input, VALID_DATE_FORMAT)
-        return True
-    except ValueError:
-        return False
+    return parseDate(date_input) is not None
 
-# Funtion to check if an input value is a date in the format YYYY-MM-DD
+# Funtion to check if an input value is a date in the format YYYY-MM-DD, today or in the past
 def isValidDateCurrentOrPast(date_input):
-    try:
-        date_obj = datetime.strptime(date_input, VALID_DATE_FORMAT)
-        return date_obj.date() <= datetime.now().date()
-    except ValueError:
-        return False
+    parsed_date = parseDate(date_input)
+    return parsed_date is not None and parsed_date[0] <= todayOrdinal()
 
 # Function to check if an input is valid expense date
 def isValidExpenseDate():
@@ -137,13 +205,12 @@ def isValidCategoryNumber(category_number):
         return False
     return True
 
-# Funtion to check if an amount is a positive number
+# Funtion to check if an amount is a positive number (of at least one cent once rounded to the cent)
+# The amount is read as a decimal number, so "0.1" is exactly 10 cents
 def isValidAmount(amount_input):
     try:
-        amount = float(amount_input)
-        if amount > 0: return True
-        else: return False
-    except ValueError:
+        return amountToCents(amount_input) > 0
+    except (ArithmeticError, ValueError, TypeError):
         return False
 
 # Funtion to check if the interactive menu option selected by the user is valid
@@ -160,7 +227,40 @@ def inputExpenseDate():
     date = input("Expense date in format YYYY-MM-DD:")
     while not(isValidDateCurrentOrPast(date)):
         date = input("You must enter a valid current or past date in this format: YYYY-MM-DD")
-    return datetime.strptime(date, VALID_DATE_FORMAT).strftime(VALID_DATE_FORMAT)
+    return normalizeDate(date)
+
+# %%
+# Function to capture optional filters for the list of expenses. An empty input means no filter
+def inputExpenseFilters():
+    first_date = input("From date in format YYYY-MM-DD (Enter for no limit):")
+    while first_date and not isValidDate(first_date):
+        first_date = input("You must enter a valid date in this format: YYYY-MM-DD (Enter for no limit)")
+    last_date = input("To date in format YYYY-MM-DD (Enter for no limit):")
+    while last_date and not isValidDate(last_date):
+        last_date = input("You must enter a valid date in this format: YYYY-MM-DD (Enter for no limit)")
+    displayCategoriesMenuList()
+    category_number = input(f"Category, a digit between 1 and {NUMBER_OF_EXPENSE_CATEGORIES} (Enter for all categories):")
+    while category_number and not isValidCategoryNumber(category_number):
+        category_number = input(f"You must enter an integer between 1 and {NUMBER_OF_EXPENSE_CATEGORIES} (Enter for all categories)")
+    min_amount = input("Minimum amount (Enter for no limit):")
+    while min_amount and not isValidAmount(min_amount):
+        min_amount = input("You must enter a valid number that is greater than 0 (Enter for no limit):")
+    max_amount = input("Maximum amount (Enter for no limit):")
+    while max_amount and not isValidAmount(max_amount):
+        max_amount = input("You must enter a valid number that is greater than 0 (Enter for no limit):")
+    search = input("Words of the description, * at the end of a word for a prefix (Enter for all descriptions):").strip()
+    return {
+        "first_date": normalizeDate(first_date) if first_date else None,
+        "last_date": normalizeDate(last_date) if last_date else None,
+        "category": EXPENSE_CATEGORIES[int(category_number) - 1] if category_number else None,
+        "min_amount": min_amount or None,
+        "max_amount": max_amount or None,
+        "search": search or None
+    }
+
+# Function to display the expenses page by page, after asking for the filters
+def viewFilteredExpenses():
+    viewExpenses(**inputExpenseFilters(), page_size=EXPENSE_VIEW_PAGE_SIZE)
 
 # %%
 # Function to capture the expense category user input
@@ -195,7 +295,7 @@ def inputAmount():
     amount = input("Amount:")
     while not(isValidAmount(amount)):
         amount = input("You must enter a valid number that is greater than 0:")
-    return round(float(amount), 2)
+    return roundAmount(amount)
 
 # %%
 # Function to capture the expense description user input
@@ -206,11 +306,11 @@ def inputExpenseDescription():
     return description
 
 # %%
-# Function to save an expense in the database (expense file)
+# Function to save an expense in the database (expense file or ledger), which also keeps it in memory
 def saveExpenseInDb(date, category, amount, description):
-    expense_file = open(EXPENSE_DATABASE_FILE, 'a')
-    expense_file.write(f'\n{date}{CSV_DELIMITER}{category}{CSV_DELIMITER}{amount}{CSV_DELIMITER}{description}')
-    expense_file.close()
+    expense = makeExpense(date, category, amount, description)
+    STORAGE.append(expense)
+    return expense
 
 # %%
 # Function to add an expense
@@ -222,20 +322,93 @@ def addExpense():
     amount = inputAmount()
     description = inputExpenseDescription()
     
-    # Save expense in database (expense file)
-    saveExpenseInDb(date, category, amount, description)
-    
-    #Create expense dictionary object
-    expense = {
-        "date": date,
-        "category": category,
-        "amount": round(float(amount), 2),
-        "description": description
-    }    
-    print("Expense added:", expense)
-    
-    #Add expense to list of expenses
-    EXPENSES.append(expense)
+    # Check the expense against the usual expenses of its category and the budget of its month before saving it
+    alerts = checkExpenseAlerts(makeExpense(date, category, roundAmount(amount), description))
+    # Save expense in database (expense file), which also adds it to the list of expenses
+    expense = saveExpenseInDb(date, category, roundAmount(amount), description)
+    print("Expense added:", formatExpenseLine(expense))
+    for alert in alerts: print("WARNING:", alert)
+
+# %%
+# Function to validate the rows of an imported file column by column and build the accepted expenses
+# Dates are validated once per distinct value (a bank export repeats the same dates many times)
+# Returns the accepted expenses and the rejected rows as (line number, reason, row)
+def validateImportedRows(rows, line_numbers):
+    valid_categories = set(EXPENSE_CATEGORIES)
+    normalized_dates = dict()
+    for date in set(row[0] for row in rows):
+        if isValidDateCurrentOrPast(date):
+            normalized_dates[date] = normalizeDate(date)
+    expenses = list()
+    rejected_rows = list()
+    for line_number, row in zip(line_numbers, rows):
+        date, category, amount, description = row
+        if date not in normalized_dates: reason = "invalid date"
+        elif category not in valid_categories: reason = "unknown category"
+        elif not isValidAmount(amount): reason = "invalid amount"
+        elif len(description) > EXPENSE_DESCRIPTION_MAX_LENGTH or "\n" in description: reason = "invalid description"
+        else:
+            expenses.append(makeExpense(normalized_dates[date], category, roundAmount(amount), description))
+            continue
+        rejected_rows.append((line_number, reason, row))
+    return expenses, rejected_rows
+
+# Function to import the expenses of a CSV file (e.g. a bank export) without prompting
+# The file must have a header with the columns Date, Category, Amount and Description (in any order, other columns are ignored)
+# Valid expenses are saved in a single write; rejected rows are reported and written to <file>.rejected.csv
+def bulkImportExpenses(csv_path):
+    import_file = open(csv_path, 'r', newline='')
+    reader = csv.reader(import_file)
+    header = [column.strip().lower() for column in next(reader, [])]
+    missing_columns = [column for column in ("date", "category", "amount", "description") if column not in header]
+    if missing_columns:
+        import_file.close()
+        print(f"ERROR: {csv_path} has no column {', '.join(missing_columns)}. Nothing was imported.")
+        return 0, 0
+    positions = [header.index(column) for column in ("date", "category", "amount", "description")]
+    rows = list()
+    line_numbers = list()
+    for row in reader:
+        row = row + [""] * (len(header) - len(row))
+        rows.append([row[position].strip() for position in positions])
+        line_numbers.append(reader.line_num)
+    import_file.close()
+
+    expenses, rejected_rows = validateImportedRows(rows, line_numbers)
+    STORAGE.extend(expenses)
+    print(f"{len(expenses)} expenses imported from {csv_path}, {len(rejected_rows)} rows rejected.")
+    if rejected_rows:
+        rejected_path = csv_path + BULK_IMPORT_REJECTED_SUFFIX
+        rejected_file = open(rejected_path, 'w', newline='')
+        writer = csv.writer(rejected_file)
+        writer.writerow(["Line", "Reason", "Date", "Category", "Amount", "Description"])
+        for line_number, reason, row in rejected_rows: writer.writerow([line_number, reason] + row)
+        rejected_file.close()
+        print(f"Rejected rows were written to {rejected_path}")
+    return len(expenses), len(rejected_rows)
+
+# Function to export the expenses (optionally between two dates YYYY-MM-DD, widened to whole months) to Parquet files
+# partitioned by year and month, for analytics tools (pandas, DuckDB...). Needs the pyarrow package. Returns the number of expenses exported
+def exportExpensesToParquet(directory, first_date=None, last_date=None):
+    for date in (first_date, last_date):
+        if date is not None and (not isinstance(date, str) or not isValidDate(date)): raise ValueError(f"Invalid date {date!r}: expected format YYYY-MM-DD")
+    exported_count = exportParquet(getStorage(), directory, normalizeDate(first_date) if first_date else None,
+                                   normalizeDate(last_date) if last_date else None)
+    print(f"{exported_count} expenses exported to {directory}")
+    return exported_count
+
+# Function to import the expenses of Parquet files written by exportExpensesToParquet(), validated like a CSV bulk import
+# Returns the number of expenses imported and the number of rows rejected
+def importExpensesFromParquet(directory, first_date=None, last_date=None):
+    for date in (first_date, last_date):
+        if date is not None and (not isinstance(date, str) or not isValidDate(date)): raise ValueError(f"Invalid date {date!r}: expected format YYYY-MM-DD")
+    if not os.path.isdir(directory): raise ValueError(f"No Parquet export directory {directory}")
+    rows = readParquetRows(directory, normalizeDate(first_date) if first_date else None, normalizeDate(last_date) if last_date else None)
+    expenses, rejected_rows = validateImportedRows(rows, range(1, len(rows) + 1))
+    getStorage().extend(expenses)
+    print(f"{len(expenses)} expenses imported from {directory}, {len(rejected_rows)} rows rejected.")
+    for row_number, reason, row in rejected_rows[:10]: print(f"  row {row_number}: {reason}: {row}")
+    return len(expenses), len(rejected_rows)
 
 # %%
 # Function to enable the user to set the budget for a month for either this year or last year only (for analytics purposes)
@@ -246,13 +419,13 @@ def setMonthBudget():
     month = datetime(CURRENT_YEAR, int(month_number), 1).strftime('%b')
     budget = inputAmount()
     
-    # Record the budget
-    if year not in BUDGETS: BUDGETS[year] = dict()
-    BUDGETS[year][month] = budget
+    # Record the budget, which is saved immediately in the budget file
+    setBudget(year, month_number, budget)
     print(f"Budget set:\t{year}\t{month}\t{budget}")
 
 # %%
-def getTotalExpense(year, month_number):
+# Totals are read from the monthly rollups maintained by the storage backend as expenses are loaded and added
+def getTotalExpense(year, month_number, category=None):
     # Check that the year and month are valid
     if not isValidYearForBudget(year):
         print(f"Try again. Enter a valid year, either {CURRENT_YEAR} or {CURRENT_YEAR-1}.")
@@ -261,37 +434,182 @@ def getTotalExpense(year, month_number):
         print("Try again. Enter a valid month represented by a number between 1 and 12.")
         return
 
-    total_expenses = 0
-    for expense in EXPENSES:
-        #capture date elements
-        expense_date_string = expense["date"]
-        expense_date = datetime.strptime(expense_date_string, VALID_DATE_FORMAT)
-        expense_year = expense_date.year
-        expense_month = expense_date.month
-
-        #check if this expense was made in the input year and month
-        if(expense_year == year and expense_month == month_number):
-            total_expenses += float(expense["amount"])
+    total_expenses = STORAGE.totalForMonth(int(year), int(month_number), category)
     return round(total_expenses,2)
 
+# Function to get the total expenses of a category for a given year and month
+def getCategoryExpense(year, month_number, category):
+    return getTotalExpense(year, month_number, category)
+
+# %%
+# Library API: the functions below take their inputs as arguments instead of prompting the user,
+# and raise ValueError when an input is invalid. They can be used from scripts, e.g.
+#   import personal_expense_tracker as tracker
+#   tracker.recordExpense("2025-04-05", "Groceries", 49.7, "Monthly stock-up from Kroger")
+
+# Function to get the storage backend, opening it without displaying anything if needed
+def getStorage():
+    if STORAGE is None: loadExpenses(verbose=False)
+    return STORAGE
+
+# Function to select the expense and budget files and the storage backend; the expenses are reloaded when next used
+def configureStorage(database=None, ledger=None, backend=None, budgets=None, recurring=None):
+    global EXPENSE_DATABASE_FILE, EXPENSE_LEDGER_FILE, EXPENSE_STORAGE_BACKEND, BUDGETS, RECURRING, STORAGE
+    if database is not None: EXPENSE_DATABASE_FILE = database
+    if ledger is not None: EXPENSE_LEDGER_FILE = ledger
+    if backend is not None: EXPENSE_STORAGE_BACKEND = backend
+    if budgets is not None and budgets != BUDGETS.path: BUDGETS = BudgetStore(budgets)
+    if recurring is not None and recurring != RECURRING.path: RECURRING = RecurringRuleStore(recurring)
+    if STORAGE is not None:
+        STORAGE.close()
+        STORAGE = None
+
+# Function to use the expense and budget files of a user, in their directory under users_directory
+def configureUser(user, users_directory=None):
+    database, ledger, budgets = userLedgerPaths(users_directory or USERS_DIRECTORY, user)
+    os.makedirs(os.path.dirname(database), exist_ok=True)
+    configureStorage(database, ledger, None, budgets, userRecurringPath(users_directory or USERS_DIRECTORY, user))
+
+# Function to validate an expense without saving it. The category is a name or a number between 1 and 10
+# Returns the expense dictionary (date normalized to YYYY-MM-DD, amount rounded to 2 decimals)
+def validateExpense(date, category, amount, description=""):
+    if not isinstance(date, str) or not isValidDateCurrentOrPast(date): raise ValueError(f"Invalid expense date {date!r}: expected a current or past date in format YYYY-MM-DD")
+    if str(category) not in EXPENSE_CATEGORIES:
+        if not isValidCategoryNumber(str(category)): raise ValueError(f"Unknown category {category!r}: expected one of {', '.join(EXPENSE_CATEGORIES)}")
+        category = EXPENSE_CATEGORIES[int(category) - 1]
+    if not isValidAmount(str(amount)): raise ValueError(f"Invalid amount {amount!r}: expected a number greater than 0")
+    if not isinstance(description, str) or len(description) > EXPENSE_DESCRIPTION_MAX_LENGTH: raise ValueError(f"The description must be a text of {EXPENSE_DESCRIPTION_MAX_LENGTH} characters or less")
+    if "\n" in description or "\r" in description: raise ValueError("The description must be on a single line")
+    return makeExpense(normalizeDate(date), category, roundAmount(amount), description)
+
+# Function to validate and save an expense. Returns the expense dictionary
+def recordExpense(date, category, amount, description=""):
+    expense = validateExpense(date, category, amount, description)
+    getStorage().append(expense)
+    return expense
+
+# Function to find the expenses whose description contains all the words of a query ("petsmart", "pet*" for a prefix),
+# with the same optional filters as the "View expenses" option. Returns a list of expense dictionaries
+def searchExpenses(query, first_date=None, last_date=None, category=None, min_amount=None, max_amount=None):
+    return list(getStorage().searchExpenses(query, first_date, last_date, category, min_amount, max_amount))
+
+# Function to validate and save the budget of a month (current year or last year). Returns the month as a 3-character string
+# The budget is saved in the budget store given, by default the one of the configured budget file
+def setBudget(year, month_number, budget, budgets=None):
+    if not isValidYearForBudget(year): raise ValueError(f"Invalid year {year!r}: expected {CURRENT_YEAR} or {CURRENT_YEAR-1}")
+    if not isValidMonth(month_number): raise ValueError(f"Invalid month {month_number!r}: expected a number between 1 and 12")
+    if not isValidAmount(str(budget)): raise ValueError(f"Invalid budget {budget!r}: expected a number greater than 0")
+    month = datetime(CURRENT_YEAR, int(month_number), 1).strftime('%b')
+    if budgets is None: budgets = BUDGETS
+    budgets.set(str(int(year)), month, roundAmount(budget))
+    return month
+
+# Function to compare the expenses of a month with its budget
+# Returns a dictionary with the budget (None if no budget was set), the total expenses, the remaining balance and the category totals
+# The storage and budget store can be given (e.g. those of a user's ledger), by default the configured ones are used
+# The totals and the balance are computed in integer cents, so a budget spent exactly gives a balance of exactly 0
+def getBudgetStatus(year, month_number, storage=None, budgets=None):
+    year_number, month_number = int(year), int(month_number)
+    month_3char = datetime(CURRENT_YEAR, month_number, 1).strftime('%b')
+    if storage is None: storage = getStorage()
+    if budgets is None: budgets = BUDGETS
+    budget = budgets.get(str(year_number), {}).get(month_3char)
+    category_cents = storage.categoryCentsForMonth(year_number, month_number)
+    total_cents = sum(category_cents.values())
+    return {
+        "year": year_number,
+        "month": month_3char,
+        "budget": roundAmount(budget) if budget is not None else None,
+        "total_expenses": centsToAmount(total_cents),
+        "remaining_balance": centsToAmount(amountToCents(budget) - total_cents) if budget is not None else None,
+        "categories": {category: centsToAmount(cents) for category, cents in category_cents.items()}
+    }
+
+# Function to get the budget status of every month of a year
+def getYearReport(year):
+    return [getBudgetStatus(year, month_number) for month_number in range(1, 13)]
+
+# Function to get the report engine of the storage backend and budgets, which keeps the reports already computed
+def getReportEngine():
+    global REPORTS
+    storage = getStorage()
+    if REPORTS is None or REPORTS.storage is not storage or REPORTS.budgets is not BUDGETS:
+        REPORTS = ReportEngine(storage, BUDGETS)
+    return REPORTS
+
+# Function to validate and save a recurring expense rule (e.g. rent, insurance premium, subscription)
+# The rule creates an expense on the given day (default: the day of start) of each month, quarter or year from start
+# (YYYY-MM-DD, default today) until end (optional), when runRecurringExpenses() is called. Returns the rule dictionary
+def setRecurringExpense(name, category, amount, description="", start=None, day=None, frequency="monthly", end=None):
+    start = start if start is not None else datetime.now().strftime(VALID_DATE_FORMAT)
+    for rule_date in (start, end):
+        if rule_date is not None and (not isinstance(rule_date, str) or not isValidDate(rule_date)): raise ValueError(f"Invalid date {rule_date!r}: expected format YYYY-MM-DD")
+    expense = validateExpense(datetime.now().strftime(VALID_DATE_FORMAT), category, amount, description)
+    return RECURRING.set(name, expense["category"], expense["amount"], expense["description"], normalizeDate(start), day, frequency,
+                         normalizeDate(end) if end is not None else None)
+
+def removeRecurringExpense(name):
+    RECURRING.remove(name)
+
+# Function to create the expenses of the recurring rules due up to through_date (YYYY-MM-DD, default today), with a single
+# write. Running it again (e.g. every night) only creates the expenses due since the previous run. Returns the expenses added
+def runRecurringExpenses(through_date=None):
+    through_date = through_date if through_date is not None else datetime.now().strftime(VALID_DATE_FORMAT)
+    if not isinstance(through_date, str) or not isValidDateCurrentOrPast(through_date): raise ValueError(f"Invalid date {through_date!r}: expected a current or past date in format YYYY-MM-DD")
+    return materializeRecurringExpenses(getStorage(), RECURRING, datetime.strptime(through_date, VALID_DATE_FORMAT).date())
+
+# Function to create the recurring expenses due up to through_date of every user in users_directory (see runRecurringExpenses())
+# Returns {user: number of expenses added} for the users having expenses due
+def runRecurringExpensesForUsers(through_date=None, users_directory=None):
+    through_date = through_date if through_date is not None else datetime.now().strftime(VALID_DATE_FORMAT)
+    if not isinstance(through_date, str) or not isValidDateCurrentOrPast(through_date): raise ValueError(f"Invalid date {through_date!r}: expected a current or past date in format YYYY-MM-DD")
+    users_directory = users_directory or USERS_DIRECTORY
+    pool = LedgerPool(users_directory, EXPENSE_CATEGORIES, EXPENSE_STORAGE_BACKEND, delimiter=CSV_DELIMITER)
+    try:
+        return pool.materializeRecurringExpenses(listUsers(users_directory), datetime.strptime(through_date, VALID_DATE_FORMAT).date())
+    finally:
+        pool.close()
+
+# Function to get the expense alerts of the storage backend and budgets, which keep the usual amount of each category
+def getExpenseAlerts():
+    global ALERTS
+    storage = getStorage()
+    if ALERTS is None or ALERTS.storage is not storage or ALERTS.budgets is not BUDGETS:
+        ALERTS = ExpenseAlerts(storage, BUDGETS)
+    return ALERTS
+
+# Function to get the alerts of an expense before it is saved, as a list of messages: amount unusual for its category
+# (more than 3 times its recent median), expenses of its month over the budget or on track to exceed it
+def checkExpenseAlerts(expense):
+    return getExpenseAlerts().check(expense)
+
+# Function to get a budget versus expenses report, as a list of dictionaries (period, category, budget, expenses,
+# remaining, budget_used). period is "year", "quarter", "rolling" (days up to end_date, default today) or "category"
+def getReport(period, year=None, end_date=None, days=DEFAULT_ROLLING_DAYS):
+    return getReportEngine().report(period, year, end_date, days)
+
 # %%
 def trackExpenses():    
     year_string = inputRecentExpenseYear()
-    year_number = int(year_string)
     month_number = int(inputMonthNumber())    
-    month_3char = datetime(CURRENT_YEAR, month_number, 1).strftime('%b')
-    
-    if year_string not in BUDGETS or month_3char not in BUDGETS[year_string]:
-        print(f"No budget was defined for {month_3char} {year}. You must first set that budget by using the function setMonthBudget().")
+    printBudgetStatus(getBudgetStatus(year_string, month_number))
+
+# Function to display the budget status of a month
+def printBudgetStatus(status):
+    year_string, month_3char = str(status["year"]), status["month"]
+    if status["budget"] is None:
+        print(f"No budget was defined for {month_3char} {year_string}. You must first set that budget by using the function setMonthBudget().")
         return
     
-    budget = BUDGETS[year_string][month_3char]
-    total_expenses = getTotalExpense(year_number, month_number)
-    remaining_balance = round(budget - total_expenses,2)
+    budget = status["budget"]
+    total_expenses = status["total_expenses"]
+    remaining_balance = status["remaining_balance"]
 
     print("Period:", year_string, month_3char)
     print ("Budget:", budget)
     print ("Total Expenses:", total_expenses)
+    for category, category_total in status["categories"].items():
+        print(f"\t{category}: {category_total}")
 
     if remaining_balance > 0: print (f"Your remaining balance is ${remaining_balance}")
     elif remaining_balance < 0: print (f"WARNING!!! You have exceeded your budget by ${remaining_balance}")
@@ -308,6 +626,7 @@ def displayExpenseTrackerCommands():
 # %%
 def interactiveMenu():
     while True:
+        refreshExpenses() # Expenses added by other programs (e.g. the command line) while the menu is open
         displayExpenseTrackerCommands()
         menu_option = input(f"Choose between option 1 and {len(EXPENSE_TRACKER_COMMANDS)}:")
         while not isValidInteractiveMenuOption(menu_option):
@@ -316,15 +635,192 @@ def interactiveMenu():
         match menu_option:
             # addExpense() automatically saves the expense in the file. The user does not ave to call anoher function to save the expenses, which they may forget to do
             case 1: addExpense()        
-            case 2: viewExpenses()
+            case 2: viewFilteredExpenses()
             case 3: trackExpenses()
             case 4: setMonthBudget()
             case 5:
                 print("Bye!")
-                exit()
+                return
+
+# %%
+# Function to display the budget report of a year, one line per month
+def printYearReport(year):
+    print(f"{'Month':<6}{'Budget':>12}{'Expenses':>12}{'Remaining':>12}")
+    for status in getYearReport(year):
+        budget = "" if status["budget"] is None else f"{status['budget']:.2f}"
+        remaining_balance = "" if status["remaining_balance"] is None else f"{status['remaining_balance']:.2f}"
+        print(f"{status['month']:<6}{budget:>12}{status['total_expenses']:>12.2f}{remaining_balance:>12}")
+
+# Function to display the rows of a report returned by getReport(), one line per row
+def printReportTable(rows):
+    period_width = max([len("Period")] + [len(row["period"]) for row in rows]) + 2
+    category_width = max([len("Category")] + [len(row["category"]) for row in rows]) + 2
+    print(f"{'Period':<{period_width}}{'Category':<{category_width}}{'Budget':>12}{'Expenses':>12}{'Remaining':>12}{'Used %':>9}")
+    for row in rows:
+        budget, remaining = ("" if row[column] is None else f"{row[column]:.2f}" for column in ("budget", "remaining"))
+        budget_used = "" if row["budget_used"] is None else f"{row['budget_used']:.1f}"
+        print(f"{row['period']:<{period_width}}{row['category']:<{category_width}}{budget:>12}{row['expenses']:>12.2f}"
+              f"{remaining:>12}{budget_used:>9}")
+
+# %%
+# Command line interface. Without command, the interactive menu is started
+# Function to add the options selecting the expense and budget files, passed to configureStorage()
+def addStorageArguments(parser):
+    parser.add_argument("--database", default=EXPENSE_DATABASE_FILE, help="expense CSV file (csv backend)")
+    parser.add_argument("--ledger", default=EXPENSE_LEDGER_FILE, help="expense ledger file (binary backend)")
+    parser.add_argument("--backend", choices=("csv", "binary"), default=EXPENSE_STORAGE_BACKEND, help="storage backend")
+    parser.add_argument("--budgets", default=BUDGET_DATABASE_FILE, help="budget file")
+    parser.add_argument("--recurring", default=RECURRING_DATABASE_FILE, help="recurring expense rule file")
+    parser.add_argument("--user", help="use the expense and budget files of this user (or household), in --users-dir")
+    parser.add_argument("--users-dir", default=USERS_DIRECTORY, help="directory of the files of the users")
+
+def buildArgumentParser():
+    parser = argparse.ArgumentParser(prog="personal_expense_tracker.py",
+                                     description="Personal expense tracker. Without command, the interactive menu is started.")
+    addStorageArguments(parser)
+    commands = parser.add_subparsers(dest="command")
+
+    add_command = commands.add_parser("add", help="add an expense")
+    add_command.add_argument("--date", required=True, help="current or past date in format YYYY-MM-DD")
+    add_command.add_argument("--category", required=True, choices=EXPENSE_CATEGORIES)
+    add_command.add_argument("--amount", required=True)
+    add_command.add_argument("--description", default="")
+
+    view_command = commands.add_parser("view", help="display expenses")
+    view_command.add_argument("--from", dest="first_date", help="first date in format YYYY-MM-DD")
+    view_command.add_argument("--to", dest="last_date", help="last date in format YYYY-MM-DD")
+    view_command.add_argument("--category", choices=EXPENSE_CATEGORIES)
+    view_command.add_argument("--min-amount")
+    view_command.add_argument("--max-amount")
+    view_command.add_argument("--search", help='words of the description, e.g. "petsmart" or "pet*" for a prefix')
+
+    track_command = commands.add_parser("track", help="compare the expenses of a month with its budget")
+    track_command.add_argument("--year", required=True, type=int)
+    track_command.add_argument("--month", required=True, type=int)
+
+    budget_command = commands.add_parser("set-budget", help="set the budget of a month")
+    budget_command.add_argument("--year", required=True, type=int)
+    budget_command.add_argument("--month", required=True, type=int)
+    budget_command.add_argument("--amount", required=True)
+
+    report_command = commands.add_parser("report", help="budget versus expenses by month, quarter, rolling days or category")
+    report_command.add_argument("--period", choices=REPORT_PERIODS, default="year",
+                                help="year: each month, quarter: each quarter, rolling: the last --days days by category, category: each category of the year")
+    report_command.add_argument("--year", type=int, default=CURRENT_YEAR)
+    report_command.add_argument("--end", help="last date of the rolling period in format YYYY-MM-DD (default today)")
+    report_command.add_argument("--days", type=int, default=DEFAULT_ROLLING_DAYS, help="number of days of the rolling period")
+    report_command.add_argument("--format", choices=("table",) + REPORT_FORMATS, default="table")
+    report_command.add_argument("--output", help="file to write the report to (default: displayed)")
+
+    recurring_command = commands.add_parser("recurring", help="manage and create the recurring expenses (e.g. from a nightly job)")
+    recurring_actions = recurring_command.add_subparsers(dest="action", required=True)
+    recurring_set = recurring_actions.add_parser("set", help="add or replace a recurring expense rule")
+    recurring_set.add_argument("--name", required=True)
+    recurring_set.add_argument("--category", required=True, choices=EXPENSE_CATEGORIES)
+    recurring_set.add_argument("--amount", required=True)
+    recurring_set.add_argument("--description", default="")
+    recurring_set.add_argument("--start", help="first date in format YYYY-MM-DD (default today)")
+    recurring_set.add_argument("--day", type=int, help="day of the month of the expenses (default: day of --start)")
+    recurring_set.add_argument("--frequency", choices=tuple(RECURRING_FREQUENCY_MONTHS), default="monthly")
+    recurring_set.add_argument("--end", help="last date in format YYYY-MM-DD (default: no end)")
+    recurring_actions.add_parser("list", help="display the recurring expense rules")
+    recurring_remove = recurring_actions.add_parser("remove", help="remove a recurring expense rule")
+    recurring_remove.add_argument("--name", required=True)
+    recurring_run = recurring_actions.add_parser("run", help="create the recurring expenses due and not created yet")
+    recurring_run.add_argument("--through", help="last date of the expenses to create in format YYYY-MM-DD (default today)")
+    recurring_run.add_argument("--all-users", action="store_true", help="create the recurring expenses of every user in --users-dir")
+
+    import_command = commands.add_parser("import", help="import the expenses of a CSV file (e.g. a bank export)")
+    import_command.add_argument("file")
+
+    for command_name, command_help in (("export-parquet", "export the expenses to Parquet files partitioned by year and month (needs pyarrow)"),
+                                       ("import-parquet", "import the expenses of Parquet files written by export-parquet (needs pyarrow)")):
+        parquet_command = commands.add_parser(command_name, help=command_help)
+        parquet_command.add_argument("directory")
+        parquet_command.add_argument("--from", dest="first_date", help="first date in format YYYY-MM-DD")
+        parquet_command.add_argument("--to", dest="last_date", help="last date in format YYYY-MM-DD")
+
+    commands.add_parser("menu", help="start the interactive menu")
+    return parser
+
+# Function to run the command line. Returns the exit status
+def main(arguments=None):
+    options = buildArgumentParser().parse_args(arguments)
+    configureStorage(options.database, options.ledger, options.backend, options.budgets, options.recurring)
+
+    try:
+        if options.user is not None: configureUser(options.user, options.users_dir)
+        match options.command:
+            case "add":
+                alerts = checkExpenseAlerts(validateExpense(options.date, options.category, options.amount, options.description))
+                print("Expense added:", formatExpenseLine(recordExpense(options.date, options.category, options.amount, options.description)))
+                for alert in alerts: print("WARNING:", alert)
+            case "view":
+                for date in (options.first_date, options.last_date):
+                    if date is not None and not isValidDate(date): raise ValueError(f"Invalid date {date!r}: expected format YYYY-MM-DD")
+                for amount in (options.min_amount, options.max_amount):
+                    if amount is not None and not isValidAmount(amount): raise ValueError(f"Invalid amount {amount!r}: expected a number greater than 0")
+                getStorage()
+                viewExpenses(options.first_date, options.last_date, options.category, options.min_amount, options.max_amount,
+                             search=options.search)
+            case "track":
+                if not isValidMonth(options.month): raise ValueError(f"Invalid month {options.month!r}: expected a number between 1 and 12")
+                printBudgetStatus(getBudgetStatus(options.year, options.month))
+            case "set-budget":
+                month = setBudget(options.year, options.month, options.amount)
+                print(f"Budget set:\t{options.year}\t{month}\t{roundAmount(options.amount)}")
+            case "report":
+                if options.end is not None and not isValidDate(options.end): raise ValueError(f"Invalid date {options.end!r}: expected format YYYY-MM-DD")
+                if options.period == "year" and options.format == "table" and options.output is None:
+                    printYearReport(options.year)
+                else:
+                    rows = getReport(options.period, options.year, normalizeDate(options.end) if options.end else None, options.days)
+                    if options.format == "table":
+                        printReportTable(rows)
+                    elif options.output is None:
+                        sys.stdout.write(formatReport(rows, options.format))
+                    else:
+                        report_file = open(options.output, 'w', newline="")
+                        report_file.write(formatReport(rows, options.format))
+                        report_file.close()
+                        print(f"Report written to {options.output}")
+            case "recurring":
+                match options.action:
+                    case "set":
+                        print("Recurring expense set:", options.name, formatExpenseLine(setRecurringExpense(
+                            options.name, options.category, options.amount, options.description, options.start, options.day, options.frequency, options.end)))
+                    case "list":
+                        for name, rule in RECURRING.items(): print(f"{name}:", formatExpenseLine(rule))
+                    case "remove":
+                        removeRecurringExpense(options.name)
+                        print("Recurring expense removed:", options.name)
+                    case "run" if options.all_users:
+                        added_counts = runRecurringExpensesForUsers(options.through, options.users_dir)
+                        for user, added_count in added_counts.items(): print(f"{user}: {added_count} recurring expenses added")
+                        print(f"{sum(added_counts.values())} recurring expenses added for {len(added_counts)} users")
+                    case "run":
+                        expenses = runRecurringExpenses(options.through)
+                        for expense in expenses: printExpenseLine(expense)
+                        print(f"{len(expenses)} recurring expenses added")
+            case "import":
+                getStorage()
+                bulkImportExpenses(options.file)
+            case "export-parquet":
+                exportExpensesToParquet(options.directory, options.first_date, options.last_date)
+            case "import-parquet":
+                importExpensesFromParquet(options.directory, options.first_date, options.last_date)
+            case _:
+                displayCategoriesMenuList()
+                loadExpenses()
+                interactiveMenu()
+    except (ValueError, ImportError, OSError) as error: # Invalid input, missing optional package, or file that cannot be read or written
+        print("ERROR:", error, file=sys.stderr)
+        return 1
+    return 0
 
 # %%
-interactiveMenu()
+if __name__ == "__main__":
+    sys.exit(main())
 
 
 
@@ -0,0 +1,35 @@
+# %%
+# Tests of the budget store shared by several processes (e.g. the command line and the HTTP server): the budgets set
+# by one store are kept by the checkpoints of the others. Run with: python -m pytest -q
+from expense_budgets import BUDGET_JOURNAL_CHECKPOINT, BudgetStore
+
+
+def test_checkpoint_keeps_the_budgets_set_by_another_store(tmp_path):
+    path = str(tmp_path / "budget_database.json")
+    store_a, store_b = BudgetStore(path), BudgetStore(path)
+    store_a.set("2025", "Jan", 100)
+    store_b.set("2025", "Feb", 200)
+    for budget in range(300, 300 + BUDGET_JOURNAL_CHECKPOINT): store_a.set("2025", "Mar", budget)
+    assert store_a.journal_entries < BUDGET_JOURNAL_CHECKPOINT # A checkpoint was written
+    expected_budgets = {"2025": {"Jan": 100, "Feb": 200, "Mar": 299 + BUDGET_JOURNAL_CHECKPOINT}}
+    assert store_a.get("2025") == expected_budgets["2025"]
+    assert BudgetStore(path).load() == expected_budgets
+
+def test_explicit_checkpoint_replays_the_journal(tmp_path):
+    path = str(tmp_path / "budget_database.json")
+    store_a, store_b = BudgetStore(path), BudgetStore(path)
+    store_a.set("2025", "Jan", 100)
+    store_b.set("2025", "Feb", 200)
+    store_a.checkpoint()
+    assert BudgetStore(path).load() == {"2025": {"Jan": 100, "Feb": 200}}
+
+def test_refresh_reads_the_budgets_set_by_another_store(tmp_path):
+    path = str(tmp_path / "budget_database.json")
+    store_a, store_b = BudgetStore(path), BudgetStore(path)
+    store_a.set("2025", "Jan", 100)
+    assert not store_a.refresh()
+    version = store_a.version
+    store_b.set("2025", "Jan", 150)
+    assert store_a.refresh()
+    assert store_a.version > version
+    assert store_a.get("2025") == {"Jan": 150}
@@ -0,0 +1,67 @@
+# %%
+# Tests of the month index of the binary ledger: records written without their index entries (process stopped in between,
+# or ledger copied without its index) are indexed again when the ledger is opened or extended. Run with: python -m pytest -q
+import shutil
+from decimal import Decimal
+
+import pytest
+
+import personal_expense_tracker as tracker
+from expense_storage import BinaryExpenseStorage, makeExpense
+
+
+@pytest.fixture
+def ledger_path(tmp_path):
+    path = str(tmp_path / "expenses.ledger")
+    ledger = BinaryExpenseStorage(path, tracker.EXPENSE_CATEGORIES).create()
+    ledger.extend([makeExpense(f"2025-04-0{day}", "Groceries", "1.00", "") for day in range(1, 4)])
+    ledger.close()
+    return path
+
+# Function to write records at the end of a ledger without indexing them, like a process stopped before writing its index
+def writeUnindexedRecords(path, expenses):
+    ledger = BinaryExpenseStorage(path, tracker.EXPENSE_CATEGORIES).load()
+    for expense in expenses: ledger._writeRecord(ledger._encodeExpense(expense))
+    ledger.record_file.flush()
+    ledger.close()
+
+
+# %%
+def test_unindexed_records_are_indexed_when_the_ledger_is_opened(ledger_path):
+    writeUnindexedRecords(ledger_path, [makeExpense("2025-04-09", "Groceries", "5.00", ""), makeExpense("2025-05-01", "Housing", "7.00", "")])
+    ledger = BinaryExpenseStorage(ledger_path, tracker.EXPENSE_CATEGORIES).load()
+    assert ledger.totalForMonth(2025, 4) == Decimal("8.00")
+    assert ledger.totalForMonth(2025, 5) == Decimal("7.00")
+    assert [expense["date"] for expense in ledger.iterExpenses("2025-05-01")] == ["2025-05-01"]
+    ledger.close()
+
+def test_unindexed_records_are_indexed_when_the_ledger_is_extended(ledger_path):
+    ledger = BinaryExpenseStorage(ledger_path, tracker.EXPENSE_CATEGORIES).load()
+    writeUnindexedRecords(ledger_path, [makeExpense("2025-05-02", "Housing", "1.00", "")])
+    ledger.append(makeExpense("2025-05-03", "Housing", "2.00", ""))
+    assert len(ledger) == 5
+    assert ledger.totalForMonth(2025, 5) == Decimal("3.00")
+    ledger.close()
+    assert BinaryExpenseStorage(ledger_path, tracker.EXPENSE_CATEGORIES).load().totalForMonth(2025, 5) == Decimal("3.00")
+
+def test_ledger_copied_without_its_index(ledger_path):
+    shutil.rmtree(ledger_path + ".idx")
+    ledger = BinaryExpenseStorage(ledger_path, tracker.EXPENSE_CATEGORIES).load()
+    assert ledger.indexedMonths() == [(2025, 4)]
+    assert ledger.totalForMonth(2025, 4) == Decimal("3.00")
+    ledger.close()
+
+@pytest.mark.parametrize("invalid_expense", [makeExpense("2025-04-10", "Groceries", "1e20", ""), makeExpense("2025-04-10", "Pets", "1.00", ""),
+                                             makeExpense("2025-04-31", "Groceries", "1.00", ""), makeExpense("2025-04-10", "Groceries", "1.00", "x" * 70000)])
+def test_batch_with_an_invalid_expense_is_not_written(ledger_path, invalid_expense):
+    ledger = BinaryExpenseStorage(ledger_path, tracker.EXPENSE_CATEGORIES).load()
+    with pytest.raises(ValueError):
+        ledger.extend([makeExpense("2025-04-10", "Housing", "2.00", ""), makeExpense("2025-05-10", "Housing", "3.00", ""),
+                       invalid_expense, makeExpense("2025-05-11", "Health", "4.00", "")])
+    assert len(ledger) == 3
+    ledger.close()
+    ledger = BinaryExpenseStorage(ledger_path, tracker.EXPENSE_CATEGORIES).load()
+    assert len(ledger) == 3
+    assert ledger.totalForMonth(2025, 4) == Decimal("3.00")
+    assert ledger.indexedMonths() == [(2025, 4)]
+    ledger.close()
@@ -0,0 +1,85 @@
+# %%
+# Property tests of the money arithmetic: amounts are validated, stored and summed as exact integer cents.
+# The random ledgers are seeded, so a failure can be reproduced. Run with: python -m pytest -q
+import json
+import random
+from decimal import Decimal
+
+import pytest
+
+import personal_expense_tracker as tracker
+from expense_columns import MAX_AMOUNT_CENTS
+from expense_storage import (BinaryExpenseStorage, CsvExpenseStorage, amountToCents, centsToAmount, jsonAmount,
+                             makeExpense, roundAmount)
+
+RANDOM_LEDGERS = 200
+OUT_OF_RANGE_AMOUNTS = ("1e20", "92233720368547758.08", "-1e20", "nan", "inf", "-inf", "12..5", "")
+
+
+# Function to generate the amounts of a random ledger, as the texts typed by a user (2 decimals)
+def randomAmounts(generator):
+    return [f"{generator.randrange(1, 100000) / 100:.2f}" for _ in range(generator.randrange(1, 500))]
+
+
+# %%
+@pytest.mark.parametrize("seed", range(RANDOM_LEDGERS))
+def test_cents_totals_are_the_decimal_totals(seed):
+    amounts = randomAmounts(random.Random(seed))
+    reference_total = sum(map(Decimal, amounts), Decimal(0))
+    total_cents = sum(map(amountToCents, amounts))
+    assert centsToAmount(total_cents) == reference_total
+    # A budget spent exactly leaves a balance of exactly 0
+    assert centsToAmount(amountToCents(reference_total) - total_cents) == 0
+
+@pytest.mark.parametrize("amount, rounded", [("2.675", "2.68"), ("0.1", "0.10"), ("0.005", "0.01"), (12.5, "12.50"), ("-0.015", "-0.02")])
+def test_amounts_are_rounded_half_up_to_decimals(amount, rounded):
+    assert roundAmount(amount) == Decimal(rounded)
+    assert str(roundAmount(amount)) == rounded
+
+@pytest.mark.parametrize("amount", OUT_OF_RANGE_AMOUNTS)
+def test_invalid_amounts_are_rejected(amount):
+    with pytest.raises(ValueError):
+        amountToCents(amount)
+    assert not tracker.isValidAmount(amount)
+
+def test_largest_amount_is_accepted():
+    assert amountToCents(centsToAmount(MAX_AMOUNT_CENTS)) == MAX_AMOUNT_CENTS
+    assert tracker.isValidAmount(str(centsToAmount(MAX_AMOUNT_CENTS)))
+
+def test_json_amounts_keep_every_cent():
+    assert json.dumps({"amount": Decimal("12.50")}, default=jsonAmount) == '{"amount": 12.5}'
+    assert json.loads(json.dumps(centsToAmount(MAX_AMOUNT_CENTS), default=jsonAmount)) == str(centsToAmount(MAX_AMOUNT_CENTS))
+    with pytest.raises(TypeError):
+        json.dumps(object(), default=jsonAmount)
+
+
+# %%
+@pytest.fixture(params=["csv", "binary"])
+def storage(request, tmp_path):
+    if request.param == "csv": storage = CsvExpenseStorage(str(tmp_path / "expenses.csv"), tracker.EXPENSE_CATEGORIES)
+    else: storage = BinaryExpenseStorage(str(tmp_path / "expenses.ledger"), tracker.EXPENSE_CATEGORIES)
+    storage.create()
+    yield storage
+    storage.close()
+
+@pytest.mark.parametrize("seed", range(5))
+def test_stored_totals_are_the_decimal_totals(storage, seed):
+    generator = random.Random(seed)
+    amounts = randomAmounts(generator)
+    storage.extend([makeExpense(f"2025-04-{generator.randrange(1, 31):02d}", generator.choice(tracker.EXPENSE_CATEGORIES),
+                                roundAmount(amount), "") for amount in amounts])
+    reference_total = sum(map(Decimal, amounts), Decimal(0))
+    assert storage.totalForMonth(2025, 4) == reference_total
+    assert sum((expense["amount"] for expense in storage), Decimal(0)) == reference_total
+    storage.load()
+    assert storage.totalForMonth(2025, 4) == reference_total
+
+@pytest.mark.parametrize("amount", ("1e20", "-1e20"))
+def test_out_of_range_expense_is_not_stored(storage, amount):
+    storage.append(makeExpense("2025-04-05", "Groceries", "12.50", ""))
+    with pytest.raises(ValueError):
+        storage.append(makeExpense("2025-04-05", "Groceries", amount, ""))
+    storage.append(makeExpense("2025-04-06", "Housing", "1.25", "rent"))
+    storage.load()
+    assert [expense["amount"] for expense in storage] == [Decimal("12.50"), Decimal("1.25")]
+    assert storage.totalForMonth(2025, 4) == Decimal("13.75")